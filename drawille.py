@@ -15,18 +15,37 @@
 #
 # (C) 2014- by Adam Tauber, <asciimoo@gmail.com>
 
+from array import array
+import binascii
+import errno
 import math
 import os
+import select
+import socket
 from sys import version_info
-from collections import defaultdict
+from collections import Counter, defaultdict, deque
+from itertools import chain, groupby
+from random import Random
 from time import sleep
 import curses
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 IS_PY3 = version_info[0] == 3
 
 if IS_PY3:
     unichr = chr
 
+# str and the python2 unicode type
+string_types = (str, type(u''))
+
+# time.time can jump, monotonic is only available in python3
+monotonic = getattr(time, 'monotonic', time.time)
+
 """
 
 http://www.alanwood.net/unicode/braille_patterns.html
@@ -48,6 +67,24 @@ pixel_map = ((0x01, 0x08),
 # braille unicode characters starts at 0x2800
 braille_char_offset = 0x2800
 
+# rendered characters indexed by dot mask, empty cells are rendered as spaces
+braille_chars = tuple([u' '] + [unichr(braille_char_offset + i) for i in range(1, 256)])
+
+# caches of the ordered dithering thresholds and translation tables
+threshold_matrices = {}
+dither_tables = {}
+shift_tables = {}
+
+# second and third UTF-8 bytes of the braille characters, the first is 0xE2
+braille_utf8_tables = (bytes(bytearray(0xA0 | (i >> 6) for i in range(256))),
+                       bytes(bytearray(0x80 | (i & 0x3F) for i in range(256))))
+
+# dots of the left / right column of a cell as left column dots, and left
+# column dots moved to the right column
+column_tables = (bytearray(i & 0x47 for i in range(256)),
+                 bytearray((i & 0x38) >> 3 | (i & 0x80) >> 1 for i in range(256)),
+                 bytearray((i & 0x07) << 3 | (i & 0x40) << 1 for i in range(256)))
+
 
 # http://stackoverflow.com/questions/566746/how-to-get-console-window-width-in-python
 def getTerminalSize():
@@ -99,319 +136,4812 @@ def get_pos(x, y):
     return normalize(x) // 2, normalize(y) // 4
 
 
-class Canvas(object):
-    """This class implements the pixel surface."""
+def is_array(obj):
+    """Returns True if obj is a NumPy array (and NumPy is installed)"""
+    return numpy is not None and isinstance(obj, numpy.ndarray)
 
-    def __init__(self, line_ending=os.linesep):
-        super(Canvas, self).__init__()
-        self.clear()
-        self.line_ending = line_ending
 
+def group_cells(xs, ys=None, toggle=False, clip=None):
+    """Group pixels by braille cell.
 
-    def clear(self):
-        """Remove all pixels from the :class:`Canvas` object."""
-        self.chars = defaultdict(intdefaultdict)
+    Returns a ``{row: {col: mask}}`` dict where mask contains the dots of
+    the given pixels. Pixels hit more than once cancel out if ``toggle``
+    is True.
 
+    :param xs: iterable of (x, y) pairs, or x coordinates if ys is given
+    :param ys: (optional) y coordinates parallel to xs
+    :param toggle: (optional) combine the dots with XOR instead of OR
+    :param clip: (optional) (min_x, min_y, max_x, max_y) pixels outside of
+                 this rectangle are skipped, max exclusive
+    """
+    cells = defaultdict(intdefaultdict)
+    points = xs if ys is None else zip(xs, ys)
+    dots = pixel_map
 
-    def set(self, x, y):
-        """Set a pixel of the :class:`Canvas` object.
+    for x, y in points:
+        if type(x) is not int:
+            x = normalize(x)
+        if type(y) is not int:
+            y = normalize(y)
 
-        :param x: x coordinate of the pixel
-        :param y: y coordinate of the pixel
-        """
-        x = normalize(x)
-        y = normalize(y)
-        col, row = get_pos(x, y)
+        if clip is not None and not (clip[0] <= x < clip[2] and clip[1] <= y < clip[3]):
+            continue
 
-        if type(self.chars[row][col]) != int:
-            return
+        if toggle:
+            cells[y >> 2][x >> 1] ^= dots[y & 3][x & 1]
+        else:
+            cells[y >> 2][x >> 1] |= dots[y & 3][x & 1]
 
-        self.chars[row][col] |= pixel_map[y % 4][x % 2]
+    return cells
 
 
-    def unset(self, x, y):
-        """Unset a pixel of the :class:`Canvas` object.
+def array_coords(xs, ys=None):
+    """Returns the rounded x and y coordinates as NumPy int64 arrays.
 
-        :param x: x coordinate of the pixel
-        :param y: y coordinate of the pixel
-        """
-        x = normalize(x)
-        y = normalize(y)
-        col, row = get_pos(x, y)
+    :param xs: Nx2 array of (x, y) pairs, or x coordinates if ys is given
+    :param ys: (optional) y coordinates parallel to xs
+    """
+    if ys is None:
+        xs = numpy.asarray(xs).reshape(-1, 2)
+        xs, ys = xs[:, 0], xs[:, 1]
 
-        if type(self.chars[row][col]) == int:
-            self.chars[row][col] &= ~pixel_map[y % 4][x % 2]
+    xs = numpy.asarray(xs)
+    ys = numpy.asarray(ys)
 
-        if type(self.chars[row][col]) != int or self.chars[row][col] == 0:
-            del(self.chars[row][col])
+    if xs.dtype.kind == 'f':
+        xs = numpy.rint(xs)
+    if ys.dtype.kind == 'f':
+        ys = numpy.rint(ys)
 
-        if not self.chars.get(row):
-            del(self.chars[row])
+    return xs.astype(numpy.int64), ys.astype(numpy.int64)
 
 
-    def toggle(self, x, y):
-        """Toggle a pixel of the :class:`Canvas` object.
+def array_group_cells(xs, ys, toggle=False):
+    """Vectorized version of :func:`group_cells`.
 
-        :param x: x coordinate of the pixel
-        :param y: y coordinate of the pixel
-        """
-        x = normalize(x)
-        y = normalize(y)
-        col, row = get_pos(x, y)
+    Returns the rows, cols and masks of the touched cells as NumPy arrays.
 
-        if type(self.chars[row][col]) != int or self.chars[row][col] & pixel_map[y % 4][x % 2]:
-            self.unset(x, y)
-        else:
-            self.set(x, y)
+    :param xs: x coordinates as returned by :func:`array_coords`
+    :param ys: y coordinates as returned by :func:`array_coords`
+    :param toggle: (optional) combine the dots with XOR instead of OR
+    """
+    bits = numpy.asarray(pixel_map, dtype=numpy.uint8)[ys & 3, xs & 1]
+    rows = ys >> 2
+    cols = xs >> 1
 
+    if not len(bits):
+        return rows, cols, bits
 
-    def set_text(self, x, y, text):
-        """Set text to the given coords.
+    order = numpy.lexsort((cols, rows))
+    rows = rows[order]
+    cols = cols[order]
+    bits = bits[order]
+    starts = numpy.flatnonzero((numpy.diff(rows) != 0) | (numpy.diff(cols) != 0)) + 1
+    starts = numpy.concatenate(([0], starts))
+    reduce_fn = numpy.bitwise_xor if toggle else numpy.bitwise_or
 
-        :param x: x coordinate of the text start position
-        :param y: y coordinate of the text start position
-        """
-        col, row = get_pos(x, y)
+    return rows[starts], cols[starts], reduce_fn.reduceat(bits, starts)
 
-        for i,c in enumerate(text):
-            self.chars[row][col+i] = c
 
+def encode_cells(cells):
+    """Returns the UTF-8 encoded braille characters of a bytearray of dot
+    masks, empty cells are encoded as spaces"""
+    n = len(cells)
+    utf8 = bytearray(3 * n)
+    utf8[0::3] = b'\xe2' * n
+    utf8[1::3] = cells.translate(braille_utf8_tables[0])
+    utf8[2::3] = cells.translate(braille_utf8_tables[1])
 
-    def get(self, x, y):
-        """Get the state of a pixel. Returns bool.
+    # 0xE2 only starts a character, the match is always aligned
+    return bytes(utf8).replace(b'\xe2\xa0\x80', b' ')
 
-        :param x: x coordinate of the pixel
-        :param y: y coordinate of the pixel
-        """
-        x = normalize(x)
-        y = normalize(y)
-        dot_index = pixel_map[y % 4][x % 2]
-        col, row = get_pos(x, y)
-        char = self.chars.get(row, {}).get(col)
 
-        if not char:
-            return False
+def render_cells(cells):
+    """Returns the braille characters of a bytearray of dot masks"""
+    return encode_cells(cells).decode('utf-8')
 
-        if type(char) != int:
-            return True
 
-        return bool(char & dot_index)
+# xterm default RGB values of the 16 ANSI colors
+ansi16_rgb = ((0, 0, 0), (205, 0, 0), (0, 205, 0), (205, 205, 0),
+              (0, 0, 238), (205, 0, 205), (0, 205, 205), (229, 229, 229),
+              (127, 127, 127), (255, 0, 0), (0, 255, 0), (255, 255, 0),
+              (92, 92, 255), (255, 0, 255), (0, 255, 255), (255, 255, 255))
 
+# levels of the 6x6x6 color cube of the 256 color palette
+xterm_levels = (0, 95, 135, 175, 215, 255)
 
-    def rows(self, min_x=None, min_y=None, max_x=None, max_y=None):
-        """Returns a list of the current :class:`Canvas` object lines.
 
-        :param min_x: (optional) minimum x coordinate of the canvas
-        :param min_y: (optional) minimum y coordinate of the canvas
-        :param max_x: (optional) maximum x coordinate of the canvas
-        :param max_y: (optional) maximum y coordinate of the canvas
-        """
+def parse_color(color):
+    """Returns a color as an int (0 - 255 palette index), an (r, g, b)
+    tuple or None.
 
-        if not self.chars.keys():
-            return []
+    :param color: palette index, (r, g, b) tuple, '#rrggbb' string or None
+    """
+    if color is None or isinstance(color, int):
+        return color
 
-        minrow = min_y // 4 if min_y != None else min(self.chars.keys())
-        maxrow = (max_y - 1) // 4 if max_y != None else max(self.chars.keys())
-        mincol = min_x // 2 if min_x != None else min(min(x.keys()) for x in self.chars.values())
-        maxcol = (max_x - 1) // 2 if max_x != None else max(max(x.keys()) for x in self.chars.values())
-        ret = []
+    if isinstance(color, string_types):
+        color = color.lstrip('#')
+        return tuple(int(color[i:i + 2], 16) for i in (0, 2, 4))
 
-        for rownum in range(minrow, maxrow+1):
-            if not rownum in self.chars:
-                ret.append('')
+    return tuple(int(c) for c in color)
+
+
+def xterm_rgb(index):
+    """Returns the (r, g, b) value of a 256 color palette index."""
+    if index < 16:
+        return ansi16_rgb[index]
+
+    if index < 232:
+        index -= 16
+        return (xterm_levels[index // 36], xterm_levels[index // 6 % 6], xterm_levels[index % 6])
+
+    level = 8 + (index - 232) * 10
+    return (level, level, level)
+
+
+def nearest_color(rgb, indexes):
+    """Returns the palette index of the closest color."""
+    return min(indexes, key=lambda i: sum((a - b) ** 2 for a, b in zip(rgb, xterm_rgb(i))))
+
+
+def sgr_color(color, mode=256, background=False):
+    """Returns the SGR parameters of a color.
+
+    :param color: palette index or (r, g, b) tuple, see :func:`parse_color`
+    :param mode: (optional) 16, 256 or 'truecolor'
+    :param background: (optional) background instead of foreground color
+    """
+    if isinstance(color, tuple):
+        if mode == 'truecolor':
+            return '{0};2;{1};{2};{3}'.format(48 if background else 38, *color)
+        cube = 16 + sum(min(range(6), key=lambda i: abs(xterm_levels[i] - c)) * m
+                        for c, m in zip(color, (36, 6, 1)))
+        gray = 232 + min(23, max(0, (sum(color) // 3 - 3) // 10))
+        color = nearest_color(color, (cube, gray) if mode != 16 else range(16))
+
+    if color >= 16 and mode == 16:
+        color = nearest_color(xterm_rgb(color), range(16))
+
+    if color < 16:
+        base = 40 if background else 30
+        return str(base + color if color < 8 else base + 60 + color - 8)
+
+    return '{0};5;{1}'.format(48 if background else 38, color)
+
+
+def color_runs(row, codes, escapes):
+    """Returns a row with a color escape at the start of every run of
+    cells with the same color code.
+
+    :param row: rendered row
+    :param codes: color code of each cell of the row
+    :param escapes: dict of the escape sequence of each color code
+    """
+    parts = []
+    x = 0
+    code = 0
+
+    for code, run in groupby(codes):
+        n = sum(1 for _ in run)
+        if code or x:
+            parts.append(escapes[code])
+        parts.append(row[x:x + n])
+        x += n
+
+    if code:
+        parts.append(escapes[0])
+
+    return u''.join(parts)
+
+
+def or_bytes(a, b):
+    """Returns the bitwise OR of two equally long byte strings as bytearray"""
+    if not a:
+        return bytearray(b)
+
+    value = int(binascii.hexlify(a), 16) | int(binascii.hexlify(b), 16)
+
+    return bytearray(binascii.unhexlify('%0*x' % (len(a) * 2, value)))
+
+
+def xor_bytes(a, b):
+    """Returns the bitwise XOR of two equally long byte strings as bytearray"""
+    if not a:
+        return bytearray(b)
+
+    value = int(binascii.hexlify(a), 16) ^ int(binascii.hexlify(b), 16)
+
+    return bytearray(binascii.unhexlify('%0*x' % (len(a) * 2, value)))
+
+
+def and_bytes(a, b):
+    """Returns the bitwise AND of two equally long byte strings as bytearray"""
+    if not a:
+        return bytearray(b'')
+
+    value = int(binascii.hexlify(a), 16) & int(binascii.hexlify(b), 16)
+
+    return bytearray(binascii.unhexlify('%0*x' % (len(a) * 2, value)))
+
+
+def mask_bytes(a, b):
+    """Returns the bits of a which are not set in b (a AND NOT b) of two
+    equally long byte strings as bytearray"""
+    if not a:
+        return bytearray(b'')
+
+    value = int(binascii.hexlify(a), 16) & ~int(binascii.hexlify(b), 16)
+
+    return bytearray(binascii.unhexlify('%0*x' % (len(a) * 2, value)))
+
+
+def dot_shift_tables(dx, dy):
+    """Returns the translation tables which move the dots of a cell dx (0-1)
+    pixels right and dy (0-3) pixels down.
+
+    ``tables[(row, col)]`` maps a dot mask to the dots landing in the cell
+    row (0-1) cells below and col (0-1) cells right of it, tables which map
+    every mask to 0 are left out.
+    """
+    key = (dx, dy)
+
+    if key not in shift_tables:
+        tables = dict((k, bytearray(256)) for k in ((0, 0), (0, 1), (1, 0), (1, 1)))
+
+        for code in range(256):
+            for y, dots in enumerate(pixel_map):
+                for x, bit in enumerate(dots):
+                    if code & bit:
+                        tables[((y + dy) // 4, (x + dx) // 2)][code] |= \
+                            pixel_map[(y + dy) % 4][(x + dx) % 2]
+
+        shift_tables[key] = dict((k, bytes(t)) for k, t in tables.items() if any(t))
+
+    return shift_tables[key]
+
+
+def shift_cells(cells, dx, dy):
+    """Shift the dots of equally long bytearray cell rows dx (0-1) pixels
+    right and dy (0-3) pixels down. Returns one more row if dy is not 0 and
+    one more column if dx is not 0.
+
+    :param cells: list of bytearray cell rows
+    :param dx: horizontal shift in pixels
+    :param dy: vertical shift in pixels
+    """
+    width = len(cells[0]) + (1 if dx else 0) if cells else 0
+    ret = [bytearray(width) for _ in range(len(cells) + (1 if dy else 0))]
+
+    for (row, col), table in dot_shift_tables(dx, dy).items():
+        pad = bytearray(width - len(cells[0]) - col)
+
+        for rownum, codes in enumerate(cells, row):
+            ret[rownum] = or_bytes(ret[rownum], bytearray(col) + codes.translate(table) + pad)
+
+    return ret
+
+
+def dot_tables(threshold=None, invert=False):
+    """Returns the translation tables of :func:`bitmap_cells`.
+
+    ``tables[dy][dx]`` maps a pixel value of the dy-th row and dx-th column
+    of a braille cell to its dot bit (or 0).
+    """
+    if threshold is None:
+        on = [bool(v) != bool(invert) for v in range(256)]
+    elif invert:
+        on = [v < threshold for v in range(256)]
+    else:
+        on = [v > threshold for v in range(256)]
+
+    return tuple(tuple(bytes(bytearray(bit if on[v] else 0 for v in range(256)))
+                       for bit in dots)
+                 for dots in pixel_map)
+
+
+def bitmap_cells(bitmap, width=None, height=None, threshold=None, invert=False,
+                 offset_x=0, offset_y=0, dither=None):
+    """Pack a bitmap into braille cells.
+
+    Returns a list of bytearrays, one per row of cells. A dot is set where
+    the pixel value is greater than ``threshold`` (less than, if
+    ``invert``). Without threshold every non-zero pixel is set. With
+    ``dither`` the pixels are dithered first, see :func:`dither_bitmap`.
+    Rows shorter than the longest one are padded with blank cells.
+
+    The threshold can also be ``'otsu'`` (see :func:`otsu_threshold`) or
+    ``'adaptive'`` (see :func:`adaptive_threshold`). The adaptive threshold
+    already binarizes the pixels, ``dither`` is ignored with it.
+
+    :param bitmap: 2-D sequence (or NumPy array) of bool/uint8 pixels, or
+                   raw bytes of width * height uint8 pixels
+    :param width: (optional) bitmap width, required for raw bytes
+    :param height: (optional) bitmap height, required for raw bytes
+    :param threshold: (optional) pixel value threshold, 'otsu' or 'adaptive'
+    :param invert: (optional) inverts the threshold check
+    :param offset_x: (optional) number of blank pixel columns to prepend
+    :param offset_y: (optional) number of blank pixel rows to prepend
+    :param dither: (optional) dither method
+    """
+    if threshold == 'otsu':
+        bitmap = bitmap_rows(bitmap, width, height)
+        # the dark class is <= the threshold
+        threshold = otsu_threshold(histogram(bitmap)) + (1 if invert else 0)
+    elif threshold == 'adaptive':
+        bitmap = adaptive_threshold(bitmap, width, height, invert=invert)
+        threshold = None
+        invert = False
+        dither = None
+
+    if dither:
+        bitmap = dither_bitmap(bitmap, width, height, dither, threshold, invert)
+        threshold = None
+        invert = False
+
+    raw = isinstance(bitmap, (bytes, bytearray))
+
+    if raw and (width is None or height is None):
+        raise ValueError("width and height are required for raw bytes")
+
+    # ragged rows are padded with blank cells by the pure python path
+    if numpy is not None and (raw or is_array(bitmap) or
+                              len(set(len(row) for row in bitmap)) < 2):
+        if raw:
+            bitmap = numpy.frombuffer(bytes(bitmap), dtype=numpy.uint8)
+            bitmap = bitmap[:width * height].reshape(height, width)
+        return array_bitmap_cells(numpy.asarray(bitmap), threshold, invert,
+                                  offset_x, offset_y)
+
+    if raw:
+        rows = [bitmap[y * width:(y + 1) * width] for y in range(height)]
+    else:
+        rows = [row if isinstance(row, (bytes, bytearray)) else bytearray(row)
+                for row in bitmap]
+
+    width = max(len(row) for row in rows) if rows else 0
+    cols = (offset_x + width + 1) // 2
+    tables = dot_tables(threshold, invert)
+    rows = [None] * offset_y + rows
+    ret = []
+
+    for cell_row in range(0, len(rows), 4):
+        value = 0
+
+        for dy, row in enumerate(rows[cell_row:cell_row + 4]):
+            if row is None:
                 continue
 
-            maxcol = (max_x - 1) // 2 if max_x != None else max(self.chars[rownum].keys())
-            row = []
+            for dx in (0, 1):
+                # pixels of the dx-th dot column of the cells
+                start = (dx - offset_x) % 2
+                dots = row[start::2].translate(tables[dy][dx])
+                dots = b'\0' * ((offset_x + start - dx) // 2) + dots
+                dots += b'\0' * (cols - len(dots))
+                if dots:
+                    value |= int(binascii.hexlify(dots), 16)
 
-            for x in  range(mincol, maxcol+1):
-                char = self.chars[rownum].get(x)
+        ret.append(bytearray(binascii.unhexlify('%0*x' % (cols * 2, value))))
 
-                if not char:
-                    row.append(" ")
-                elif type(char) != int:
-                    row.append(char)
-                else:
-                    row.append(unichr(braille_char_offset+char))
+    return ret
 
-            ret.append(''.join(row))
 
-        return ret
+def array_bitmap_cells(bitmap, threshold=None, invert=False, offset_x=0, offset_y=0):
+    """Vectorized version of :func:`bitmap_cells` for 2-D NumPy arrays."""
+    if threshold is None:
+        on = (bitmap != 0) != bool(invert)
+    elif invert:
+        on = bitmap < threshold
+    else:
+        on = bitmap > threshold
 
+    height, width = on.shape
+    cols = (offset_x + width + 1) // 2
+    lines = (offset_y + height + 3) // 4
+    padded = numpy.zeros((lines * 4, cols * 2), dtype=numpy.uint8)
+    padded[offset_y:offset_y + height, offset_x:offset_x + width] = on
+    weights = numpy.asarray(pixel_map, dtype=numpy.uint8)
+    cells = (padded.reshape(lines, 4, cols, 2) * weights[None, :, None, :]).sum(axis=(1, 3), dtype=numpy.uint8)
 
-    def frame(self, min_x=None, min_y=None, max_x=None, max_y=None):
-        """String representation of the current :class:`Canvas` object pixels.
+    return [bytearray(row.tobytes()) for row in cells]
 
-        :param min_x: (optional) minimum x coordinate of the canvas
-        :param min_y: (optional) minimum y coordinate of the canvas
-        :param max_x: (optional) maximum x coordinate of the canvas
-        :param max_y: (optional) maximum y coordinate of the canvas
-        """
-        ret = self.line_ending.join(self.rows(min_x, min_y, max_x, max_y))
 
-        if IS_PY3:
-            return ret
+def bitmap_rows(bitmap, width=None, height=None):
+    """Returns raw bytes as a 2-D NumPy array, or as a list of bytearray rows
+    without NumPy. Other bitmaps are returned unchanged.
 
-        return ret.encode('utf-8')
+    :param bitmap: 2-D sequence/array of pixels or raw bytes
+    :param width: (optional) bitmap width, required for raw bytes
+    :param height: (optional) bitmap height, required for raw bytes
+    """
+    if not isinstance(bitmap, (bytes, bytearray)):
+        return bitmap
 
+    if width is None or height is None:
+        raise ValueError("width and height are required for raw bytes")
 
-def line(x1, y1, x2, y2):
-    """Returns the coords of the line between (x1, y1), (x2, y2)
+    if numpy is not None:
+        return numpy.frombuffer(bytes(bitmap), dtype=numpy.uint8)[:width * height].reshape(height, width)
 
-    :param x1: x coordinate of the startpoint
-    :param y1: y coordinate of the startpoint
-    :param x2: x coordinate of the endpoint
-    :param y2: y coordinate of the endpoint
+    return [bytearray(bitmap[y * width:(y + 1) * width]) for y in range(height)]
+
+
+def histogram(bitmap, width=None, height=None):
+    """Returns the 256 pixel value counts of a uint8 bitmap.
+
+    :param bitmap: 2-D sequence/array of pixels or raw bytes
+    :param width: (optional) bitmap width, required for raw bytes
+    :param height: (optional) bitmap height, required for raw bytes
     """
+    bitmap = bitmap_rows(bitmap, width, height)
 
-    x1 = normalize(x1)
-    y1 = normalize(y1)
-    x2 = normalize(x2)
-    y2 = normalize(y2)
+    if is_array(bitmap):
+        return numpy.bincount(numpy.asarray(bitmap, dtype=numpy.uint8).ravel(), minlength=256).tolist()
 
-    xdiff = max(x1, x2) - min(x1, x2)
-    ydiff = max(y1, y2) - min(y1, y2)
-    xdir = 1 if x1 <= x2 else -1
-    ydir = 1 if y1 <= y2 else -1
+    counts = Counter()
 
-    r = max(xdiff, ydiff)
+    for row in bitmap:
+        counts.update(row)
 
-    for i in range(r+1):
-        x = x1
-        y = y1
+    return [counts[v] for v in range(256)]
 
-        if ydiff:
-            y += (float(i) * ydiff) / r * ydir
-        if xdiff:
-            x += (float(i) * xdiff) / r * xdir
 
-        yield (x, y)
+def otsu_threshold(histogram):
+    """Returns the threshold which separates the pixel values into the two
+    classes of the largest between-class variance (Otsu's method), pixels
+    greater than the threshold are the brighter class.
 
+    :param histogram: 256 pixel value counts, see :func:`histogram`
+    """
+    total = sum(histogram)
+    value_sum = sum(v * n for v, n in enumerate(histogram))
+    count = acc = 0
+    best, threshold = -1.0, 0
 
-def polygon(center_x=0, center_y=0, sides=4, radius=4):
-    degree = float(360) / sides
+    for t, n in enumerate(histogram[:255]):
+        count += n
+        acc += t * n
+        if not count or count == total:
+            continue
+        mean_low = acc / float(count)
+        mean_high = (value_sum - acc) / float(total - count)
+        variance = count * (total - count) * (mean_low - mean_high) ** 2
+        if variance > best:
+            best, threshold = variance, t
 
-    for n in range(sides):
-        a = n * degree
-        b = (n + 1) * degree
-        x1 = (center_x + math.cos(math.radians(a))) * (radius + 1) / 2
-        y1 = (center_y + math.sin(math.radians(a))) * (radius + 1) / 2
-        x2 = (center_x + math.cos(math.radians(b))) * (radius + 1) / 2
-        y2 = (center_y + math.sin(math.radians(b))) * (radius + 1) / 2
+    return threshold
 
-        for x, y in line(x1, y1, x2, y2):
-            yield x, y
 
+def adaptive_threshold(bitmap, width=None, height=None, size=15, offset=8, invert=False):
+    """Threshold each pixel against the mean of the ``size`` x ``size``
+    window around it, computed with a summed-area table.
 
-class Turtle(Canvas):
-    """Turtle graphics interface
-    http://en.wikipedia.org/wiki/Turtle_graphics
+    Returns a list of bytearrays (a uint8 array with NumPy) of 0 / 1 pixels
+    which can be passed to :func:`bitmap_cells`. A pixel is set if it is
+    brighter than the local mean by more than ``offset`` (darker, if
+    ``invert``).
+
+    :param bitmap: 2-D sequence (or NumPy array) of uint8 pixels, or raw
+                   bytes of width * height uint8 pixels
+    :param width: (optional) bitmap width, required for raw bytes
+    :param height: (optional) bitmap height, required for raw bytes
+    :param size: (optional) Integer. Window size in pixels
+    :param offset: (optional) required difference from the local mean
+    :param invert: (optional) set the dots of the dark pixels
     """
+    bitmap = bitmap_rows(bitmap, width, height)
+    r = size // 2
 
-    def __init__(self, pos_x=0, pos_y=0):
-        self.pos_x = pos_x
-        self.pos_y = pos_y
-        self.rotation = 0
-        self.brush_on = True
-        super(Turtle, self).__init__()
+    if is_array(bitmap):
+        values = numpy.asarray(bitmap, dtype=numpy.int64)
+        height, width = values.shape
+        table = numpy.zeros((height + 1, width + 1), dtype=numpy.int64)
+        table[1:, 1:] = values.cumsum(0).cumsum(1)
+        y0 = numpy.clip(numpy.arange(height) - r, 0, height)[:, None]
+        y1 = numpy.clip(numpy.arange(height) + r + 1, 0, height)[:, None]
+        x0 = numpy.clip(numpy.arange(width) - r, 0, width)[None, :]
+        x1 = numpy.clip(numpy.arange(width) + r + 1, 0, width)[None, :]
+        sums = table[y1, x1] - table[y0, x1] - table[y1, x0] + table[y0, x0]
+        area = (y1 - y0) * (x1 - x0)
+        if invert:
+            return (values * area < sums - offset * area).astype(numpy.uint8)
+        return (values * area > sums + offset * area).astype(numpy.uint8)
 
+    rows = [list(row) for row in bitmap]
+    height = len(rows)
+    width = max(len(row) for row in rows) if rows else 0
+    # table[y][x] is the sum of the pixels above and left of (x, y)
+    table = [[0] * (width + 1)]
 
-    def up(self):
-        """Pull the brush up."""
-        self.brush_on = False
+    for row in rows:
+        above = table[-1]
+        line = [0] * (width + 1)
+        total = 0
+        for x, value in enumerate(row):
+            total += value
+            line[x + 1] = above[x + 1] + total
+        for x in range(len(row), width):
+            line[x + 1] = above[x + 1] + total
+        table.append(line)
 
+    x0 = [max(x - r, 0) for x in range(width)]
+    x1 = [min(x + r + 1, width) for x in range(width)]
+    ret = []
 
-    def down(self):
-        """Push the brush down."""
-        self.brush_on = True
+    for y, row in enumerate(rows):
+        y0 = max(y - r, 0)
+        y1 = min(y + r + 1, height)
+        top = table[y0]
+        bottom = table[y1]
+        column_sums = [b - t for b, t in zip(bottom, top)]
+        h = y1 - y0
+        out = bytearray(width)
 
+        for x, value in enumerate(row):
+            area = h * (x1[x] - x0[x])
+            local = column_sums[x1[x]] - column_sums[x0[x]]
+            if invert:
+                out[x] = value * area < local - offset * area
+            else:
+                out[x] = value * area > local + offset * area
 
-    def forward(self, step):
-        """Move the turtle forward.
+        ret.append(out)
 
-        :param step: Integer. Distance to move forward.
-        """
-        x = self.pos_x + math.cos(math.radians(self.rotation)) * step
-        y = self.pos_y + math.sin(math.radians(self.rotation)) * step
-        prev_brush_state = self.brush_on
-        self.brush_on = True
-        self.move(x, y)
-        self.brush_on = prev_brush_state
+    return ret
 
 
-    def move(self, x, y):
-        """Move the turtle to a coordinate.
+class TemporalThreshold(object):
+    """Exponentially smoothed threshold for video frames, avoids flicker
+    when the threshold of consecutive frames (e.g. :func:`otsu_threshold`)
+    changes slightly.
 
-        :param x: x coordinate
-        :param y: y coordinate
-        """
-        if self.brush_on:
-            for lx, ly in line(self.pos_x, self.pos_y, x, y):
-                self.set(lx, ly)
+    :param smoothing: (optional) Float. Weight of the previous value (0 - 1)
+    :param cut: (optional) a change bigger than this is taken as is
+                (e.g. scene cut)
+    """
 
-        self.pos_x = x
-        self.pos_y = y
+    def __init__(self, smoothing=0.8, cut=None):
+        self.smoothing = smoothing
+        self.cut = cut
+        self.value = None
 
 
-    def right(self, angle):
-        """Rotate the turtle (positive direction).
+    def update(self, threshold):
+        """Returns the smoothed threshold after a new frame.
 
-        :param angle: Integer. Rotation angle in degrees.
+        :param threshold: threshold of the new frame
         """
-        self.rotation += angle
+        if self.value is None or (self.cut is not None and abs(threshold - self.value) > self.cut):
+            self.value = float(threshold)
+        else:
+            self.value = self.smoothing * self.value + (1 - self.smoothing) * threshold
 
+        return self.value
 
-    def left(self, angle):
-        """Rotate the turtle (negative direction).
 
-        :param angle: Integer. Rotation angle in degrees.
-        """
-        self.rotation -= angle
+def bayer_matrix(size=8):
+    """Returns the ``size`` x ``size`` Bayer index matrix (0 .. size**2 - 1),
+    size must be a power of 2."""
+    matrix = [[0]]
 
+    while len(matrix) < size:
+        s = len(matrix)
+        matrix = [[4 * matrix[y % s][x % s] + (0, 2, 3, 1)[(y // s) * 2 + x // s]
+                   for x in range(2 * s)] for y in range(2 * s)]
 
-    def back(self, step):
-        """Move the turtle backwards.
+    return matrix
 
-        :param step: Integer. Distance to move backwards.
-        """
-        self.forward(-step)
 
+def blue_noise_matrix(size=16, sigma=1.5, seed=0):
+    """Returns a ``size`` x ``size`` blue noise index matrix (0 .. size**2 - 1)
+    computed with the void-and-cluster method."""
+    n = size * size
+    kernel = [math.exp(-(min(dx, size - dx) ** 2 + min(dy, size - dy) ** 2) / (2.0 * sigma ** 2))
+              for dy in range(size) for dx in range(size)]
 
-    # aliases
-    pu = up
-    pd = down
-    fd = forward
-    mv = move
-    rt = right
-    lt = left
-    bk = back
+    def offsets(p):
+        py, px = divmod(p, size)
+        return [kernel[((i // size - py) % size) * size + (i % size - px) % size]
+                for i in range(n)]
 
+    table = [offsets(p) for p in range(n)]
+    rnd = Random(seed)
+    ones = set(rnd.sample(range(n), n // 10))
+    energy = [sum(table[p][i] for p in ones) for i in range(n)]
 
-def animate(canvas, fn, delay=1./24, *args, **kwargs):
-    """Animation automation function
+    def update(p, sign):
+        for i, k in enumerate(table[p]):
+            energy[i] += sign * k
 
-    :param canvas: :class:`Canvas` object
-    :param fn: Callable. Frame coord generator
-    :param delay: Float. Delay between frames.
-    :param *args, **kwargs: optional fn parameters
-    """
+    # move the tightest cluster to the largest void until they meet
+    while True:
+        cluster = max(ones, key=energy.__getitem__)
+        update(cluster, -1)
+        ones.remove(cluster)
+        void = min((i for i in range(n) if i not in ones), key=energy.__getitem__)
+        update(void, 1)
+        ones.add(void)
+        if void == cluster:
+            break
 
-    # python2 unicode curses fix
-    if not IS_PY3:
-        import locale
-        locale.setlocale(locale.LC_ALL, "")
+    ranks = [0] * n
+    initial = set(ones)
+    saved = list(energy)
 
-    def animation(stdscr):
+    for rank in range(len(ones) - 1, -1, -1):
+        cluster = max(ones, key=energy.__getitem__)
+        update(cluster, -1)
+        ones.remove(cluster)
+        ranks[cluster] = rank
 
-        for frame in fn(*args, **kwargs):
-            for x,y in frame:
-                canvas.set(x,y)
+    ones = initial
+    energy = saved
+
+    for rank in range(len(ones), n):
+        void = min((i for i in range(n) if i not in ones), key=energy.__getitem__)
+        update(void, 1)
+        ones.add(void)
+        ranks[void] = rank
+
+    return [ranks[y * size:(y + 1) * size] for y in range(size)]
+
+
+def threshold_matrix(method):
+    """Returns the pixel value thresholds of an ordered dither method
+    (``'bayer'`` or ``'blue-noise'``), cached."""
+    if method not in threshold_matrices:
+        if method == 'bayer':
+            matrix = bayer_matrix()
+        elif method == 'blue-noise':
+            matrix = blue_noise_matrix()
+        else:
+            raise ValueError("unknown ordered dither method: {0}".format(method))
+        n = len(matrix) * len(matrix[0])
+        # evenly spread in (0, 255): black never, white always sets the dot
+        threshold_matrices[method] = [[(v + 0.5) * 255.0 / n for v in row]
+                                      for row in matrix]
+
+    return threshold_matrices[method]
+
+
+def dither_bitmap(bitmap, width=None, height=None, method='bayer', threshold=None,
+                  invert=False):
+    """Dither a grayscale bitmap to 0 / 1 pixels.
+
+    Returns a list of bytearrays (a uint8 array for NumPy input) which can
+    be passed to :func:`bitmap_cells`.
+
+    :param bitmap: 2-D sequence (or NumPy array) of uint8 pixels, or raw
+                   bytes of width * height uint8 pixels
+    :param width: (optional) bitmap width, required for raw bytes
+    :param height: (optional) bitmap height, required for raw bytes
+    :param method: (optional) ``'bayer'``, ``'blue-noise'`` (ordered) or
+                   ``'floyd-steinberg'`` (error diffusion)
+    :param threshold: (optional) mid gray level, defaults to 128
+    :param invert: (optional) set the dots of the dark pixels
+    """
+    if threshold is None:
+        threshold = 128
+
+    bitmap = bitmap_rows(bitmap, width, height)
+
+    if invert:
+        threshold = 255 - threshold
+
+    if is_array(bitmap):
+        bitmap = numpy.asarray(bitmap, dtype=numpy.int16)
+        if invert:
+            bitmap = 255 - bitmap
+        if method == 'floyd-steinberg':
+            if bitmap.size >= 1 << 16:
+                return array_error_diffusion(bitmap, threshold)
+            rows = error_diffusion(bitmap.tolist(), threshold)
+            return numpy.array([list(row) for row in rows], dtype=numpy.uint8).reshape(bitmap.shape)
+        matrix = numpy.asarray(threshold_matrix(method)) + (threshold - 128)
+        height, width = bitmap.shape
+        size_y, size_x = matrix.shape
+        tiled = matrix[(numpy.arange(height) % size_y)[:, None], numpy.arange(width) % size_x]
+        return (bitmap > tiled).astype(numpy.uint8)
+
+    rows = [row if isinstance(row, bytearray) else bytearray(row) for row in bitmap]
+
+    if invert:
+        table = bytes(bytearray(255 - v for v in range(256)))
+        rows = [row.translate(table) for row in rows]
+
+    if method == 'floyd-steinberg':
+        return error_diffusion(rows, threshold)
+
+    tables = ordered_dither_tables(method, threshold)
+    size = len(tables[0])
+    ret = []
+
+    for y, row in enumerate(rows):
+        out = bytearray(len(row))
+        for x, table in enumerate(tables[y % len(tables)]):
+            # every size-th pixel of the row has the same threshold
+            out[x::size] = row[x::size].translate(table)
+        ret.append(out)
+
+    return ret
+
+
+def ordered_dither_tables(method, threshold=128):
+    """Returns the translation tables of ordered dithering, ``tables[y][x]``
+    maps a pixel value to 0 / 1 at that position of the matrix (cached)."""
+    key = (method, threshold)
+
+    if key not in dither_tables:
+        offset = threshold - 128
+        dither_tables[key] = [[bytes(bytearray(1 if v > t + offset else 0 for v in range(256)))
+                               for t in row] for row in threshold_matrix(method)]
+
+    return dither_tables[key]
+
+
+def error_diffusion(rows, threshold=128):
+    """Floyd-Steinberg dithering, processed one row at a time. Returns a
+    list of bytearrays of 0 / 1 pixels.
+
+    This is a pure Python loop, large NumPy bitmaps are dithered by
+    :func:`array_error_diffusion` instead.
+
+    :param rows: list of rows of pixel values
+    :param threshold: (optional) mid gray level
+    """
+    width = max(len(row) for row in rows) if rows else 0
+    below = [0.0] * (width + 2)
+    ret = []
+
+    for row in rows:
+        # errors carried into this row, offset by one for x - 1
+        current = below
+        below = [0.0] * (width + 2)
+        out = bytearray(width)
+        carry = 0.0
+
+        for x, value in enumerate(row):
+            value += current[x + 1] + carry
+            if value > threshold:
+                out[x] = 1
+                error = value - 255
+            else:
+                error = value
+            carry = error * 0.4375
+            below[x] += error * 0.1875
+            below[x + 1] += error * 0.3125
+            below[x + 2] += error * 0.0625
+
+        ret.append(out)
+
+    return ret
+
+
+def array_error_diffusion(bitmap, threshold=128):
+    """Floyd-Steinberg dithering of a NumPy array. Returns a uint8 array of
+    0 / 1 pixels, the same as :func:`error_diffusion`.
+
+    A pixel depends on its left neighbour and on three pixels of the row
+    above, so the pixels with the same ``x + 2 * y`` are processed together
+    along the anti-diagonals. The per-diagonal overhead makes it slower
+    than the row loop below about 64k pixels.
+
+    :param bitmap: 2-D array of pixel values
+    :param threshold: (optional) mid gray level
+    """
+    height, width = bitmap.shape
+    out = numpy.zeros(height * width, dtype=numpy.uint8)
+
+    if not out.size:
+        return out.reshape(height, width)
+
+    stride = width + 2
+    pixels = numpy.asarray(bitmap, dtype=float).ravel()
+    # errors with a zero row above and zero columns on both sides
+    errors = numpy.zeros((height + 1) * stride)
+    ys, xs = numpy.mgrid[:height, :width]
+    diagonals = (xs + 2 * ys).ravel()
+    order = numpy.argsort(diagonals, kind='stable')
+    bounds = numpy.searchsorted(diagonals[order], numpy.arange(diagonals.max() + 2)).tolist()
+    slots = ((ys.ravel() + 1) * stride + xs.ravel() + 1)[order]
+
+    for lo, hi in zip(bounds, bounds[1:]):
+        index = order[lo:hi]
+        slot = slots[lo:hi]
+        # summed in the order of error_diffusion for the same rounding
+        value = pixels[index] + (((errors[slot - stride - 1] * 0.0625 +
+                                   errors[slot - stride] * 0.3125) +
+                                  errors[slot - stride + 1] * 0.1875) +
+                                 errors[slot - 1] * 0.4375)
+        on = value > threshold
+        out[index] = on
+        value[on] -= 255
+        errors[slot] = value
+
+    return out.reshape(height, width)
+
+
+class Canvas(object):
+    """This class implements the pixel surface."""
+
+    def __init__(self, line_ending=os.linesep, clip=None):
+        super(Canvas, self).__init__()
+        self.clip = None
+        self.clear()
+        self.line_ending = line_ending
+        self.set_clip(*(clip or ()))
+
+
+    def clear(self):
+        """Remove all pixels and colors from the :class:`Canvas` object."""
+        self.chars = defaultdict(intdefaultdict)
+        self.colors = defaultdict(dict)
+        self._clear_palette()
+        self._row_cache = {}
+        self._bbox = None
+        self._bbox_stale = False
+
+
+    def set(self, x, y):
+        """Set a pixel of the :class:`Canvas` object.
+
+        :param x: x coordinate of the pixel
+        :param y: y coordinate of the pixel
+        """
+        if type(x) is not int:
+            x = normalize(x)
+        if type(y) is not int:
+            y = normalize(y)
+        clip = self.clip
+
+        if clip is not None and not (clip[0] <= x < clip[2] and clip[1] <= y < clip[3]):
+            return
+
+        col = x >> 1
+        row = y >> 2
+        cells = self.chars[row]
+        char = cells[col]
+        dot = pixel_map[y & 3][x & 1]
+
+        if type(char) != int or char & dot:
+            return
+
+        self._row_cache.pop(row, None)
+        cells[col] = char | dot
+
+        if char:
+            # an occupied cell is within the bounding box
+            return
+
+        b = self._bbox
+        if b is None:
+            self._bbox = [row, row, col, col]
+        else:
+            if row < b[0]:
+                b[0] = row
+            elif row > b[1]:
+                b[1] = row
+            if col < b[2]:
+                b[2] = col
+            elif col > b[3]:
+                b[3] = col
+
+
+    def unset(self, x, y):
+        """Unset a pixel of the :class:`Canvas` object.
+
+        :param x: x coordinate of the pixel
+        :param y: y coordinate of the pixel
+        """
+        x = normalize(x)
+        y = normalize(y)
+        clip = self.clip
+
+        if clip is not None and not (clip[0] <= x < clip[2] and clip[1] <= y < clip[3]):
+            return
+
+        col, row = get_pos(x, y)
+        self._row_cache.pop(row, None)
+
+        if type(self.chars[row][col]) == int:
+            self.chars[row][col] &= ~pixel_map[y % 4][x % 2]
+
+        if type(self.chars[row][col]) != int or self.chars[row][col] == 0:
+            del(self.chars[row][col])
+            self._shrink_bbox(row, col)
+
+        if not self.chars.get(row):
+            del(self.chars[row])
+
+
+    def toggle(self, x, y):
+        """Toggle a pixel of the :class:`Canvas` object.
+
+        :param x: x coordinate of the pixel
+        :param y: y coordinate of the pixel
+        """
+        x = normalize(x)
+        y = normalize(y)
+
+        if not inside(self.clip, x, y):
+            return
+
+        col, row = get_pos(x, y)
+
+        if type(self.chars[row][col]) != int or self.chars[row][col] & pixel_map[y % 4][x % 2]:
+            self.unset(x, y)
+        else:
+            self.set(x, y)
+
+
+    def set_text(self, x, y, text):
+        """Set text to the given coords.
+
+        :param x: x coordinate of the text start position
+        :param y: y coordinate of the text start position
+        """
+        col, row = get_pos(x, y)
+        first, last = col, col + len(text) - 1
+
+        if self.clip is not None:
+            minrow, maxrow, mincol, maxcol = clip_cell_range(self.clip)
+
+            if not minrow <= row <= maxrow:
+                return
+
+            first = max(first, mincol)
+            last = min(last, maxcol)
+
+        if first > last:
+            return
+
+        self._row_cache.pop(row, None)
+
+        for i in range(first, last + 1):
+            self.chars[row][i] = text[i - col]
+
+        self._grow_bbox(row, row, first, last)
+
+
+    def get(self, x, y):
+        """Get the state of a pixel. Returns bool.
+
+        :param x: x coordinate of the pixel
+        :param y: y coordinate of the pixel
+        """
+        x = normalize(x)
+        y = normalize(y)
+        dot_index = pixel_map[y % 4][x % 2]
+        col, row = get_pos(x, y)
+        char = self.chars.get(row, {}).get(col)
+
+        if not char:
+            return False
+
+        if type(char) != int:
+            return True
+
+        return bool(char & dot_index)
+
+
+    def set_many(self, xs, ys=None):
+        """Set many pixels of the :class:`Canvas` object in one pass.
+
+        :param xs: iterable of (x, y) pairs, or x coordinates if ys is given
+        :param ys: (optional) y coordinates parallel to xs
+        """
+        self._update_many(xs, ys, 'set')
+
+
+    def unset_many(self, xs, ys=None):
+        """Unset many pixels of the :class:`Canvas` object in one pass.
+
+        :param xs: iterable of (x, y) pairs, or x coordinates if ys is given
+        :param ys: (optional) y coordinates parallel to xs
+        """
+        self._update_many(xs, ys, 'unset')
+
+
+    def toggle_many(self, xs, ys=None):
+        """Toggle many pixels of the :class:`Canvas` object in one pass.
+
+        A pixel listed twice is toggled twice.
+
+        :param xs: iterable of (x, y) pairs, or x coordinates if ys is given
+        :param ys: (optional) y coordinates parallel to xs
+        """
+        self._update_many(xs, ys, 'toggle')
+
+
+    def _group_cells(self, xs, ys, toggle):
+        """Returns the ``{row: {col: mask}}`` cells of the pixels within the
+        clip rectangle, see :func:`group_cells`."""
+        if not (is_array(xs) or is_array(ys)):
+            return group_cells(xs, ys, toggle, self.clip)
+
+        xs, ys = array_coords(xs, ys)
+        if self.clip is not None:
+            keep = array_inside(self.clip, xs, ys)
+            xs = xs[keep]
+            ys = ys[keep]
+        rows, cols, masks = array_group_cells(xs, ys, toggle=toggle)
+        cells = defaultdict(intdefaultdict)
+        for row, col, mask in zip(rows.tolist(), cols.tolist(), masks.tolist()):
+            cells[row][col] = mask
+
+        return cells
+
+
+    def _update_many(self, xs, ys, op):
+        cells = self._group_cells(xs, ys, op == 'toggle')
+
+        for rownum, masks in cells.items():
+            self._row_cache.pop(rownum, None)
+            row = self.chars[rownum]
+            added = []
+
+            for col, mask in masks.items():
+                char = row[col]
+
+                if type(char) != int:
+                    if op != 'set':
+                        del row[col]
+                        self._shrink_bbox(rownum, col)
+                    continue
+
+                if op == 'set':
+                    char |= mask
+                elif op == 'unset':
+                    char &= ~mask
+                else:
+                    char ^= mask
+
+                if char:
+                    row[col] = char
+                    added.append(col)
+                else:
+                    del row[col]
+                    self._shrink_bbox(rownum, col)
+
+            if added:
+                self._grow_bbox(rownum, rownum, min(added), max(added))
+
+            if not row:
+                del self.chars[rownum]
+
+
+    def blit_bitmap(self, bitmap, width=None, height=None, x=0, y=0,
+                    threshold=None, invert=False, dither=None):
+        """Set the pixels of a bitmap, its top left corner placed at x, y.
+
+        See :func:`bitmap_cells` for the supported bitmap formats.
+
+        :param bitmap: 2-D sequence/array of pixels or raw bytes
+        :param width: (optional) bitmap width, required for raw bytes
+        :param height: (optional) bitmap height, required for raw bytes
+        :param x: (optional) x coordinate of the bitmap
+        :param y: (optional) y coordinate of the bitmap
+        :param threshold: (optional) pixel value threshold
+        :param invert: (optional) inverts the threshold check
+        :param dither: (optional) dither method, see :func:`dither_bitmap`
+        """
+        x = normalize(x)
+        y = normalize(y)
+        cells = bitmap_cells(bitmap, width, height, threshold, invert, x % 2, y % 4, dither)
+        self._blit_cells(cells, x // 2, y // 4)
+
+
+    @classmethod
+    def from_bitmap(cls, bitmap, width=None, height=None, threshold=None,
+                    invert=False, dither=None, **kwargs):
+        """Returns a new canvas holding the pixels of a bitmap.
+
+        :param bitmap: 2-D sequence/array of pixels or raw bytes
+        :param width: (optional) bitmap width, required for raw bytes
+        :param height: (optional) bitmap height, required for raw bytes
+        :param threshold: (optional) pixel value threshold
+        :param invert: (optional) inverts the threshold check
+        :param dither: (optional) dither method, see :func:`dither_bitmap`
+        :param **kwargs: optional canvas parameters
+        """
+        canvas = cls(**kwargs)
+        canvas.blit_bitmap(bitmap, width, height, threshold=threshold, invert=invert,
+                           dither=dither)
+        return canvas
+
+
+    def _blit_cells(self, cells, col, row):
+        cells, col, row = self._clip_cells(cells, col, row)
+
+        for rownum, codes in enumerate(cells, row):
+            target = None
+
+            for colnum, code in enumerate(codes, col):
+                if not code:
+                    continue
+
+                if target is None:
+                    self._row_cache.pop(rownum, None)
+                    target = self.chars[rownum]
+                    first = colnum
+
+                char = target[colnum]
+
+                if type(char) == int:
+                    target[colnum] = char | code
+
+                last = colnum
+
+            if target is not None:
+                self._grow_bbox(rownum, rownum, first, last)
+
+
+    def line(self, x1, y1, x2, y2):
+        """Draw a line between (x1, y1), (x2, y2).
+
+        :param x1: x coordinate of the startpoint
+        :param y1: y coordinate of the startpoint
+        :param x2: x coordinate of the endpoint
+        :param y2: y coordinate of the endpoint
+        """
+        self._set_cells(line_cells(x1, y1, x2, y2, clip=self.clip))
+
+
+    def polyline(self, points, closed=False):
+        """Draw lines connecting the points.
+
+        :param points: list of (x, y) tuples
+        :param closed: (optional) connect the last point to the first one
+        """
+        points = list(points)
+
+        if closed and len(points) > 1:
+            points.append(points[0])
+
+        if len(points) == 1:
+            self.set(*points[0])
+
+        for i, ((x1, y1), (x2, y2)) in enumerate(zip(points, points[1:])):
+            self._set_cells(line_cells(x1, y1, x2, y2, i, self.clip))
+
+
+    def fill_spans(self, spans):
+        """Set horizontal runs of pixels.
+
+        :param spans: iterable of (y, x1, x2) tuples, x2 is inclusive
+        """
+        rows = defaultdict(list)
+        clip = self.clip
+
+        for y, x1, x2 in spans:
+            y = normalize(y)
+            x1 = normalize(x1)
+            x2 = normalize(x2)
+            if clip is not None:
+                if not clip[1] <= y < clip[3]:
+                    continue
+                x1 = max(x1, clip[0])
+                x2 = min(x2, clip[2] - 1)
+            if x1 <= x2:
+                rows[y >> 2].append((y & 3, x1, x2))
+
+        for rownum, row_spans in rows.items():
+            col, cells = span_cells(row_spans)
+            self._blit_cells([cells], col, rownum)
+
+
+    def circle(self, x, y, radius, fill=False):
+        """Draw a circle.
+
+        :param x: x coordinate of the center
+        :param y: y coordinate of the center
+        :param radius: radius of the circle
+        :param fill: (optional) draw a filled circle
+        """
+        if not self._visible(x - radius, y - radius, x + radius, y + radius):
+            return
+
+        if fill:
+            self.fill_spans(ellipse_spans(x, y, radius, radius, self.clip))
+        else:
+            self.set_many(circle(x, y, radius, self.clip))
+
+
+    def ellipse(self, x, y, radius_x, radius_y, fill=False):
+        """Draw an ellipse.
+
+        :param x: x coordinate of the center
+        :param y: y coordinate of the center
+        :param radius_x: horizontal radius
+        :param radius_y: vertical radius
+        :param fill: (optional) draw a filled ellipse
+        """
+        if not self._visible(x - radius_x, y - radius_y, x + radius_x, y + radius_y):
+            return
+
+        if fill:
+            self.fill_spans(ellipse_spans(x, y, radius_x, radius_y, self.clip))
+        else:
+            self.set_many(ellipse(x, y, radius_x, radius_y, self.clip))
+
+
+    def arc(self, x, y, radius, start, end, fill=False):
+        """Draw a circular arc, see :func:`arc`.
+
+        :param x: x coordinate of the center
+        :param y: y coordinate of the center
+        :param radius: radius of the arc
+        :param start: start angle in degrees
+        :param end: end angle in degrees
+        :param fill: (optional) draw a filled circular sector (pie slice)
+        """
+        if not self._visible(x - radius, y - radius, x + radius, y + radius):
+            return
+
+        if fill:
+            self.fill_polygon([(x, y)] + arc_vertices(x, y, radius, start, end))
+        else:
+            self.set_many(arc(x, y, radius, start, end, self.clip))
+
+
+    def fill_polygon(self, points):
+        """Draw a filled polygon.
+
+        :param points: list of (x, y) vertices
+        """
+        points = list(points)
+        self.fill_spans(polygon_spans(points, self.clip))
+        self.polyline(points, closed=True)
+
+
+    def translate(self, dx, dy):
+        """Move all pixels by dx, dy. Pixels moved outside of the clip
+        rectangle are dropped, text and colors move by whole cells
+        (``dx // 2``, ``dy // 4``).
+
+        Moves by multiples of 2 columns and 4 rows copy whole cells, other
+        moves shift the dots with the tables of :func:`dot_shift_tables`.
+
+        :param dx: horizontal offset in pixels
+        :param dy: vertical offset in pixels
+        """
+        dx = normalize(dx)
+        dy = normalize(dy)
+        blocks = self._cell_blocks()
+
+        if dx % 2 or dy % 4:
+            blocks = [(row, col, shift_cells(cells, dx % 2, dy % 4))
+                      for row, col, cells in blocks]
+
+        self._rebuild([(row + dy // 4, col + dx // 2, cells) for row, col, cells in blocks],
+                      dx // 2, dy // 4)
+
+
+    def union(self, other):
+        """Add the pixels of another canvas, in place.
+
+        The boolean operations combine the dots cell by cell and keep the
+        text of this canvas, the text of the other canvas is ignored.
+
+        :param other: :class:`Canvas` object (or any subclass)
+        """
+        for row, col, cells in other._cell_blocks():
+            self._blit_cells(cells, col, row)
+
+
+    def intersection(self, other):
+        """Keep only the pixels which are set in another canvas too, in
+        place, see :meth:`union`.
+
+        :param other: :class:`Canvas` object (or any subclass)
+        """
+        self._rebuild(self._combine_blocks(self._cell_blocks(), other, and_bytes))
+
+
+    def difference(self, other):
+        """Remove the pixels which are set in another canvas, in place, see
+        :meth:`union`.
+
+        :param other: :class:`Canvas` object (or any subclass)
+        """
+        self._rebuild(self._combine_blocks(self._cell_blocks(), other, mask_bytes))
+
+
+    def symmetric_difference(self, other):
+        """Keep the pixels which are set in exactly one of the canvases, in
+        place, see :meth:`union`.
+
+        :param other: :class:`Canvas` object (or any subclass)
+        """
+        blocks = self._combine_blocks(self._cell_blocks(), other, xor_bytes)
+        blocks += self._combine_blocks(other._cell_blocks(), self, mask_bytes)
+        self._rebuild(blocks)
+
+
+    def __ior__(self, other):
+        self.union(other)
+        return self
+
+
+    def __iand__(self, other):
+        self.intersection(other)
+        return self
+
+
+    def __isub__(self, other):
+        self.difference(other)
+        return self
+
+
+    def __ixor__(self, other):
+        self.symmetric_difference(other)
+        return self
+
+
+    def set_clip(self, min_x=None, min_y=None, max_x=None, max_y=None):
+        """Restrict drawing to a rectangle, pixels outside of it are
+        discarded when written. Pixels already outside of the new rectangle
+        are removed. Called without parameters the clip is removed.
+
+        :param min_x: (optional) minimum x coordinate of the clip rectangle
+        :param min_y: (optional) minimum y coordinate of the clip rectangle
+        :param max_x: (optional) maximum x coordinate of the clip rectangle, exclusive
+        :param max_y: (optional) maximum y coordinate of the clip rectangle, exclusive
+        """
+        if min_x is None:
+            self.clip = None
+            return
+
+        self.clip = (normalize(min_x), normalize(min_y), normalize(max_x), normalize(max_y))
+        self._crop()
+
+
+    def _crop(self):
+        """Remove the dots outside of the clip rectangle."""
+        for rownum in list(self.chars.keys()):
+            row = self.chars[rownum]
+
+            for col in list(row.keys()):
+                mask = clip_mask(self.clip, rownum, col)
+                char = row[col]
+
+                if mask == 0xFF or (mask and type(char) != int):
+                    continue
+
+                if type(char) == int and char & mask:
+                    row[col] = char & mask
+                else:
+                    del row[col]
+
+            if not row:
+                del self.chars[rownum]
+
+        self._row_cache = {}
+        self._bbox_stale = True
+
+
+    def _visible(self, min_x, min_y, max_x, max_y):
+        """Returns False if the rectangle (max inclusive) is entirely
+        outside of the clip rectangle."""
+        clip = self.clip
+
+        return clip is None or (min_x < clip[2] and max_x >= clip[0] and
+                                min_y < clip[3] and max_y >= clip[1])
+
+
+    def _clip_cells(self, cells, col, row):
+        """Crop a list of bytearray cell rows, placed at col, row, to the
+        clip rectangle. Returns the new (cells, col, row)."""
+        clip = self.clip
+
+        if clip is None:
+            return cells, col, row
+
+        minrow, maxrow, mincol, maxcol = clip_cell_range(clip)
+        first = max(minrow - row, 0)
+        cells = cells[first:max(maxrow - row + 1, 0)]
+        row += first
+        start = max(mincol - col, 0)
+        stop = max(maxcol - col + 1, 0)
+        col += start
+        ret = []
+
+        for rownum, codes in enumerate(cells, row):
+            codes = bytearray(codes[start:stop])
+
+            if codes and rownum in (minrow, maxrow):
+                mask = clip_mask(clip, rownum)
+                if mask != 0xFF:
+                    codes = codes.translate(bytearray(i & mask for i in range(256)))
+
+            if codes and col == mincol:
+                codes[0] &= clip_mask(clip, rownum, col)
+
+            if codes and col + len(codes) - 1 == maxcol:
+                codes[-1] &= clip_mask(clip, rownum, maxcol)
+
+            ret.append(codes)
+
+        return ret, col, row
+
+
+    def _set_cells(self, cells):
+        """Set the dots of (row, col, mask) cells."""
+        chars = self.chars
+        cache = self._row_cache
+        rows = []
+        cols = []
+
+        for rownum, col, mask in cells:
+            row = chars[rownum]
+            char = row[col]
+
+            if type(char) == int:
+                row[col] = char | mask
+                cache.pop(rownum, None)
+                rows.append(rownum)
+                cols.append(col)
+
+        if rows:
+            self._grow_bbox(min(rows), max(rows), min(cols), max(cols))
+
+
+    def set_color(self, x, y, fg=None, bg=None):
+        """Set the colors of the cell of a pixel.
+
+        :param x: x coordinate of the pixel
+        :param y: y coordinate of the pixel
+        :param fg: (optional) foreground color, see :func:`parse_color`
+        :param bg: (optional) background color, see :func:`parse_color`
+        """
+        x = normalize(x)
+        y = normalize(y)
+        self.fill_color(x, y, x + 1, y + 1, fg, bg)
+
+
+    def fill_color(self, min_x, min_y, max_x, max_y, fg=None, bg=None):
+        """Set the colors of the cells of a rectangle, None resets the
+        default color.
+
+        :param min_x: minimum x coordinate of the rectangle
+        :param min_y: minimum y coordinate of the rectangle
+        :param max_x: maximum x coordinate of the rectangle, exclusive
+        :param max_y: maximum y coordinate of the rectangle, exclusive
+        :param fg: (optional) foreground color, see :func:`parse_color`
+        :param bg: (optional) background color, see :func:`parse_color`
+        """
+        minrow, maxrow = normalize(min_y) // 4, (normalize(max_y) - 1) // 4
+        mincol, maxcol = normalize(min_x) // 2, (normalize(max_x) - 1) // 2
+
+        if self.clip is not None:
+            rows = clip_cell_range(self.clip)
+            minrow, maxrow = max(minrow, rows[0]), min(maxrow, rows[1])
+            mincol, maxcol = max(mincol, rows[2]), min(maxcol, rows[3])
+
+        if minrow <= maxrow and mincol <= maxcol:
+            code = self._color_index(fg) | self._color_index(bg) << 8
+            self._store_colors(minrow, maxrow, mincol, maxcol, code)
+
+
+    def color_rows(self, min_x=None, min_y=None, max_x=None, max_y=None, mode=256):
+        """Returns the lines of :meth:`rows` with ANSI color escapes, a
+        color is only written where it changes along a row.
+
+        :param min_x: (optional) minimum x coordinate of the canvas
+        :param min_y: (optional) minimum y coordinate of the canvas
+        :param max_x: (optional) maximum x coordinate of the canvas
+        :param max_y: (optional) maximum y coordinate of the canvas
+        :param mode: (optional) 16, 256 or 'truecolor'
+        """
+        area = self._row_area(min_x, min_y, max_x, max_y)
+
+        if not area:
+            return []
+
+        minrow = area[0]
+        mincol = area[2]
+        escapes = {}
+        ret = []
+
+        for rownum, row in enumerate(self.iter_rows(min_x, min_y, max_x, max_y), minrow):
+            codes = self._row_colors(rownum, mincol, len(row))
+
+            if not codes:
+                ret.append(row)
+                continue
+
+            for code in set(codes).difference(escapes):
+                escapes[code] = self._color_escape(code, mode)
+
+            ret.append(color_runs(row, codes, escapes))
+
+        return ret
+
+
+    def _clear_palette(self):
+        # colors used by the cells, index 0 is the terminal default
+        self.palette = [None]
+        self._palette_lookup = {None: 0}
+
+
+    def _color_index(self, color):
+        """Returns the palette index of a color, adding it if necessary."""
+        color = parse_color(color)
+
+        if color not in self._palette_lookup:
+            if len(self.palette) > 255:
+                raise ValueError("too many colors, the palette holds 255 colors")
+            self._palette_lookup[color] = len(self.palette)
+            self.palette.append(color)
+
+        return self._palette_lookup[color]
+
+
+    def _color_escape(self, code, mode):
+        """Returns the escape sequence of a color code."""
+        params = ['0']
+        fg = self.palette[code & 0xFF]
+        bg = self.palette[code >> 8]
+
+        if fg is not None:
+            params.append(sgr_color(fg, mode))
+        if bg is not None:
+            params.append(sgr_color(bg, mode, background=True))
+
+        return u'\x1b[{0}m'.format(';'.join(params))
+
+
+    def _store_colors(self, minrow, maxrow, mincol, maxcol, code):
+        for rownum in range(minrow, maxrow + 1):
+            row = self.colors[rownum]
+            for col in range(mincol, maxcol + 1):
+                if code:
+                    row[col] = code
+                else:
+                    row.pop(col, None)
+            if not row:
+                del self.colors[rownum]
+
+
+    def _row_colors(self, rownum, mincol, length):
+        """Returns the color codes of a row or None if it has no colors."""
+        row = self.colors.get(rownum)
+
+        if not row:
+            return None
+
+        get = row.get
+        return [get(col, 0) for col in range(mincol, mincol + length)]
+
+
+    def rows(self, min_x=None, min_y=None, max_x=None, max_y=None):
+        """Returns a list of the current :class:`Canvas` object lines.
+
+        :param min_x: (optional) minimum x coordinate of the canvas
+        :param min_y: (optional) minimum y coordinate of the canvas
+        :param max_x: (optional) maximum x coordinate of the canvas
+        :param max_y: (optional) maximum y coordinate of the canvas
+        """
+        return list(self.iter_rows(min_x, min_y, max_x, max_y))
+
+
+    def iter_rows(self, min_x=None, min_y=None, max_x=None, max_y=None):
+        """Yields the current :class:`Canvas` object lines one by one,
+        see :meth:`rows`."""
+        area = self._row_area(min_x, min_y, max_x, max_y)
+
+        if not area:
+            return
+
+        minrow, maxrow, mincol, maxcol = area
+        key = (mincol, maxcol)
+        cache = self._row_cache
+
+        for rownum in range(minrow, maxrow+1):
+            cached = cache.get(rownum)
+
+            if cached and cached[0] == key:
+                yield cached[1]
+                continue
+
+            row = self._render_row(rownum, mincol, maxcol)
+
+            if row is None:
+                yield ''
+                continue
+
+            cache[rownum] = (key, row)
+            yield row
+
+
+    def write_to(self, fp, min_x=None, min_y=None, max_x=None, max_y=None,
+                 buffer_size=65536):
+        """Write the UTF-8 encoded frame to a binary file object (file,
+        pipe, socket file) row by row, without building the whole frame in
+        memory. Returns the number of bytes written.
+
+        :param fp: binary file object
+        :param min_x: (optional) minimum x coordinate of the canvas
+        :param min_y: (optional) minimum y coordinate of the canvas
+        :param max_x: (optional) maximum x coordinate of the canvas
+        :param max_y: (optional) maximum y coordinate of the canvas
+        :param buffer_size: (optional) Integer. Bytes collected per write call
+        """
+        area = self._row_area(min_x, min_y, max_x, max_y)
+
+        if not area:
+            return 0
+
+        minrow, maxrow, mincol, maxcol = area
+        key = (mincol, maxcol)
+        cache = self._row_cache
+        line_ending = self.line_ending.encode('utf-8')
+        chunks = []
+        size = written = 0
+
+        for rownum in range(minrow, maxrow+1):
+            cached = cache.get(rownum)
+
+            if cached and cached[0] == key:
+                row = cached[1].encode('utf-8')
+            else:
+                row = self._encode_row(rownum, mincol, maxcol) or b''
+
+            if rownum < maxrow:
+                row += line_ending
+
+            chunks.append(row)
+            size += len(row)
+
+            if size >= buffer_size:
+                fp.write(b''.join(chunks))
+                written += size
+                chunks = []
+                size = 0
+
+        if chunks:
+            fp.write(b''.join(chunks))
+            written += size
+
+        return written
+
+
+    def _row_area(self, min_x, min_y, max_x, max_y):
+        """Returns the (minrow, maxrow, mincol, maxcol) rows and columns to
+        render or None, maxcol is None if each row ends at its last cell."""
+        bounds = self._bounds()
+
+        if not bounds:
+            return None
+
+        minrow = min_y // 4 if min_y != None else bounds[0]
+        maxrow = (max_y - 1) // 4 if max_y != None else bounds[1]
+        mincol = min_x // 2 if min_x != None else bounds[2]
+        maxcol = (max_x - 1) // 2 if max_x != None else None
+
+        return minrow, maxrow, mincol, maxcol
+
+
+    def bbox(self):
+        """Returns the (min_x, min_y, max_x, max_y) bounding box of the
+        occupied cells or None if the canvas is empty.
+
+        The max coordinates are exclusive, ``frame(*canvas.bbox())`` renders
+        the whole occupied area.
+        """
+        bounds = self._bounds()
+
+        if not bounds:
+            return None
+
+        minrow, maxrow, mincol, maxcol = bounds
+
+        return mincol * 2, minrow * 4, (maxcol + 1) * 2, (maxrow + 1) * 4
+
+
+    def _bounds(self):
+        """Returns the minimum and maximum row and column of the occupied
+        cells or None if the canvas is empty."""
+        if self._bbox_stale:
+            self._bbox = self._scan_bounds()
+            self._bbox_stale = False
+
+        return tuple(self._bbox) if self._bbox else None
+
+
+    def _grow_bbox(self, minrow, maxrow, mincol, maxcol):
+        """Extend the bounding box with the given cells."""
+        b = self._bbox
+
+        if b is None:
+            self._bbox = [minrow, maxrow, mincol, maxcol]
+            return
+
+        b[0] = min(b[0], minrow)
+        b[1] = max(b[1], maxrow)
+        b[2] = min(b[2], mincol)
+        b[3] = max(b[3], maxcol)
+
+
+    def _shrink_bbox(self, row, col):
+        """Notify that a cell was emptied, the bounding box is recomputed
+        lazily if the cell was on its edge."""
+        b = self._bbox
+
+        if b is not None and (row == b[0] or row == b[1] or col == b[2] or col == b[3]):
+            self._bbox_stale = True
+
+
+    def _scan_bounds(self):
+        if not self.chars:
+            return None
+
+        return [min(self.chars.keys()),
+                max(self.chars.keys()),
+                min(min(x.keys()) for x in self.chars.values()),
+                max(max(x.keys()) for x in self.chars.values())]
+
+
+    def _render_row(self, rownum, mincol, maxcol=None):
+        """Returns a row of characters or None if the row is empty.
+
+        :param rownum: row index
+        :param mincol: first column
+        :param maxcol: (optional) last column, defaults to the row's last cell
+        """
+        row = self.chars.get(rownum)
+
+        if not row:
+            return None
+
+        if maxcol is None:
+            maxcol = max(row.keys())
+
+        get = row.get
+        chars = [get(x, 0) for x in range(mincol, maxcol+1)]
+
+        return u''.join([braille_chars[c] if type(c) == int else c for c in chars])
+
+
+    def _encode_row(self, rownum, mincol, maxcol=None):
+        """Returns a UTF-8 encoded row or None if the row is empty, see
+        :meth:`_render_row`."""
+        row = self._render_row(rownum, mincol, maxcol)
+
+        return row.encode('utf-8') if row is not None else None
+
+
+    def _row_cells(self, rownum, mincol, maxcol):
+        """Returns the dot masks of a row from mincol to maxcol (inclusive)
+        as a bytearray, text cells are 0."""
+        cells = bytearray(max(0, maxcol - mincol + 1))
+
+        for col, char in self.chars.get(rownum, {}).items():
+            if mincol <= col <= maxcol and type(char) == int:
+                cells[col - mincol] = char
+
+        return cells
+
+
+    def _text_cells(self):
+        """Returns the ``{(row, col): character}`` text cells."""
+        return dict(((row, col), char)
+                    for row, chars in self.chars.items()
+                    for col, char in chars.items() if type(char) != int)
+
+
+    def _cell_blocks(self):
+        """Returns (row, col, cells) blocks holding all the dots, cells is a
+        list of equally long bytearray cell rows placed at row, col."""
+        blocks = []
+
+        for rownum, chars in self.chars.items():
+            cols = [col for col, char in chars.items() if type(char) == int]
+
+            if cols:
+                blocks.append((rownum, min(cols),
+                               [self._row_cells(rownum, min(cols), max(cols))]))
+
+        return blocks
+
+
+    def _combine_blocks(self, blocks, other, fn):
+        """Combine the cells of blocks with the same cells of another canvas
+        by a function of two byte strings, see :func:`or_bytes`."""
+        return [(row, col, [fn(codes, other._row_cells(rownum, col, col + len(codes) - 1))
+                            for rownum, codes in enumerate(cells, row)])
+                for row, col, cells in blocks]
+
+
+    def _moved_colors(self, dcol, drow):
+        """Returns the colors moved by dcol columns and drow rows."""
+        moved = defaultdict(dict)
+
+        for rownum, row in self.colors.items():
+            moved[rownum + drow] = dict((col + dcol, code) for col, code in row.items())
+
+        return moved
+
+
+    def _rebuild(self, blocks, dcol=0, drow=0):
+        """Replace the dots by (row, col, cells) blocks and move the text and
+        colors by dcol columns and drow rows."""
+        text = self._text_cells()
+        colors = self._moved_colors(dcol, drow) if dcol or drow else self.colors
+        palette = self.palette, self._palette_lookup
+
+        self.clear()
+        self.colors = colors
+        self.palette, self._palette_lookup = palette
+
+        for (row, col), char in text.items():
+            self.set_text((col + dcol) * 2, (row + drow) * 4, char)
+
+        for row, col, cells in blocks:
+            self._blit_cells(cells, col, row)
+
+
+    def frame(self, min_x=None, min_y=None, max_x=None, max_y=None, color=None):
+        """String representation of the current :class:`Canvas` object pixels.
+
+        :param min_x: (optional) minimum x coordinate of the canvas
+        :param min_y: (optional) minimum y coordinate of the canvas
+        :param max_x: (optional) maximum x coordinate of the canvas
+        :param max_y: (optional) maximum y coordinate of the canvas
+        :param color: (optional) 16, 256 or 'truecolor' to output the cell
+                      colors, see :meth:`color_rows`
+        """
+        if color:
+            rows = self.color_rows(min_x, min_y, max_x, max_y, color)
+        else:
+            rows = self.rows(min_x, min_y, max_x, max_y)
+
+        ret = self.line_ending.join(rows)
+
+        if IS_PY3:
+            return ret
+
+        return ret.encode('utf-8')
+
+
+class DenseCanvas(Canvas):
+    """Fixed size pixel surface backed by one byte per braille cell.
+
+    Pixels outside of the ``width`` x ``height`` area are ignored, the memory
+    footprint is ``ceil(width / 2) * ceil(height / 4)`` bytes.
+    """
+
+    def __init__(self, width, height, line_ending=os.linesep, clip=None):
+        self.width = normalize(width)
+        self.height = normalize(height)
+        self.cols = (self.width + 1) // 2
+        self.lines = (self.height + 3) // 4
+        super(DenseCanvas, self).__init__(line_ending, clip)
+
+
+    def clear(self):
+        """Remove all pixels and colors from the :class:`DenseCanvas` object."""
+        self.buf = bytearray(self.cols * self.lines)
+        self.text = {}
+        # color codes parallel to buf, allocated by the first color
+        self.colors = None
+        self._clear_palette()
+        self._row_cache = {}
+        self._bbox = None
+        self._bbox_stale = False
+
+
+    def set(self, x, y):
+        """Set a pixel of the :class:`DenseCanvas` object.
+
+        :param x: x coordinate of the pixel
+        :param y: y coordinate of the pixel
+        """
+        if type(x) is not int:
+            x = normalize(x)
+        if type(y) is not int:
+            y = normalize(y)
+        clip = self.clip
+
+        if not (clip[0] <= x < clip[2] and clip[1] <= y < clip[3]):
+            return
+
+        col = x >> 1
+        row = y >> 2
+        i = row * self.cols + col
+        char = self.buf[i]
+        dot = pixel_map[y & 3][x & 1]
+
+        if char & dot or self.text and (row, col) in self.text:
+            return
+
+        self._row_cache.pop(row, None)
+        self.buf[i] = char | dot
+
+        if char:
+            # an occupied cell is within the bounding box
+            return
+
+        b = self._bbox
+        if b is None:
+            self._bbox = [row, row, col, col]
+        else:
+            if row < b[0]:
+                b[0] = row
+            elif row > b[1]:
+                b[1] = row
+            if col < b[2]:
+                b[2] = col
+            elif col > b[3]:
+                b[3] = col
+
+
+    def unset(self, x, y):
+        """Unset a pixel of the :class:`DenseCanvas` object.
+
+        :param x: x coordinate of the pixel
+        :param y: y coordinate of the pixel
+        """
+        if type(x) is not int:
+            x = normalize(x)
+        if type(y) is not int:
+            y = normalize(y)
+        clip = self.clip
+
+        if not (clip[0] <= x < clip[2] and clip[1] <= y < clip[3]):
+            return
+
+        col = x >> 1
+        row = y >> 2
+
+        if self.text:
+            self.text.pop((row, col), None)
+
+        self._row_cache.pop(row, None)
+        self.buf[row * self.cols + col] &= ~pixel_map[y & 3][x & 1] & 0xFF
+
+        if not self.buf[row * self.cols + col]:
+            self._shrink_bbox(row, col)
+
+
+    def toggle(self, x, y):
+        """Toggle a pixel of the :class:`DenseCanvas` object.
+
+        :param x: x coordinate of the pixel
+        :param y: y coordinate of the pixel
+        """
+        if type(x) is not int:
+            x = normalize(x)
+        if type(y) is not int:
+            y = normalize(y)
+        clip = self.clip
+
+        if not (clip[0] <= x < clip[2] and clip[1] <= y < clip[3]):
+            return
+
+        col = x >> 1
+        row = y >> 2
+
+        self._row_cache.pop(row, None)
+
+        if self.text and (row, col) in self.text:
+            del self.text[(row, col)]
+            self._shrink_bbox(row, col)
+            return
+
+        self.buf[row * self.cols + col] ^= pixel_map[y & 3][x & 1]
+
+        if self.buf[row * self.cols + col]:
+            self._grow_bbox(row, row, col, col)
+        else:
+            self._shrink_bbox(row, col)
+
+
+    def set_text(self, x, y, text):
+        """Set text to the given coords.
+
+        :param x: x coordinate of the text start position
+        :param y: y coordinate of the text start position
+        """
+        col, row = get_pos(x, y)
+        minrow, maxrow, mincol, maxcol = clip_cell_range(self.clip)
+
+        if not minrow <= row <= maxrow:
+            return
+
+        first = max(col, mincol)
+        last = min(col + len(text) - 1, maxcol)
+
+        if first > last:
+            return
+
+        self._row_cache.pop(row, None)
+
+        for i in range(first, last + 1):
+            self.buf[row * self.cols + i] = 0
+            self.text[(row, i)] = text[i - col]
+
+        self._grow_bbox(row, row, first, last)
+
+
+    def get(self, x, y):
+        """Get the state of a pixel. Returns bool.
+
+        :param x: x coordinate of the pixel
+        :param y: y coordinate of the pixel
+        """
+        if type(x) is not int:
+            x = normalize(x)
+        if type(y) is not int:
+            y = normalize(y)
+        clip = self.clip
+
+        if not (clip[0] <= x < clip[2] and clip[1] <= y < clip[3]):
+            return False
+
+        col = x >> 1
+        row = y >> 2
+
+        if self.text and (row, col) in self.text:
+            return True
+
+        return bool(self.buf[row * self.cols + col] & pixel_map[y & 3][x & 1])
+
+
+    def _update_many(self, xs, ys, op):
+        if is_array(xs) or is_array(ys):
+            return self._update_many_array(xs, ys, op)
+
+        if op == 'set':
+            return self._set_many(xs, ys)
+
+        buf = self.buf
+        text = self.text
+        cols = self.cols
+        dots = pixel_map
+        min_x, min_y, max_x, max_y = self.clip
+        points = xs if ys is None else zip(xs, ys)
+        # {buffer index: mask} of the touched cells
+        cells = defaultdict(int)
+        # a toggled dot is flipped once per occurrence, an unset one cleared
+        toggle = op == 'toggle'
+
+        for x, y in points:
+            if type(x) is not int:
+                x = normalize(x)
+            if type(y) is not int:
+                y = normalize(y)
+            if min_x <= x < max_x and min_y <= y < max_y:
+                if toggle:
+                    cells[(y >> 2) * cols + (x >> 1)] ^= dots[y & 3][x & 1]
+                else:
+                    cells[(y >> 2) * cols + (x >> 1)] |= dots[y & 3][x & 1]
+
+        if not cells:
+            return
+
+        cache = self._row_cache
+        if cache:
+            for rownum in set(i // cols for i in cells):
+                cache.pop(rownum, None)
+
+        removed = False
+
+        if text:
+            for i in list(cells):
+                key = divmod(i, cols)
+                if key in text:
+                    # the text is replaced, like in Canvas
+                    del text[key]
+                    del cells[i]
+                    removed = True
+
+        occupied = []
+
+        for i, mask in cells.items():
+            if op == 'unset':
+                char = buf[i] & ~mask
+            else:
+                char = buf[i] ^ mask
+            buf[i] = char
+
+            if char:
+                occupied.append(i)
+            else:
+                removed = True
+
+        if occupied:
+            rows = [i // cols for i in occupied]
+            colnums = [i % cols for i in occupied]
+            self._grow_bbox(min(rows), max(rows), min(colnums), max(colnums))
+
+        if removed:
+            self._bbox_stale = True
+
+
+    def _set_many(self, xs, ys):
+        """Set many pixels, the bytearray combines the dots of a cell so
+        the points are not grouped, only their buffer indexes are kept."""
+        buf = self.buf
+        cols = self.cols
+        dots = pixel_map
+        min_x, min_y, max_x, max_y = self.clip
+        points = xs if ys is None else zip(xs, ys)
+        touched = []
+        add = touched.append
+
+        for x, y in points:
+            if type(x) is not int:
+                x = normalize(x)
+            if type(y) is not int:
+                y = normalize(y)
+            if min_x <= x < max_x and min_y <= y < max_y:
+                i = (y >> 2) * cols + (x >> 1)
+                buf[i] |= dots[y & 3][x & 1]
+                add(i)
+
+        if not touched:
+            return
+
+        # text cells stay empty
+        for rownum, colnum in self.text:
+            buf[rownum * cols + colnum] = 0
+
+        cache = self._row_cache
+        if cache:
+            for rownum in set(i // cols for i in touched):
+                cache.pop(rownum, None)
+
+        minrow = min(touched) // cols
+        maxrow = max(touched) // cols
+
+        if len(touched) <= maxrow - minrow + 1:
+            colnums = [i % cols for i in touched]
+            self._grow_bbox(minrow, maxrow, min(colnums), max(colnums))
+            return
+
+        # many points, the occupied cells of the spanned rows are cheaper
+        # to find than the columns of every point
+        for rownum in range(minrow, maxrow + 1):
+            row = buf[rownum * cols:(rownum + 1) * cols]
+            length = len(row.rstrip(b'\0'))
+            if length:
+                self._grow_bbox(rownum, rownum, cols - len(row.lstrip(b'\0')), length - 1)
+
+
+    @classmethod
+    def from_bitmap(cls, bitmap, width=None, height=None, threshold=None,
+                    invert=False, dither=None, **kwargs):
+        """Returns a new canvas of the bitmap's size holding its pixels.
+
+        :param bitmap: 2-D sequence/array of pixels or raw bytes
+        :param width: (optional) bitmap width, required for raw bytes
+        :param height: (optional) bitmap height, required for raw bytes
+        :param threshold: (optional) pixel value threshold
+        :param invert: (optional) inverts the threshold check
+        :param dither: (optional) dither method, see :func:`dither_bitmap`
+        :param **kwargs: optional canvas parameters
+        """
+        if width is None or height is None:
+            if is_array(bitmap):
+                height, width = bitmap.shape[:2]
+            else:
+                height = len(bitmap)
+                width = max(len(row) for row in bitmap) if height else 0
+
+        canvas = cls(width, height, **kwargs)
+        canvas.blit_bitmap(bitmap, width, height, threshold=threshold, invert=invert,
+                           dither=dither)
+        return canvas
+
+
+    def _blit_cells(self, cells, col, row):
+        cells, col, row = self._clip_cells(cells, col, row)
+        first = max(0, -col)
+
+        for rownum, codes in enumerate(cells, row):
+            if not 0 <= rownum < self.lines:
+                continue
+
+            last = min(len(codes), self.cols - col)
+
+            if last <= first:
+                continue
+
+            self._row_cache.pop(rownum, None)
+            start = rownum * self.cols + col
+            self.buf[start + first:start + last] = or_bytes(
+                self.buf[start + first:start + last], codes[first:last])
+
+            codes = codes[first:last]
+            length = len(codes.rstrip(b'\0'))
+
+            if length:
+                self._grow_bbox(rownum, rownum,
+                                col + first + len(codes) - len(codes.lstrip(b'\0')),
+                                col + first + length - 1)
+
+        for rownum, colnum in self.text:
+            self.buf[rownum * self.cols + colnum] = 0
+
+
+    def set_clip(self, min_x=None, min_y=None, max_x=None, max_y=None):
+        """Restrict drawing to a rectangle within the canvas area, pixels
+        outside of it are discarded when written. Pixels already outside of
+        the new rectangle are removed. Called without parameters the clip is
+        reset to the whole canvas.
+
+        :param min_x: (optional) minimum x coordinate of the clip rectangle
+        :param min_y: (optional) minimum y coordinate of the clip rectangle
+        :param max_x: (optional) maximum x coordinate of the clip rectangle, exclusive
+        :param max_y: (optional) maximum y coordinate of the clip rectangle, exclusive
+        """
+        area = (0, 0, self.cols * 2, self.lines * 4)
+
+        if min_x is None:
+            self.clip = area
+            return
+
+        self.clip = (max(normalize(min_x), area[0]), max(normalize(min_y), area[1]),
+                     min(normalize(max_x), area[2]), min(normalize(max_y), area[3]))
+        self._crop()
+
+
+    def _crop(self):
+        cells = [self._span_cells(row, 0, self.cols - 1) for row in range(self.lines)]
+        self.text = dict((key, c) for key, c in self.text.items()
+                         if clip_mask(self.clip, *key))
+        self.buf = bytearray(len(self.buf))
+        self._row_cache = {}
+        self._bbox = None
+        self._bbox_stale = True
+        self._blit_cells(cells, 0, 0)
+
+
+    def _set_cells(self, cells):
+        buf = self.buf
+        text = self.text
+        cache = self._row_cache
+        cols = self.cols
+        lines = self.lines
+        rows = []
+        colnums = []
+
+        for row, col, mask in cells:
+            if not (0 <= col < cols and 0 <= row < lines):
+                continue
+
+            if text and (row, col) in text:
+                continue
+
+            if cache:
+                cache.pop(row, None)
+            buf[row * cols + col] |= mask
+            rows.append(row)
+            colnums.append(col)
+
+        if rows:
+            self._grow_bbox(min(rows), max(rows), min(colnums), max(colnums))
+
+
+    def _update_many_array(self, xs, ys, op):
+        xs, ys = array_coords(xs, ys)
+        keep = array_inside(self.clip, xs, ys)
+        rows, cols, masks = array_group_cells(xs[keep], ys[keep], op == 'toggle')
+        index = rows * self.cols + cols
+
+        for rownum in numpy.unique(rows).tolist():
+            self._row_cache.pop(rownum, None)
+
+        if self.text:
+            hit = set(zip(rows.tolist(), cols.tolist())).intersection(self.text)
+            if op != 'set':
+                for key in hit:
+                    del self.text[key]
+            if hit:
+                if op != 'set':
+                    self._bbox_stale = True
+                keep = numpy.array([k not in hit for k in zip(rows.tolist(), cols.tolist())], dtype=bool)
+                rows = rows[keep]
+                cols = cols[keep]
+                index = index[keep]
+                masks = masks[keep]
+
+        view = numpy.frombuffer(self.buf, dtype=numpy.uint8)
+
+        if op == 'set':
+            view[index] |= masks
+        elif op == 'unset':
+            view[index] &= ~masks
+        else:
+            view[index] ^= masks
+
+        occupied = view[index] != 0
+
+        if not occupied.all():
+            self._bbox_stale = True
+
+        if occupied.any():
+            self._grow_bbox(int(rows[occupied].min()), int(rows[occupied].max()),
+                            int(cols[occupied].min()), int(cols[occupied].max()))
+
+
+    def _store_colors(self, minrow, maxrow, mincol, maxcol, code):
+        if self.colors is None:
+            if not code:
+                return
+            self.colors = array('H', [0]) * (self.cols * self.lines)
+
+        run = array('H', [code]) * (maxcol - mincol + 1)
+
+        for rownum in range(minrow, maxrow + 1):
+            start = rownum * self.cols
+            self.colors[start + mincol:start + maxcol + 1] = run
+
+
+    def _row_colors(self, rownum, mincol, length):
+        if self.colors is None or not 0 <= rownum < self.lines:
+            return None
+
+        start = rownum * self.cols
+        lo = max(mincol, 0)
+        hi = min(mincol + length, self.cols)
+        codes = self.colors[start + lo:start + hi] if lo < hi else ()
+
+        if not any(codes):
+            return None
+
+        return [0] * (lo - mincol) + list(codes) + [0] * (mincol + length - max(hi, lo))
+
+
+    def _row_cells(self, rownum, mincol, maxcol):
+        cells = bytearray(max(0, maxcol - mincol + 1))
+        lo = max(mincol, 0)
+        hi = min(maxcol, self.cols - 1)
+
+        if 0 <= rownum < self.lines and lo <= hi:
+            cells[lo - mincol:hi - mincol + 1] = self._span_cells(rownum, lo, hi)
+
+        return cells
+
+
+    def _span_cells(self, rownum, lo, hi):
+        """Returns the cells of a row from lo to hi (inclusive, within the
+        canvas) as a bytearray."""
+        start = rownum * self.cols
+        return self.buf[start + lo:start + hi + 1]
+
+
+    def _text_cells(self):
+        return dict(self.text)
+
+
+    def _cell_blocks(self):
+        bounds = self._bounds()
+
+        if not bounds:
+            return []
+
+        minrow, maxrow, mincol, maxcol = bounds
+
+        return [(minrow, mincol, [self._span_cells(row, mincol, maxcol)
+                                  for row in range(minrow, maxrow + 1)])]
+
+
+    def _moved_colors(self, dcol, drow):
+        if self.colors is None:
+            return None
+
+        cols = self.cols
+        moved = array('H', [0]) * len(self.colors)
+        lo = max(0, dcol)
+        hi = min(cols, cols + dcol)
+
+        for row in range(max(0, drow), min(self.lines, self.lines + drow)):
+            start = row * cols
+            src = (row - drow) * cols - dcol
+            moved[start + lo:start + hi] = self.colors[src + lo:src + hi]
+
+        return moved
+
+
+    def _row_extent(self, row):
+        """Returns the first and last occupied column of a row or None."""
+        cells = self._span_cells(row, 0, self.cols - 1)
+        last = len(cells.rstrip(b'\0')) - 1
+        first = self.cols - len(cells.lstrip(b'\0'))
+        text_cols = [c for (r, c) in self.text if r == row] if self.text else ()
+
+        if text_cols:
+            if last < 0:
+                first, last = min(text_cols), max(text_cols)
+            else:
+                first = min(first, min(text_cols))
+                last = max(last, max(text_cols))
+
+        if last < 0:
+            return None
+
+        return first, last
+
+
+    def _scan_bounds(self):
+        extents = [(rownum, self._row_extent(rownum)) for rownum in range(self.lines)]
+        extents = [(rownum, e) for rownum, e in extents if e]
+
+        if not extents:
+            return None
+
+        return [extents[0][0], extents[-1][0],
+                min(e[0] for _, e in extents), max(e[1] for _, e in extents)]
+
+
+    def _row_span(self, rownum, mincol, maxcol):
+        """Returns the (lo, hi, left, right) buffer columns and left / right
+        padding of a row or None if the row is empty."""
+        if not 0 <= rownum < self.lines:
+            return None
+
+        extent = self._row_extent(rownum)
+
+        if not extent:
+            return None
+
+        if maxcol is None:
+            maxcol = extent[1]
+
+        return (max(mincol, 0), min(maxcol, self.cols - 1),
+                max(0, min(maxcol, -1) - mincol + 1),
+                max(0, maxcol - max(mincol, self.cols) + 1))
+
+
+    def _encode_row(self, rownum, mincol, maxcol=None):
+        if self.text and any(r == rownum for r, _ in self.text):
+            return super(DenseCanvas, self)._encode_row(rownum, mincol, maxcol)
+
+        span = self._row_span(rownum, mincol, maxcol)
+
+        if not span:
+            return None
+
+        lo, hi, left, right = span
+        row = b' ' * left
+
+        if lo <= hi:
+            row += encode_cells(self._span_cells(rownum, lo, hi))
+
+        return row + b' ' * right
+
+
+    def _render_row(self, rownum, mincol, maxcol=None):
+        span = self._row_span(rownum, mincol, maxcol)
+
+        if not span:
+            return None
+
+        lo, hi, left, right = span
+        row = u' ' * left
+
+        if lo <= hi:
+            row += render_cells(self._span_cells(rownum, lo, hi))
+
+        row += u' ' * right
+        text = [(c, t) for (r, c), t in self.text.items() if r == rownum and lo <= c <= hi] if self.text else ()
+
+        if text:
+            row = list(row)
+            for colnum, t in text:
+                row[colnum - mincol] = t
+            row = u''.join(row)
+
+        return row
+
+
+class DoubleBufferedCanvas(DenseCanvas):
+    """:class:`DenseCanvas` with a front and a back buffer for animations.
+
+    Drawing goes to the back buffer, :meth:`swap` keeps it as the front
+    (previous) frame and clears the other buffer in place for the next one,
+    so no storage is allocated per frame. Rows which render the same as in
+    the front frame reuse its strings, which :class:`DiffRenderer` skips
+    without comparing them.
+    """
+
+    def __init__(self, width, height, line_ending=os.linesep, clip=None):
+        super(DoubleBufferedCanvas, self).__init__(width, height, line_ending, clip)
+        self.front = bytearray(len(self.buf))
+        self.front_text = {}
+        self._front_cache = {}
+        self._front_bbox = None
+        self._zero = memoryview(bytes(bytearray(len(self.buf))))
+
+
+    def clear(self):
+        """Remove all pixels from the back buffer."""
+        if not hasattr(self, 'front'):
+            return super(DoubleBufferedCanvas, self).clear()
+
+        self._zero_rows(self.buf, self._bounds())
+        self.text.clear()
+        self._row_cache.clear()
+        self._bbox = None
+        self._bbox_stale = False
+
+
+    def swap(self):
+        """Make the back buffer the front frame and start a new, empty back
+        buffer."""
+        bounds = self._bounds()
+        self.buf, self.front = self.front, self.buf
+        self.text, self.front_text = self.front_text, self.text
+        self._row_cache, self._front_cache = self._front_cache, self._row_cache
+        bounds, self._front_bbox = self._front_bbox, bounds
+        self._zero_rows(self.buf, bounds)
+        self.text.clear()
+        self._row_cache.clear()
+        self._bbox = None
+        self._bbox_stale = False
+
+
+    def changed_rows(self):
+        """Returns the indexes of the rows which differ from the front frame."""
+        cols = self.cols
+        text_rows = set(r for r, _ in self.text) | set(r for r, _ in self.front_text)
+
+        return [row for row in range(self.lines)
+                if self.buf[row * cols:(row + 1) * cols] != self.front[row * cols:(row + 1) * cols]
+                or (row in text_rows and not self._same_text(row))]
+
+
+    def _zero_rows(self, buf, bounds):
+        if bounds:
+            start = bounds[0] * self.cols
+            end = (bounds[1] + 1) * self.cols
+            buf[start:end] = self._zero[start:end]
+
+
+    def _same_text(self, row):
+        return sorted((k, c) for k, c in self.text.items() if k[0] == row) == \
+            sorted((k, c) for k, c in self.front_text.items() if k[0] == row)
+
+
+    def _render_row(self, rownum, mincol, maxcol=None):
+        cached = self._front_cache.get(rownum)
+
+        if cached and cached[0] == (mincol, maxcol):
+            start = rownum * self.cols
+            end = start + self.cols
+
+            if self.buf[start:end] == self.front[start:end] and \
+                    (not (self.text or self.front_text) or self._same_text(rownum)):
+                return cached[1]
+
+        return super(DoubleBufferedCanvas, self)._render_row(rownum, mincol, maxcol)
+
+
+class ScrollingCanvas(DenseCanvas):
+    """:class:`DenseCanvas` for live plots, scrolled one pixel column at a
+    time by :meth:`push`.
+
+    The pixel columns are stored in a ring buffer, one byte per column and
+    cell row, so pushing a column overwrites the oldest one in O(height)
+    and the rows are read starting at the ring head.
+
+    Unlike in :class:`DenseCanvas`, text and colors are overlays on the
+    screen cells: a push scrolls by half a cell, so they stay in place
+    (like axis labels) and the pixels scrolling below a text are kept. As
+    in :class:`DenseCanvas`, unset and toggle remove the text of a cell.
+    """
+
+    def clear(self):
+        """Remove all pixels and colors from the :class:`ScrollingCanvas` object."""
+        super(ScrollingCanvas, self).clear()
+        # ring buffer of pixel columns, left column dots of each cell row
+        self.buf = bytearray(len(self.buf) * 2)
+        self.head = 0
+
+
+    def push(self, ys=(), spans=()):
+        """Scroll one pixel column left, the new column at the right edge
+        holds the given pixels.
+
+        :param ys: (optional) y coordinate or iterable of y coordinates,
+                   None is skipped
+        :param spans: (optional) iterable of (y1, y2) vertical runs, y2 is
+                      inclusive
+        """
+        width = self.cols * 2
+        clip = self.clip
+        column = bytearray(self.lines)
+
+        if clip[0] <= width - 1 < clip[2]:
+            if isinstance(ys, (int, float)):
+                ys = (ys,)
+
+            for y in ys:
+                if y is not None:
+                    y = normalize(y)
+                    if clip[1] <= y < clip[3]:
+                        column[y >> 2] |= pixel_map[y & 3][0]
+
+            for y1, y2 in spans:
+                y1, y2 = sorted((normalize(y1), normalize(y2)))
+                for y in range(max(y1, clip[1]), min(y2 + 1, clip[3])):
+                    column[y >> 2] |= pixel_map[y & 3][0]
+
+        self.buf[self.head::width] = column
+        self.head = (self.head + 1) % width
+        self._row_cache = {}
+        self._bbox_stale = True
+
+
+    def set(self, x, y):
+        """Set a pixel of the :class:`ScrollingCanvas` object.
+
+        :param x: x coordinate of the pixel
+        :param y: y coordinate of the pixel
+        """
+        self._update_pixel(x, y, 'set')
+
+
+    def unset(self, x, y):
+        """Unset a pixel of the :class:`ScrollingCanvas` object.
+
+        :param x: x coordinate of the pixel
+        :param y: y coordinate of the pixel
+        """
+        self._update_pixel(x, y, 'unset')
+
+
+    def toggle(self, x, y):
+        """Toggle a pixel of the :class:`ScrollingCanvas` object.
+
+        :param x: x coordinate of the pixel
+        :param y: y coordinate of the pixel
+        """
+        self._update_pixel(x, y, 'toggle')
+
+
+    def set_text(self, x, y, text):
+        """Set text to the given coords, the text covers the pixels below it.
+
+        :param x: x coordinate of the text start position
+        :param y: y coordinate of the text start position
+        """
+        col, row = get_pos(x, y)
+        minrow, maxrow, mincol, maxcol = clip_cell_range(self.clip)
+
+        if not minrow <= row <= maxrow:
+            return
+
+        first = max(col, mincol)
+        last = min(col + len(text) - 1, maxcol)
+
+        if first > last:
+            return
+
+        self._row_cache.pop(row, None)
+
+        for i in range(first, last + 1):
+            self.text[(row, i)] = text[i - col]
+
+        self._grow_bbox(row, row, first, last)
+
+
+    def get(self, x, y):
+        """Get the state of a pixel. Returns bool.
+
+        :param x: x coordinate of the pixel
+        :param y: y coordinate of the pixel
+        """
+        x = normalize(x)
+        y = normalize(y)
+
+        if not inside(self.clip, x, y):
+            return False
+
+        if self.text and (y >> 2, x >> 1) in self.text:
+            return True
+
+        return bool(self.buf[self._index(y >> 2, x)] & pixel_map[y & 3][0])
+
+
+    def _index(self, row, x):
+        """Returns the buffer index of a cell row of a pixel column."""
+        width = self.cols * 2
+        return row * width + (self.head + x) % width
+
+
+    def _update_pixel(self, x, y, op):
+        x = normalize(x)
+        y = normalize(y)
+
+        if inside(self.clip, x, y):
+            self._update_cell(y >> 2, x >> 1, pixel_map[y & 3][x & 1], op)
+
+
+    def _update_cell(self, row, col, mask, op):
+        """Combine the dots of a cell with a mask, op is 'set', 'unset' or
+        'toggle'."""
+        if op != 'set' and self.text and (row, col) in self.text:
+            del self.text[(row, col)]
+            self._row_cache.pop(row, None)
+            self._bbox_stale = True
+            if op == 'toggle':
+                return
+
+        buf = self.buf
+        left = self._index(row, col * 2)
+        right = self._index(row, col * 2 + 1)
+
+        for i, bits in ((left, column_tables[0][mask]), (right, column_tables[1][mask])):
+            if op == 'set':
+                buf[i] |= bits
+            elif op == 'unset':
+                buf[i] &= ~bits & 0xFF
+            else:
+                buf[i] ^= bits
+
+        self._row_cache.pop(row, None)
+
+        if buf[left] or buf[right]:
+            self._grow_bbox(row, row, col, col)
+        else:
+            self._shrink_bbox(row, col)
+
+
+    def _update_many(self, xs, ys, op):
+        cells = self._group_cells(xs, ys, op == 'toggle')
+
+        for rownum, masks in cells.items():
+            for col, mask in masks.items():
+                self._update_cell(rownum, col, mask, op)
+
+
+    def _blit_cells(self, cells, col, row):
+        cells, col, row = self._clip_cells(cells, col, row)
+        first = max(0, -col)
+
+        for rownum, codes in enumerate(cells, row):
+            if not 0 <= rownum < self.lines:
+                continue
+
+            codes = codes[first:min(len(codes), self.cols - col)]
+            length = len(codes.rstrip(b'\0'))
+
+            if not length:
+                continue
+
+            pixels = bytearray(len(codes) * 2)
+            pixels[0::2] = codes.translate(column_tables[0])
+            pixels[1::2] = codes.translate(column_tables[1])
+            self._or_pixels(rownum, (col + first) * 2, pixels)
+            self._row_cache.pop(rownum, None)
+            self._grow_bbox(rownum, rownum,
+                            col + first + len(codes) - len(codes.lstrip(b'\0')),
+                            col + first + length - 1)
+
+
+    def _set_cells(self, cells):
+        for rownum, col, mask in cells:
+            if 0 <= col < self.cols and 0 <= rownum < self.lines:
+                self._update_cell(rownum, col, mask, 'set')
+
+
+    def _or_pixels(self, row, x, pixels):
+        """Combine the pixel columns of a cell row, starting at x, with OR."""
+        buf = self.buf
+        start = self._index(row, x)
+        end = (row + 1) * self.cols * 2
+        n = min(len(pixels), end - start)
+        buf[start:start + n] = or_bytes(buf[start:start + n], pixels[:n])
+
+        if n < len(pixels):
+            # wrapped around the end of the ring
+            start = row * self.cols * 2
+            rest = len(pixels) - n
+            buf[start:start + rest] = or_bytes(buf[start:start + rest], pixels[n:])
+
+
+    def _span_cells(self, rownum, lo, hi):
+        width = self.cols * 2
+        start = self._index(rownum, lo * 2)
+        end = (rownum + 1) * width
+        n = (hi - lo + 1) * 2
+
+        if start + n <= end:
+            pixels = self.buf[start:start + n]
+        else:
+            # the columns wrap around the end of the ring
+            pixels = self.buf[start:end] + self.buf[rownum * width:rownum * width + n - (end - start)]
+
+        return or_bytes(pixels[0::2], pixels[1::2].translate(column_tables[2]))
+
+
+class TiledCanvas(Canvas):
+    """Unbounded pixel surface stored in square tiles of braille cells.
+
+    A tile is a bytearray of ``tile_size`` x ``tile_size`` cells, allocated
+    when the first dot is drawn into it and freed when its last dot is
+    removed. Large, sparse or negative coordinate spaces cost about one byte
+    per cell of the tiles in use, and rendering a viewport only reads the
+    tiles intersecting it.
+    """
+
+    tile_size = 64
+
+    def clear(self):
+        """Remove all pixels and colors from the :class:`TiledCanvas` object."""
+        # {tile row: {tile col: bytearray}}
+        self.tiles = {}
+        self.text = {}
+        self.colors = defaultdict(dict)
+        self._clear_palette()
+        self._row_cache = {}
+        self._bbox = None
+        self._bbox_stale = False
+
+
+    def set(self, x, y):
+        """Set a pixel of the :class:`TiledCanvas` object.
+
+        :param x: x coordinate of the pixel
+        :param y: y coordinate of the pixel
+        """
+        self._update_pixel(x, y, 'set')
+
+
+    def unset(self, x, y):
+        """Unset a pixel of the :class:`TiledCanvas` object.
+
+        :param x: x coordinate of the pixel
+        :param y: y coordinate of the pixel
+        """
+        self._update_pixel(x, y, 'unset')
+
+
+    def toggle(self, x, y):
+        """Toggle a pixel of the :class:`TiledCanvas` object.
+
+        :param x: x coordinate of the pixel
+        :param y: y coordinate of the pixel
+        """
+        self._update_pixel(x, y, 'toggle')
+
+
+    def set_text(self, x, y, text):
+        """Set text to the given coords.
+
+        :param x: x coordinate of the text start position
+        :param y: y coordinate of the text start position
+        """
+        col, row = get_pos(x, y)
+        first, last = col, col + len(text) - 1
+
+        if self.clip is not None:
+            minrow, maxrow, mincol, maxcol = clip_cell_range(self.clip)
+
+            if not minrow <= row <= maxrow:
+                return
+
+            first = max(first, mincol)
+            last = min(last, maxcol)
+
+        if first > last:
+            return
+
+        self._row_cache.pop(row, None)
+
+        for i in range(first, last + 1):
+            self._zero_cell(row, i)
+            self.text[(row, i)] = text[i - col]
+
+        self._grow_bbox(row, row, first, last)
+
+
+    def get(self, x, y):
+        """Get the state of a pixel. Returns bool.
+
+        :param x: x coordinate of the pixel
+        :param y: y coordinate of the pixel
+        """
+        x = normalize(x)
+        y = normalize(y)
+        col, row = get_pos(x, y)
+
+        if self.text and (row, col) in self.text:
+            return True
+
+        tile, i = self._tile(row, col)
+
+        return tile is not None and bool(tile[i] & pixel_map[y % 4][x % 2])
+
+
+    def _tile(self, row, col, create=False):
+        """Returns the tile holding a cell and the cell's index in it. The
+        tile is None if it is not allocated, unless ``create`` is True."""
+        size = self.tile_size
+        tile_row = self.tiles.get(row // size)
+        tile = tile_row.get(col // size) if tile_row else None
+
+        if tile is None and create:
+            if tile_row is None:
+                tile_row = self.tiles[row // size] = {}
+            tile = tile_row[col // size] = bytearray(size * size)
+
+        return tile, row % size * size + col % size
+
+
+    def _free_tile(self, row, col):
+        """Release the tile holding a cell if it has no dots left."""
+        size = self.tile_size
+        tile_row = self.tiles[row // size]
+
+        if tile_row[col // size].count(b'\0') == size * size:
+            del tile_row[col // size]
+            if not tile_row:
+                del self.tiles[row // size]
+
+
+    def _zero_cell(self, row, col):
+        """Remove the dots of a cell."""
+        tile, i = self._tile(row, col)
+
+        if tile is not None and tile[i]:
+            tile[i] = 0
+            self._free_tile(row, col)
+
+
+    def _update_pixel(self, x, y, op):
+        x = normalize(x)
+        y = normalize(y)
+
+        if inside(self.clip, x, y):
+            self._update_cell(y >> 2, x >> 1, pixel_map[y & 3][x & 1], op)
+
+
+    def _update_cell(self, row, col, mask, op):
+        """Combine the dots of a cell with a mask, op is 'set', 'unset' or
+        'toggle'."""
+        if self.text and (row, col) in self.text:
+            if op != 'set':
+                self._row_cache.pop(row, None)
+                del self.text[(row, col)]
+                self._shrink_bbox(row, col)
+            return
+
+        tile, i = self._tile(row, col, op != 'unset')
+
+        if tile is None:
+            return
+
+        self._row_cache.pop(row, None)
+
+        if op == 'set':
+            tile[i] |= mask
+        elif op == 'unset':
+            tile[i] &= ~mask & 0xFF
+        else:
+            tile[i] ^= mask
+
+        if tile[i]:
+            self._grow_bbox(row, row, col, col)
+        else:
+            self._shrink_bbox(row, col)
+            self._free_tile(row, col)
+
+
+    def _update_many(self, xs, ys, op):
+        cells = self._group_cells(xs, ys, op == 'toggle')
+
+        for rownum, masks in cells.items():
+            for col, mask in masks.items():
+                self._update_cell(rownum, col, mask, op)
+
+
+    def _blit_cells(self, cells, col, row):
+        cells, col, row = self._clip_cells(cells, col, row)
+        size = self.tile_size
+
+        for rownum, codes in enumerate(cells, row):
+            length = len(codes.rstrip(b'\0'))
+
+            if not length:
+                continue
+
+            first = len(codes) - len(codes.lstrip(b'\0'))
+            start = col + first
+            end = col + length
+
+            # split the run at the tile edges
+            while start < end:
+                stop = min(end, (start // size + 1) * size)
+                run = codes[start - col:stop - col]
+
+                if run.count(b'\0') != len(run):
+                    tile, i = self._tile(rownum, start, True)
+                    tile[i:i + len(run)] = or_bytes(tile[i:i + len(run)], run)
+
+                start = stop
+
+            self._row_cache.pop(rownum, None)
+            self._grow_bbox(rownum, rownum, col + first, end - 1)
+
+        for rownum, colnum in self.text:
+            self._zero_cell(rownum, colnum)
+
+
+    def _set_cells(self, cells):
+        text = self.text
+        cache = self._row_cache
+        rows = []
+        cols = []
+
+        for rownum, col, mask in cells:
+            if text and (rownum, col) in text:
+                continue
+
+            tile, i = self._tile(rownum, col, True)
+            tile[i] |= mask
+            cache.pop(rownum, None)
+            rows.append(rownum)
+            cols.append(col)
+
+        if rows:
+            self._grow_bbox(min(rows), max(rows), min(cols), max(cols))
+
+
+    def _crop(self):
+        size = self.tile_size
+        tiles = self.tiles
+        self.tiles = {}
+        self.text = dict((key, c) for key, c in self.text.items()
+                         if clip_mask(self.clip, *key))
+        self._row_cache = {}
+        self._bbox = None
+        self._bbox_stale = True
+
+        for tile_row, row_tiles in tiles.items():
+            for tile_col, tile in row_tiles.items():
+                self._blit_cells([tile[i:i + size] for i in range(0, len(tile), size)],
+                                 tile_col * size, tile_row * size)
+
+
+    def _text_cells(self):
+        return dict(self.text)
+
+
+    def _cell_blocks(self):
+        size = self.tile_size
+
+        return [(tile_row * size, tile_col * size,
+                 [tile[i:i + size] for i in range(0, len(tile), size)])
+                for tile_row, row_tiles in self.tiles.items()
+                for tile_col, tile in row_tiles.items()]
+
+
+    def _row_text(self, rownum):
+        """Returns the (col, character) text cells of a row."""
+        if not self.text:
+            return []
+
+        return [(c, t) for (r, c), t in self.text.items() if r == rownum]
+
+
+    def _row_extent(self, rownum, text):
+        """Returns the first and last occupied column of a row or None."""
+        size = self.tile_size
+        row_tiles = self.tiles.get(rownum // size, {})
+        start = rownum % size * size
+        cols = [c for c, _ in text]
+
+        for tile_col, tile in row_tiles.items():
+            cells = tile[start:start + size]
+            last = len(cells.rstrip(b'\0'))
+
+            if last:
+                cols.append(tile_col * size + size - len(cells.lstrip(b'\0')))
+                cols.append(tile_col * size + last - 1)
+
+        if not cols:
+            return None
+
+        return min(cols), max(cols)
+
+
+    def _scan_bounds(self):
+        size = self.tile_size
+        rows = [r for r, _ in self.text]
+        cols = [c for _, c in self.text]
+
+        for tile_row, row_tiles in self.tiles.items():
+            for tile_col, tile in row_tiles.items():
+                for line in range(size):
+                    cells = tile[line * size:(line + 1) * size]
+                    last = len(cells.rstrip(b'\0'))
+
+                    if last:
+                        rows.append(tile_row * size + line)
+                        cols.append(tile_col * size + size - len(cells.lstrip(b'\0')))
+                        cols.append(tile_col * size + last - 1)
+
+        if not rows:
+            return None
+
+        return [min(rows), max(rows), min(cols), max(cols)]
+
+
+    def _row_cells(self, rownum, mincol, maxcol):
+        """Returns the cells of a row from mincol to maxcol (inclusive) as a
+        bytearray, only the tiles within the columns are read."""
+        size = self.tile_size
+        row_tiles = self.tiles.get(rownum // size, {})
+        start = rownum % size * size
+        cells = bytearray()
+        col = mincol
+
+        while col <= maxcol:
+            tile_col = col // size
+            stop = min(maxcol + 1, (tile_col + 1) * size)
+            tile = row_tiles.get(tile_col)
+
+            if tile is None:
+                cells += bytearray(stop - col)
+            else:
+                i = start + col - tile_col * size
+                cells += tile[i:i + stop - col]
+
+            col = stop
+
+        return cells
+
+
+    def _row_span(self, rownum, mincol, maxcol, text):
+        """Returns the cells and text cells of a row or None if the row has
+        nothing to render between the columns."""
+        if maxcol is None:
+            extent = self._row_extent(rownum, text)
+
+            if not extent:
+                return None
+
+            maxcol = extent[1]
+
+        cells = self._row_cells(rownum, mincol, maxcol)
+        text = [(c, t) for c, t in text if mincol <= c <= maxcol]
+
+        if not text and cells.count(b'\0') == len(cells):
+            return None
+
+        return cells, text
+
+
+    def _encode_row(self, rownum, mincol, maxcol=None):
+        text = self._row_text(rownum)
+
+        if text:
+            return super(TiledCanvas, self)._encode_row(rownum, mincol, maxcol)
+
+        span = self._row_span(rownum, mincol, maxcol, text)
+
+        return encode_cells(span[0]) if span else None
+
+
+    def _render_row(self, rownum, mincol, maxcol=None):
+        span = self._row_span(rownum, mincol, maxcol, self._row_text(rownum))
+
+        if not span:
+            return None
+
+        cells, text = span
+        row = render_cells(cells)
+
+        if text:
+            row = list(row)
+            for colnum, t in text:
+                row[colnum - mincol] = t
+            row = u''.join(row)
+
+        return row
+
+
+class Layer(object):
+    """A canvas of a :class:`Compositor` stack."""
+
+    def __init__(self, canvas, mode='or', static=False):
+        if mode not in Compositor.modes:
+            raise ValueError("unknown layer mode {0!r}".format(mode))
+
+        self.canvas = canvas
+        self.mode = mode
+        self.static = static
+        # packed cells and text of a static layer
+        self.cells = None
+        self.text = None
+
+
+class Compositor(object):
+    """Combines a stack of canvases cell by cell into a :class:`DenseCanvas`.
+
+    The layers are applied bottom up on the packed braille cells: ``'or'``
+    adds the dots of a layer, ``'xor'`` toggles them and ``'mask'`` removes
+    them. Text is opaque, a text cell hides the dots of every layer and the
+    text of the layers below it.
+
+    The cells of static layers are read once and the static layers at the
+    bottom of the stack are combined once, so a frame only reads and
+    combines the other layers. Call :meth:`invalidate` after drawing on a
+    static layer.
+    """
+
+    modes = ('or', 'xor', 'mask')
+
+    def __init__(self, width, height, line_ending=os.linesep):
+        self.canvas = DenseCanvas(width, height, line_ending)
+        self.layers = []
+        self._base = None
+
+
+    def add(self, canvas, mode='or', static=False):
+        """Put a canvas on the top of the stack. Returns its :class:`Layer`.
+
+        :param canvas: :class:`Canvas` object (or any subclass)
+        :param mode: (optional) 'or', 'xor' or 'mask'
+        :param static: (optional) cache the cells of the layer between frames
+        """
+        layer = Layer(canvas, mode, static)
+        self.layers.append(layer)
+        self._base = None
+        return layer
+
+
+    def remove(self, canvas):
+        """Remove the layers of a canvas from the stack."""
+        self.layers = [l for l in self.layers if l.canvas is not canvas]
+        self._base = None
+
+
+    def invalidate(self, canvas=None):
+        """Drop the cached cells of a static layer's canvas, or of all layers.
+
+        :param canvas: (optional) changed canvas
+        """
+        for layer in self.layers:
+            if canvas is None or layer.canvas is canvas:
+                layer.cells = layer.text = None
+
+        self._base = None
+
+
+    def composite(self):
+        """Combine the layers into :attr:`canvas` and return it."""
+        canvas = self.canvas
+        static = 0
+
+        while static < len(self.layers) and self.layers[static].static:
+            static += 1
+
+        if self._base is None:
+            self._base = self._combine(bytearray(len(canvas.buf)), {},
+                                       self.layers[:static])
+
+        buf, text = self._combine(bytearray(self._base[0]), dict(self._base[1]),
+                                  self.layers[static:])
+
+        for row, col in text:
+            buf[row * canvas.cols + col] = 0
+
+        canvas.buf = buf
+        canvas.text = text
+        canvas._row_cache = {}
+        canvas._bbox = None
+        canvas._bbox_stale = True
+
+        return canvas
+
+
+    def frame(self, *args, **kwargs):
+        """Combine the layers and return the frame, see :meth:`Canvas.frame`."""
+        return self.composite().frame(*args, **kwargs)
+
+
+    def _combine(self, buf, text, layers):
+        for layer in layers:
+            cells, layer_text = self._read(layer)
+
+            if layer.mode == 'or':
+                buf = or_bytes(buf, cells)
+            elif layer.mode == 'xor':
+                buf = xor_bytes(buf, cells)
+            else:
+                buf = mask_bytes(buf, cells)
+
+            text.update(layer_text)
+
+        return buf, text
+
+
+    def _read(self, layer):
+        """Returns the packed cells and the text of a layer's canvas within
+        the compositor area."""
+        if layer.cells is not None:
+            return layer.cells, layer.text
+
+        canvas = layer.canvas
+        cols = self.canvas.cols
+        lines = self.canvas.lines
+        cells = bytearray()
+
+        for row in range(lines):
+            cells += canvas._row_cells(row, 0, cols - 1)
+
+        text = dict(((row, col), char) for (row, col), char in canvas._text_cells().items()
+                    if 0 <= row < lines and 0 <= col < cols)
+
+        if layer.static:
+            layer.cells = cells
+            layer.text = text
+
+        return cells, text
+
+
+def inside(clip, x, y):
+    """Returns True if the pixel is within the clip rectangle (or no clip)
+
+    :param clip: (min_x, min_y, max_x, max_y) tuple or None, max exclusive
+    """
+    return clip is None or (clip[0] <= x < clip[2] and clip[1] <= y < clip[3])
+
+
+def array_inside(clip, xs, ys):
+    """Returns a boolean array of the pixels within the clip rectangle
+
+    :param clip: (min_x, min_y, max_x, max_y) tuple, max exclusive
+    """
+    return (xs >= clip[0]) & (xs < clip[2]) & (ys >= clip[1]) & (ys < clip[3])
+
+
+def clip_cell_range(clip):
+    """Returns the (minrow, maxrow, mincol, maxcol) cells touched by the
+    clip rectangle
+
+    :param clip: (min_x, min_y, max_x, max_y) tuple, max exclusive
+    """
+    return clip[1] >> 2, (clip[3] - 1) >> 2, clip[0] >> 1, (clip[2] - 1) >> 1
+
+
+def clip_mask(clip, row, col=None):
+    """Returns the dots of a cell which are within the clip rectangle
+
+    :param clip: (min_x, min_y, max_x, max_y) tuple, max exclusive
+    :param row: row of the cell
+    :param col: (optional) column of the cell, only the rows are checked if None
+    """
+    mask = 0
+
+    for dy in range(4):
+        if clip[1] <= row * 4 + dy < clip[3]:
+            for dx in range(2):
+                if col is None or clip[0] <= col * 2 + dx < clip[2]:
+                    mask |= pixel_map[dy][dx]
+
+    return mask
+
+
+def clip_line_steps(x1, y1, x2, y2, clip):
+    """Returns the first and last step of the integer line between
+    (x1, y1), (x2, y2) which can be within the clip rectangle or None.
+
+    The range is computed analytically (parametric clipping) and is
+    conservative by half a pixel on the minor axis.
+
+    :param clip: (min_x, min_y, max_x, max_y) tuple, max exclusive
+    """
+    dx = x2 - x1
+    dy = y2 - y1
+    r = max(abs(dx), abs(dy))
+    first, last = 0, r
+
+    for start, diff, lo, hi in ((x1, dx, clip[0], clip[2] - 1),
+                                (y1, dy, clip[1], clip[3] - 1)):
+        if not diff:
+            if not lo <= start <= hi:
+                return None
+            continue
+
+        # step i is at start + i * diff / r, rounded
+        t1 = (lo - 0.5 - start) * r / float(diff)
+        t2 = (hi + 0.5 - start) * r / float(diff)
+
+        if t1 > t2:
+            t1, t2 = t2, t1
+
+        first = max(first, int(math.floor(t1)))
+        last = min(last, int(math.ceil(t2)))
+
+    if first > last:
+        return None
+
+    return first, last
+
+
+def line(x1, y1, x2, y2, clip=None):
+    """Returns the coords of the line between (x1, y1), (x2, y2)
+
+    The coords are integers, computed without floating point arithmetic.
+
+    :param x1: x coordinate of the startpoint
+    :param y1: y coordinate of the startpoint
+    :param x2: x coordinate of the endpoint
+    :param y2: y coordinate of the endpoint
+    :param clip: (optional) (min_x, min_y, max_x, max_y) tuple, only the
+                 coords within it are returned
+    """
+
+    x1 = normalize(x1)
+    y1 = normalize(y1)
+    x2 = normalize(x2)
+    y2 = normalize(y2)
+
+    dx = x2 - x1
+    dy = y2 - y1
+    r = max(abs(dx), abs(dy))
+
+    if not r:
+        if inside(clip, x1, y1):
+            yield (x1, y1)
+        return
+
+    first, last = 0, r
+
+    if clip is not None:
+        steps = clip_line_steps(x1, y1, x2, y2, clip)
+        if steps is None:
+            return
+        first, last = steps
+
+    # x = x1 + i * dx / r (rounded half to even) is tracked as x + xrem / r
+    x, xrem = divmod(first * dx, r)
+    y, yrem = divmod(first * dy, r)
+    x += x1
+    y += y1
+
+    for _ in range(first, last+1):
+        point = (x + (2 * xrem > r or (2 * xrem == r and x & 1)),
+                 y + (2 * yrem > r or (2 * yrem == r and y & 1)))
+
+        if clip is None or inside(clip, *point):
+            yield point
+
+        xrem += dx
+        if xrem >= r:
+            xrem -= r
+            x += 1
+        elif xrem < 0:
+            xrem += r
+            x -= 1
+
+        yrem += dy
+        if yrem >= r:
+            yrem -= r
+            y += 1
+        elif yrem < 0:
+            yrem += r
+            y -= 1
+
+
+def line_cells(x1, y1, x2, y2, skip_first=False, clip=None):
+    """Returns the (row, col, mask) cells of the line between (x1, y1), (x2, y2)
+
+    The pixels of the line are collected per braille cell, the same pixels
+    as :func:`line` are generated.
+
+    :param x1: x coordinate of the startpoint
+    :param y1: y coordinate of the startpoint
+    :param x2: x coordinate of the endpoint
+    :param y2: y coordinate of the endpoint
+    :param skip_first: (optional) leave out the startpoint
+    :param clip: (optional) (min_x, min_y, max_x, max_y) tuple, only the
+                 pixels within it are returned
+    """
+
+    x1 = normalize(x1)
+    y1 = normalize(y1)
+    x2 = normalize(x2)
+    y2 = normalize(y2)
+
+    if x1 == x2 and y1 == y2:
+        if not skip_first and inside(clip, x1, y1):
+            yield y1 >> 2, x1 >> 1, pixel_map[y1 & 3][x1 & 1]
+        return
+
+    dx = x2 - x1
+    dy = y2 - y1
+    steep = abs(dy) > abs(dx)
+
+    # step along the major axis (a) and track the minor one (b) like line()
+    if steep:
+        a, b, da, db = y1, x1, dy, dx
+    else:
+        a, b, da, db = x1, y1, dx, dy
+
+    r = abs(da)
+    step = 1 if da > 0 else -1
+    first, last = 0, r
+
+    if clip is not None:
+        steps = clip_line_steps(x1, y1, x2, y2, clip)
+        if steps is None:
+            return
+        first, last = steps
+
+    a += step * first
+    b, rem = divmod(first * db, r)
+    b += x1 if steep else y1
+    row = col = None
+    mask = 0
+
+    for i in range(first, last+1):
+        if i or not skip_first:
+            pb = b + (2 * rem > r or (2 * rem == r and b & 1))
+
+            if steep:
+                px, py = pb, a
+            else:
+                px, py = a, pb
+
+            if clip is None or inside(clip, px, py):
+                if py >> 2 != row or px >> 1 != col:
+                    if mask:
+                        yield row, col, mask
+                    row = py >> 2
+                    col = px >> 1
+                    mask = 0
+
+                mask |= pixel_map[py & 3][px & 1]
+
+        a += step
+        rem += db
+        if rem >= r:
+            rem -= r
+            b += 1
+        elif rem < 0:
+            rem += r
+            b -= 1
+
+    if mask:
+        yield row, col, mask
+
+
+def polyline(points, closed=False):
+    """Returns the coords of the lines connecting the points.
+
+    Vertices shared by two lines are returned once.
+
+    :param points: list of (x, y) tuples
+    :param closed: (optional) connect the last point to the first one
+    """
+    points = list(points)
+
+    if not points:
+        return
+
+    if len(points) == 1:
+        yield tuple(normalize(c) for c in points[0])
+        return
+
+    if closed:
+        points.append(points[0])
+
+    for i, ((x1, y1), (x2, y2)) in enumerate(zip(points, points[1:])):
+        coords = line(x1, y1, x2, y2)
+
+        # the previous line returned the start vertex
+        if i:
+            next(coords)
+
+        # the closing line ends on the first vertex
+        if closed and i == len(points) - 2:
+            coords = list(coords)[:-1]
+
+        for x, y in coords:
+            yield x, y
+
+
+def polygon_vertices(center_x=0, center_y=0, sides=4, radius=4, closed=False):
+    """Returns the vertices of a regular polygon
+
+    :param closed: (optional) also return the vertex at 360 degrees, which
+                   can round differently than the first one
+    """
+    degree = float(360) / sides
+    ret = []
+
+    for n in range(sides + 1 if closed else sides):
+        a = math.radians(n * degree)
+        ret.append(((center_x + math.cos(a)) * (radius + 1) / 2,
+                    (center_y + math.sin(a)) * (radius + 1) / 2))
+
+    return ret
+
+
+def polygon(center_x=0, center_y=0, sides=4, radius=4):
+    vertices = polygon_vertices(center_x, center_y, sides, radius, closed=True)
+
+    if [normalize(c) for c in vertices[-1]] == [normalize(c) for c in vertices[0]]:
+        return polyline(vertices[:-1], closed=True)
+
+    # the last side ends at the computed 360 degree vertex, which rounds
+    # to another pixel than the first one
+    return polyline(vertices)
+
+
+def isqrt(n):
+    """Returns the largest integer whose square is <= n, 0 for n < 0."""
+    if n <= 0:
+        return 0
+
+    root = int(math.sqrt(n))
+
+    while root * root > n:
+        root -= 1
+    while (root + 1) * (root + 1) <= n:
+        root += 1
+
+    return root
+
+
+def clip_offsets(lo, hi, center):
+    """Returns the (min, max) absolute offsets from center of the integers
+    in [lo, hi] or None if the range is empty."""
+    lo -= center
+    hi -= center
+
+    if lo > hi:
+        return None
+    if lo <= 0 <= hi:
+        return 0, max(-lo, hi)
+    if lo > 0:
+        return lo, hi
+
+    return -hi, -lo
+
+
+def circle(center_x, center_y, radius, clip=None):
+    """Returns the coords of a circle (midpoint algorithm)
+
+    :param center_x: x coordinate of the center
+    :param center_y: y coordinate of the center
+    :param radius: radius of the circle
+    :param clip: (optional) (min_x, min_y, max_x, max_y) tuple, only the
+                 coords within it are returned
+    """
+    cx = normalize(center_x)
+    cy = normalize(center_y)
+    r = abs(normalize(radius))
+    steps = circle_steps(cx, cy, r, clip)
+
+    return circle_points(cx, cy, r, None if steps is None else sorted(steps), clip)
+
+
+def circle_points(center_x, center_y, radius, steps=None, clip=None):
+    """Returns the coords of the octant steps of a circle mirrored to all
+    eight octants, see :func:`circle_octant`."""
+    cx = center_x
+    cy = center_y
+
+    for x, y in circle_octant(radius, steps):
+        for point in set(((cx + x, cy + y), (cx + y, cy + x),
+                          (cx - y, cy + x), (cx - x, cy + y),
+                          (cx - x, cy - y), (cx - y, cy - x),
+                          (cx + y, cy - x), (cx + x, cy - y))):
+            if clip is None or inside(clip, *point):
+                yield point
+
+
+def circle_octant_end(radius):
+    """Returns the y of the last step of :func:`circle_octant`, the
+    largest y whose step x = octant_x(y) still holds x >= y."""
+    r = radius
+    lo, hi = 0, r
+
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if (1 + isqrt(4 * (r * r - mid * mid) - 3)) // 2 >= mid:
+            lo = mid
+        else:
+            hi = mid - 1
+
+    return lo
+
+
+def circle_steps(center_x, center_y, radius, clip=None):
+    """Returns the set of :func:`circle_octant` steps having a mirrored
+    coord within the clip, or None for all of them without a clip."""
+    if clip is None:
+        return None
+    if not radius:
+        return set([0])
+
+    end = circle_octant_end(radius)
+    steps = set()
+
+    # a step y has coords at the offsets x and y from the center on both axes
+    for offsets in (clip_offsets(clip[1], clip[3] - 1, center_y),
+                    clip_offsets(clip[0], clip[2] - 1, center_x)):
+        if offsets:
+            steps.update(range(offsets[0], min(offsets[1], end) + 1))
+
+    return steps
+
+
+def circle_octant(radius, steps=None):
+    """Returns the (x, y) coords of the octant of an origin centered circle
+    where x >= y >= 0 (midpoint algorithm)
+
+    :param radius: non-negative integer radius
+    :param steps: (optional) sorted y coords of the returned steps, all of
+                  them by default
+    """
+    if steps is not None:
+        # the midpoint x of a step is the largest x with x * (x - 1) < r^2 - y^2
+        for y in steps:
+            yield (1 + isqrt(4 * (radius * radius - y * y) - 3)) // 2, y
+        return
+
+    x = radius
+    y = 0
+    err = 1 - x
+
+    while x >= y:
+        yield x, y
+        y += 1
+
+        if err < 0:
+            err += 2 * y + 1
+        else:
+            x -= 1
+            err += 2 * (y - x) + 1
+
+
+def ellipse_quadrant(radius_x, radius_y, bounds=None):
+    """Returns the (x, y) coords of the first quadrant of an origin centered
+    ellipse (midpoint algorithm)
+
+    :param radius_x: horizontal radius
+    :param radius_y: vertical radius
+    :param bounds: (optional) (min_x, min_y, max_x, max_y) inclusive range of
+                   the returned coords, the steps out of it are skipped
+    """
+    rx = abs(normalize(radius_x))
+    ry = abs(normalize(radius_y))
+    min_x, min_y, max_x, max_y = bounds or (0, 0, rx, ry)
+
+    if not ry:
+        for x in range(max(min_x, 0), min(max_x, rx) + 1):
+            if min_y <= 0 <= max_y:
+                yield x, 0
+        return
+
+    rx2 = rx * rx
+    ry2 = ry * ry
+
+    if bounds is not None:
+        # the steps of both regions are computed from their coordinate
+        start_x, start_y = ellipse_regions(rx, ry)
+
+        for x in range(max(min_x, 0), min(max_x, start_x - 1) + 1):
+            y = ellipse_region_y(rx, ry, x)
+            if min_y <= y <= max_y:
+                yield x, y
+
+        for y in range(min(max_y, start_y), max(min_y, 0) - 1, -1):
+            x = start_x if y == start_y else max(start_x, ellipse_region_x(rx, ry, y))
+            if min_x <= x <= max_x:
+                yield x, y
+        return
+
+    x = 0
+    y = ry
+    # decision variables of the two regions, multiplied by 4
+    p = 4 * ry2 - 4 * rx2 * ry + rx2
+
+    while ry2 * x < rx2 * y:
+        yield x, y
+        x += 1
+
+        if p < 0:
+            p += 4 * (2 * ry2 * x + ry2)
+        else:
+            y -= 1
+            p += 4 * (2 * ry2 * x - 2 * rx2 * y + ry2)
+
+    p = ry2 * (2 * x + 1) ** 2 + 4 * rx2 * (y - 1) ** 2 - 4 * rx2 * ry2
+
+    while y >= 0:
+        yield x, y
+        y -= 1
+
+        if p > 0:
+            p += 4 * (rx2 - 2 * rx2 * y)
+        else:
+            x += 1
+            p += 4 * (2 * ry2 * x - 2 * rx2 * y + rx2)
+
+
+def ellipse_region_y(radius_x, radius_y, x):
+    """Returns the y of the first region (stepping x) of
+    :func:`ellipse_quadrant` at x, the largest y whose lower midpoint
+    (x, y - 1/2) is inside the ellipse."""
+    rx2 = radius_x * radius_x
+    ry2 = radius_y * radius_y
+    n = 4 * ry2 * (rx2 - x * x)
+
+    return (isqrt((n - 1) // rx2) + 1) // 2 if n > 0 else 0
+
+
+def ellipse_region_x(radius_x, radius_y, y):
+    """Returns the smallest x whose right midpoint (x + 1/2, y) is outside
+    the ellipse, the x of the second region (stepping y) of
+    :func:`ellipse_quadrant` is never less than its first x."""
+    rx2 = radius_x * radius_x
+    ry2 = radius_y * radius_y
+
+    return (isqrt(4 * rx2 * (ry2 - y * y) // ry2) + 1) // 2
+
+
+def ellipse_regions(radius_x, radius_y):
+    """Returns the (x, y) first coord of the second region of
+    :func:`ellipse_quadrant`, where the slope of the ellipse reaches -1."""
+    if not radius_x:
+        return 0, radius_y
+
+    rx2 = radius_x * radius_x
+    ry2 = radius_y * radius_y
+    lo, hi = 0, radius_x
+
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if ry2 * mid < rx2 * ellipse_region_y(radius_x, radius_y, mid):
+            lo = mid + 1
+        else:
+            hi = mid
+
+    if not lo:
+        return 0, radius_y
+
+    # the first region steps y by one at most
+    return lo, max(ellipse_region_y(radius_x, radius_y, lo),
+                   ellipse_region_y(radius_x, radius_y, lo - 1) - 1)
+
+
+def ellipse(center_x, center_y, radius_x, radius_y, clip=None):
+    """Returns the coords of an ellipse
+
+    :param center_x: x coordinate of the center
+    :param center_y: y coordinate of the center
+    :param radius_x: horizontal radius
+    :param radius_y: vertical radius
+    :param clip: (optional) (min_x, min_y, max_x, max_y) tuple, only the
+                 coords within it are returned
+    """
+    cx = normalize(center_x)
+    cy = normalize(center_y)
+    offsets = None
+
+    if clip is not None:
+        xs = clip_offsets(clip[0], clip[2] - 1, cx)
+        ys = clip_offsets(clip[1], clip[3] - 1, cy)
+        if not xs or not ys:
+            return
+        offsets = (xs[0], ys[0], xs[1], ys[1])
+
+    for x, y in ellipse_quadrant(radius_x, radius_y, offsets):
+        for point in set(((cx + x, cy + y), (cx - x, cy + y),
+                          (cx + x, cy - y), (cx - x, cy - y))):
+            if clip is None or inside(clip, *point):
+                yield point
+
+
+def ellipse_spans(center_x, center_y, radius_x, radius_y, clip=None):
+    """Returns the (y, x1, x2) horizontal pixel runs of a filled ellipse
+
+    :param center_x: x coordinate of the center
+    :param center_y: y coordinate of the center
+    :param radius_x: horizontal radius
+    :param radius_y: vertical radius
+    :param clip: (optional) (min_x, min_y, max_x, max_y) tuple, only the
+                 rows within it are returned, the runs are not cut
+    """
+    cx = normalize(center_x)
+    cy = normalize(center_y)
+    widths = {}
+
+    if clip is None:
+        for x, y in ellipse_quadrant(radius_x, radius_y):
+            widths[y] = max(x, widths.get(y, 0))
+    else:
+        rx = abs(normalize(radius_x))
+        ry = abs(normalize(radius_y))
+        ys = clip_offsets(clip[1], clip[3] - 1, cy)
+
+        if not ys:
+            return
+
+        start_x, start_y = ellipse_regions(rx, ry) if ry else (rx, 0)
+
+        for y in range(ys[0], min(ys[1], ry) + 1):
+            if y <= start_y:
+                widths[y] = max(start_x, ellipse_region_x(rx, ry, y)) if y < start_y else start_x
+            else:
+                # the last x of the first region with this y
+                n = 4 * rx * rx * ry * ry - rx * rx * (2 * y - 1) ** 2
+                widths[y] = min(start_x - 1, isqrt((n - 1) // (4 * ry * ry)))
+
+    for y, x in widths.items():
+        for row in set((cy + y, cy - y)):
+            if clip is None or clip[1] <= row < clip[3]:
+                yield row, cx - x, cx + x
+
+
+def arc(center_x, center_y, radius, start, end, clip=None):
+    """Returns the coords of a circular arc
+
+    Angles are in degrees and grow in the direction of :meth:`Turtle.right`.
+
+    :param center_x: x coordinate of the center
+    :param center_y: y coordinate of the center
+    :param radius: radius of the arc
+    :param start: start angle
+    :param end: end angle
+    :param clip: (optional) (min_x, min_y, max_x, max_y) tuple, only the
+                 coords within it are returned
+    """
+    sweep = end - start
+
+    if abs(sweep) >= 360:
+        for point in circle(center_x, center_y, radius, clip):
+            yield point
+        return
+
+    if sweep < 0:
+        start, end = end, start
+        sweep = -sweep
+
+    cx = normalize(center_x)
+    cy = normalize(center_y)
+    r = abs(normalize(radius))
+    sx, sy = math.cos(math.radians(start)), math.sin(math.radians(start))
+    ex, ey = math.cos(math.radians(end)), math.sin(math.radians(end))
+    large = sweep > 180
+    # only the steps within both the angles and the clip are walked
+    steps = arc_steps(r, start, sweep)
+    clipped = circle_steps(cx, cy, r, clip)
+
+    if clipped is not None:
+        steps &= clipped
+
+    for x, y in circle_points(cx, cy, r, sorted(steps), clip):
+        dx = x - cx
+        dy = y - cy
+        # tolerate the rounding error of the angles' sin/cos
+        after_start = sx * dy - sy * dx > -1e-9
+        before_end = dx * ey - dy * ex > -1e-9
+
+        if (after_start or before_end) if large else (after_start and before_end):
+            yield x, y
+
+
+def arc_steps(radius, start, sweep):
+    """Returns the set of :func:`circle_octant` steps having a mirrored
+    coord within the angles [start, start + sweep].
+
+    Octant k covers the angles [45k, 45k + 45], its coords are mirrored
+    from the steps of the first one, reversed in the odd octants. A step
+    y is at y = rho * sin(angle) with rho within one pixel of the radius.
+    """
+    end = circle_octant_end(radius)
+    start %= 360
+    ranges = [(start, min(start + sweep, 360))]
+
+    if start + sweep > 360:
+        ranges.append((0, start + sweep - 360))
+
+    steps = set()
+
+    for lo, hi in ranges:
+        for k in range(8):
+            first = max(lo, 45 * k)
+            last = min(hi, 45 * k + 45)
+
+            if first > last:
+                continue
+
+            if k % 2:
+                first, last = 45 * k + 45 - last, 45 * k + 45 - first
+            else:
+                first, last = first - 45 * k, last - 45 * k
+
+            first = int(math.floor((radius - 1) * math.sin(math.radians(first)))) - 1
+            last = int(math.ceil((radius + 1) * math.sin(math.radians(last)))) + 1
+            steps.update(range(max(first, 0), min(last, end) + 1))
+
+    return steps
+
+
+def arc_vertices(center_x, center_y, radius, start, end):
+    """Returns the vertices of a polyline approximating an arc within half
+    a pixel"""
+    radius = abs(float(radius))
+    sweep = math.radians(end - start)
+    step = 2 * math.acos(1 - 0.5 / radius) if radius > 0.5 else math.pi / 2
+    n = max(1, int(math.ceil(abs(sweep) / step)))
+    start = math.radians(start)
+
+    return [(center_x + radius * math.cos(start + sweep * i / n),
+             center_y + radius * math.sin(start + sweep * i / n))
+            for i in range(n + 1)]
+
+
+def polygon_spans(points, clip=None):
+    """Returns the (y, x1, x2) horizontal pixel runs of a filled polygon
+    (even-odd rule)
+
+    :param points: list of (x, y) vertices
+    :param clip: (optional) (min_x, min_y, max_x, max_y) only the rows of
+                 this rectangle are scanned, max exclusive
+    """
+    points = [(float(x), float(y)) for x, y in points]
+    edges = [(a, b) if a[1] < b[1] else (b, a)
+             for a, b in zip(points, points[1:] + points[:1]) if a[1] != b[1]]
+
+    if not edges:
+        return
+
+    edges.sort(key=lambda e: e[0][1])
+    miny = int(math.ceil(edges[0][0][1]))
+    maxy = int(math.floor(max(e[1][1] for e in edges)))
+
+    if clip is not None:
+        miny = max(miny, clip[1])
+        maxy = min(maxy, clip[3] - 1)
+
+    active = []
+    i = 0
+
+    for y in range(miny, maxy + 1):
+        while i < len(edges) and edges[i][0][1] <= y:
+            active.append(edges[i])
+            i += 1
+
+        active = [e for e in active if e[1][1] > y]
+        xs = sorted(x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+                    for (x1, y1), (x2, y2) in active)
+
+        for left, right in zip(xs[::2], xs[1::2]):
+            left = int(math.ceil(left))
+            right = int(math.floor(right))
+            if left <= right:
+                yield y, left, right
+
+
+def span_cells(spans):
+    """Returns the cells of horizontal pixel runs within one row of cells.
+
+    Returns the first column and a bytearray of dot masks, cells fully
+    covered by the runs are 0xFF.
+
+    :param spans: list of (dy, x1, x2) runs, dy is the pixel row in the cell
+    """
+    mincol = min(x1 for _, x1, _ in spans) >> 1
+    maxcol = max(x2 for _, _, x2 in spans) >> 1
+    cells = bytearray(maxcol - mincol + 1)
+
+    for dy, x1, x2 in spans:
+        left, right = pixel_map[dy]
+        c1 = (x1 >> 1) - mincol
+        c2 = (x2 >> 1) - mincol
+        row = bytearray(len(cells))
+        row[c1:c2 + 1] = bytearray([left | right]) * (c2 - c1 + 1)
+
+        if x1 & 1:
+            row[c1] &= right
+        if not x2 & 1:
+            row[c2] &= left
+
+        cells = or_bytes(cells, row)
+
+    return mincol, cells
+
+
+def lsystem(axiom, rules, iterations):
+    """Yields the symbols of an L-system after the given number of rewrite
+    iterations one by one, without building the whole string.
+
+    :param axiom: initial symbols
+    :param rules: dict of symbol -> replacement symbols, other symbols are
+                  kept as they are
+    :param iterations: Integer. Number of rewrites
+    """
+    stack = [(iter(axiom), iterations)]
+
+    while stack:
+        symbols, depth = stack[-1]
+
+        for symbol in symbols:
+            if depth and symbol in rules:
+                stack.append((iter(rules[symbol]), depth - 1))
+                break
+            yield symbol
+        else:
+            stack.pop()
+
+
+class Turtle(Canvas):
+    """Turtle graphics interface
+    http://en.wikipedia.org/wiki/Turtle_graphics
+
+    In recording mode the lines are queued and drawn in one batch when the
+    canvas is read (:meth:`frame`, :meth:`get`, ...) or :meth:`flush` is
+    called. Consecutive forward moves in the same heading are merged into
+    one line and repeated lines are drawn once, so the result can differ
+    from the step by step drawing where the merged moves were rounded.
+
+    :param pos_x: (optional) x coordinate of the turtle
+    :param pos_y: (optional) y coordinate of the turtle
+    :param record: (optional) queue the lines instead of drawing them
+    """
+
+    def __init__(self, pos_x=0, pos_y=0, record=False):
+        self.pos_x = pos_x
+        self.pos_y = pos_y
+        self.rotation = 0
+        self.brush_on = True
+        self.record = record
+        # (cos, sin) of the headings
+        self._headings = {}
+        super(Turtle, self).__init__()
+
+
+    def clear(self):
+        """Remove all pixels, colors and recorded lines."""
+        # [x1, y1, x2, y2] lines and the (heading, direction) of the last one
+        self._segments = []
+        self._run = None
+        super(Turtle, self).clear()
+
+
+    def up(self):
+        """Pull the brush up."""
+        self.brush_on = False
+
+
+    def down(self):
+        """Push the brush down."""
+        self.brush_on = True
+
+
+    def forward(self, step):
+        """Move the turtle forward.
+
+        :param step: Integer. Distance to move forward.
+        """
+        cos_, sin_ = self._heading()
+        self._draw_to(self.pos_x + cos_ * step, self.pos_y + sin_ * step,
+                      (self.rotation % 360, step > 0))
+
+
+    def move(self, x, y):
+        """Move the turtle to a coordinate.
+
+        :param x: x coordinate
+        :param y: y coordinate
+        """
+        if self.brush_on:
+            self._draw_to(x, y)
+        else:
+            self.pos_x = x
+            self.pos_y = y
+            self._run = None
+
+
+    def right(self, angle):
+        """Rotate the turtle (positive direction).
+
+        :param angle: Integer. Rotation angle in degrees.
+        """
+        self.rotation += angle
+
+
+    def left(self, angle):
+        """Rotate the turtle (negative direction).
+
+        :param angle: Integer. Rotation angle in degrees.
+        """
+        self.rotation -= angle
+
+
+    def back(self, step):
+        """Move the turtle backwards.
+
+        :param step: Integer. Distance to move backwards.
+        """
+        self.forward(-step)
+
+
+    def run(self, symbols, step=1, angle=90):
+        """Draw a sequence of L-system symbols, see :func:`lsystem`.
+
+        'F' and 'G' move forward drawing a line, 'f' moves forward without
+        drawing, '+' and '-' turn right and left, '[' saves and ']'
+        restores the position and heading. Other symbols are ignored.
+
+        :param symbols: iterable of single character symbols
+        :param step: (optional) distance of a move
+        :param angle: (optional) angle of a turn in degrees
+        """
+        stack = []
+
+        for symbol in symbols:
+            if symbol == 'F' or symbol == 'G':
+                self.forward(step)
+            elif symbol == '+':
+                self.rotation += angle
+            elif symbol == '-':
+                self.rotation -= angle
+            elif symbol == '[':
+                stack.append((self.pos_x, self.pos_y, self.rotation))
+            elif symbol == ']':
+                self.pos_x, self.pos_y, self.rotation = stack.pop()
+                self._run = None
+            elif symbol == 'f':
+                cos_, sin_ = self._heading()
+                self.pos_x += cos_ * step
+                self.pos_y += sin_ * step
+                self._run = None
+
+
+    def flush(self):
+        """Draw the recorded lines."""
+        segments = self._segments
+
+        if not segments:
+            return
+
+        self._segments = []
+        self._run = None
+        clip = self.clip
+        # lines between the same (rounded) points have the same pixels
+        unique = set((normalize(x1), normalize(y1), normalize(x2), normalize(y2))
+                     for x1, y1, x2, y2 in segments)
+        self._set_cells(chain.from_iterable(line_cells(x1, y1, x2, y2, clip=clip)
+                                            for x1, y1, x2, y2 in unique))
+
+
+    def _heading(self):
+        """Returns the (cos, sin) of the rotation, cached per heading in
+        recording mode."""
+        if not self.record:
+            angle = math.radians(self.rotation)
+            return math.cos(angle), math.sin(angle)
+
+        rotation = self.rotation % 360
+        vector = self._headings.get(rotation)
+
+        if vector is None:
+            angle = math.radians(rotation)
+            vector = self._headings[rotation] = (math.cos(angle), math.sin(angle))
+
+        return vector
+
+
+    def _draw_to(self, x, y, run=None):
+        """Draw (or record) a line to x, y and move there, run is the
+        (heading, direction) of a forward move."""
+        if not self.record:
+            self.line(self.pos_x, self.pos_y, x, y)
+        elif run is not None and run == self._run:
+            # collinear with the previous forward move, extend it
+            self._segments[-1][2:] = [x, y]
+        else:
+            self._segments.append([self.pos_x, self.pos_y, x, y])
+
+        self._run = run
+        self.pos_x = x
+        self.pos_y = y
+
+
+    def get(self, x, y):
+        """Get the state of a pixel, the recorded lines are drawn first."""
+        self.flush()
+        return super(Turtle, self).get(x, y)
+
+
+    def unset(self, x, y):
+        """Unset a pixel, the recorded lines are drawn first."""
+        self.flush()
+        super(Turtle, self).unset(x, y)
+
+
+    def toggle(self, x, y):
+        """Toggle a pixel, the recorded lines are drawn first."""
+        self.flush()
+        super(Turtle, self).toggle(x, y)
+
+
+    def set_clip(self, min_x=None, min_y=None, max_x=None, max_y=None):
+        """Set the clip rectangle, the recorded lines are drawn with the old one."""
+        self.flush()
+        super(Turtle, self).set_clip(min_x, min_y, max_x, max_y)
+
+
+    def _update_many(self, xs, ys, op):
+        """Draw the recorded lines before the bulk update."""
+        self.flush()
+        super(Turtle, self)._update_many(xs, ys, op)
+
+
+    def _bounds(self):
+        """Draw the recorded lines before computing the bounding box."""
+        self.flush()
+        return super(Turtle, self)._bounds()
+
+
+    def _cell_blocks(self):
+        """Draw the recorded lines before the cells are read."""
+        self.flush()
+        return super(Turtle, self)._cell_blocks()
+
+
+    def _row_cells(self, rownum, mincol, maxcol):
+        """Draw the recorded lines before a row is read."""
+        self.flush()
+        return super(Turtle, self)._row_cells(rownum, mincol, maxcol)
+
+
+    # aliases
+    pu = up
+    pd = down
+    fd = forward
+    mv = move
+    rt = right
+    lt = left
+    bk = back
+
+
+def diff_rows(prev, rows, merge_gap=4):
+    """Returns the (row, col, text) runs which turn the prev rows into rows.
+
+    Cells of a row that got shorter are overwritten with spaces.
+
+    :param prev: list of the previously rendered rows
+    :param rows: list of the new rows
+    :param merge_gap: (optional) Integer. Maximum number of unchanged cells
+                      between two changed runs to write them as one run
+    """
+    runs = []
+
+    for y in range(max(len(prev), len(rows))):
+        old = prev[y] if y < len(prev) else u''
+        new = rows[y] if y < len(rows) else u''
+
+        if old is new or old == new:
+            continue
+
+        if len(new) < len(old):
+            new += u' ' * (len(old) - len(new))
+
+        old_len = len(old)
+        start = None
+        gap = 0
+
+        for x, char in enumerate(new):
+            if x < old_len and old[x] == char:
+                if start is not None:
+                    gap += 1
+                    if gap > merge_gap:
+                        runs.append((y, start, new[start:x - gap + 1]))
+                        start = None
+                continue
+
+            if start is None:
+                start = x
+            gap = 0
+
+        if start is not None:
+            runs.append((y, start, new[start:len(new) - gap]))
+
+    return runs
+
+
+def ansi_runs(runs, clear=False):
+    """Returns the runs of :func:`diff_rows` as cursor addressed ANSI text.
+
+    :param runs: list of (row, col, text) tuples
+    :param clear: (optional) clear the screen first
+    """
+    ret = [u'\x1b[H\x1b[2J'] if clear else []
+
+    for y, x, text in runs:
+        ret.append(u'\x1b[{0};{1}H{2}'.format(y + 1, x + 1, text))
+
+    return u''.join(ret)
+
+
+class DiffRenderer(object):
+    """Incremental frame output, only the cells which changed since the
+    previous frame are written.
+
+    :param out: curses window or writable file object (ANSI output)
+    :param full_refresh: (optional) Integer. Redraw everything every Nth frame
+    :param merge_gap: (optional) Integer. See :func:`diff_rows`
+    """
+
+    def __init__(self, out, full_refresh=None, merge_gap=4):
+        self.out = out
+        self.full_refresh = full_refresh
+        self.merge_gap = merge_gap
+        self.reset()
+
+
+    def reset(self):
+        """Forget the previous frame, the next frame is fully redrawn."""
+        self.prev = None
+        self.frame_count = 0
+
+
+    def render(self, rows):
+        """Output a frame.
+
+        :param rows: list of rows, see :meth:`Canvas.rows`
+        """
+        full = self.prev is None or \
+            (self.full_refresh and self.frame_count % self.full_refresh == 0)
+
+        if full:
+            runs = [(y, 0, row) for y, row in enumerate(rows) if row]
+        else:
+            runs = diff_rows(self.prev, rows, self.merge_gap)
+
+        self.prev = rows
+        self.frame_count += 1
+
+        if hasattr(self.out, 'addstr'):
+            self._render_curses(runs, full)
+        else:
+            self.out.write(ansi_runs(runs, full))
+            self.out.flush()
+
+        return runs
+
+
+    def _render_curses(self, runs, clear):
+        if clear:
+            self.out.erase()
+
+        for y, x, text in runs:
+            try:
+                self.out.addstr(y, x, text if IS_PY3 else text.encode('utf-8'))
+            except curses.error:
+                # writing the bottom right cell moves the cursor off screen
+                pass
+
+        self.out.refresh()
+
+
+class BroadcastClient(object):
+    """A connection of :class:`BroadcastServer`.
+
+    :param sock: connected non-blocking socket
+    :param address: remote address
+    """
+
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+        self.prev = None
+        self.outbox = b''
+        self.frames = 0
+        self.skipped = 0
+
+
+    def flush(self):
+        """Send as much of the pending output as the socket accepts.
+        Returns True if nothing is left to send."""
+        while self.outbox:
+            try:
+                sent = self.sock.send(self.outbox)
+            except socket.error as e:
+                if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return False
+                raise
+            self.outbox = self.outbox[sent:]
+
+        return True
+
+
+class BroadcastServer(object):
+    """TCP server which sends the frames to every connected client (e.g.
+    ``telnet`` or ``nc``) as ANSI diffs, see :class:`DiffRenderer`.
+
+    Each frame is rendered once, clients only receive the changes since the
+    last frame they got. A client which has not read the previous frame yet
+    skips frames instead of blocking the others.
+
+    :param host: (optional) interface to listen on
+    :param port: (optional) Integer. TCP port, 0 picks a free one
+    :param merge_gap: (optional) Integer. See :func:`diff_rows`
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, merge_gap=4):
+        self.merge_gap = merge_gap
+        self.clients = []
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.listen(5)
+        self.sock.setblocking(False)
+        self.address = self.sock.getsockname()
+
+
+    def poll(self):
+        """Accept new clients, drop the disconnected ones and send pending
+        output."""
+        while True:
+            try:
+                sock, address = self.sock.accept()
+            except socket.error as e:
+                if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+            sock.setblocking(False)
+            self.clients.append(BroadcastClient(sock, address))
+
+        socks = [c.sock for c in self.clients]
+        readable = select.select(socks, [], [], 0)[0] if socks else []
+
+        for client in list(self.clients):
+            try:
+                # client input is ignored, an empty read means disconnect
+                if client.sock in readable and not client.sock.recv(4096):
+                    raise socket.error(errno.ECONNRESET, 'disconnected')
+                client.flush()
+            except socket.error:
+                self.remove(client)
+
+
+    def broadcast(self, rows):
+        """Send a frame to the clients.
+
+        :param rows: list of rows, see :meth:`Canvas.rows`
+        """
+        self.poll()
+        # clients with the same previous frame get the same diff
+        encoded = {}
+
+        for client in list(self.clients):
+            if client.outbox:
+                client.skipped += 1
+                continue
+
+            key = id(client.prev)
+
+            if key not in encoded:
+                if client.prev is None:
+                    runs = [(y, 0, row) for y, row in enumerate(rows) if row]
+                else:
+                    runs = diff_rows(client.prev, rows, self.merge_gap)
+                encoded[key] = ansi_runs(runs, client.prev is None).encode('utf-8')
+
+            client.outbox = encoded[key]
+            client.prev = rows
+            client.frames += 1
+
+            try:
+                client.flush()
+            except socket.error:
+                self.remove(client)
+
+
+    def remove(self, client):
+        """Disconnect a client."""
+        self.clients.remove(client)
+        client.sock.close()
+
+
+    def close(self):
+        """Disconnect the clients and stop listening."""
+        for client in list(self.clients):
+            self.remove(client)
+        self.sock.close()
+
+
+def bitmap_frame(bitmap, width=None, height=None, threshold=None, invert=False,
+                 dither=None):
+    """Returns the frame of a bitmap, see :func:`bitmap_cells`.
+
+    :param bitmap: 2-D sequence/array of pixels or raw bytes
+    :param width: (optional) bitmap width, required for raw bytes
+    :param height: (optional) bitmap height, required for raw bytes
+    :param threshold: (optional) pixel value threshold
+    :param invert: (optional) inverts the threshold check
+    :param dither: (optional) dither method, see :func:`dither_bitmap`
+    """
+    canvas = DenseCanvas.from_bitmap(bitmap, width, height, threshold, invert, dither)
+    return canvas.frame(0, 0)
+
+
+def pipeline(frames, convert=bitmap_frame, processes=None, max_pending=None):
+    """Convert frames in a process pool, yields the results in order.
+
+    At most ``max_pending`` frames are converted or waiting at once, the
+    frames iterable is not advanced further until the oldest is consumed.
+
+    :param frames: iterable of argument tuples of convert
+    :param convert: (optional) picklable function, defaults to :func:`bitmap_frame`
+    :param processes: (optional) Integer. Number of worker processes,
+                      defaults to the number of CPUs
+    :param max_pending: (optional) Integer. Defaults to twice the processes
+    """
+    from multiprocessing import Pool, cpu_count
+
+    processes = processes or cpu_count()
+    max_pending = max_pending or 2 * processes
+    pool = Pool(processes)
+    pending = deque()
+
+    try:
+        for args in frames:
+            pending.append(pool.apply_async(convert, args))
+            if len(pending) >= max_pending:
+                yield pending.popleft().get()
+
+        while pending:
+            yield pending.popleft().get()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+class FrameScheduler(object):
+    """Fixed rate frame timing based on monotonic deadlines.
+
+    Frame ``n`` is due at ``start + n * period``, the time spent rendering
+    does not shift the following frames. A frame which arrives after the
+    deadline of the next one is dropped and the schedule restarts from the
+    current time slot. The frame after a dropped one is always shown, so a
+    producer slower than the period still gets every other frame on screen.
+
+    :param period: Float. Target frame period in seconds, None or 0 disables
+                   waiting and dropping
+    :param history: (optional) Integer. Number of frames kept in ``timings``
+    :param clock: (optional) monotonic clock function
+    :param sleep: (optional) sleep function
+    """
+
+    def __init__(self, period, history=120, clock=monotonic, sleep=sleep):
+        self.period = period or 0
+        self.clock = clock
+        self.sleep = sleep
+        self.timings = deque(maxlen=history)
+        self.reset()
+
+
+    def reset(self):
+        """Restart the schedule and the statistics."""
+        self.start = None
+        self.index = 0
+        self.frames = 0
+        self.dropped = 0
+        self.resynced = False
+        self.render_time = 0.0
+        self.output_time = 0.0
+        self.timings.clear()
+
+
+    def due(self):
+        """Called when a frame is produced. Returns False if the frame is
+        late and should be dropped."""
+        now = self.clock()
+
+        if self.start is None:
+            self.start = now
+
+        if not self.period:
+            self.index += 1
+            return True
+
+        deadline = self.start + self.index * self.period
+        self.index += 1
+
+        if now > deadline + self.period and not self.resynced:
+            # skip the missed slots instead of falling further behind
+            self.index = int((now - self.start) // self.period) + 1
+            self.resynced = True
+            self.dropped += 1
+            return False
+
+        self.resynced = False
+        return True
+
+
+    def done(self, render_time, output_time, wait=True):
+        """Record the timing of a rendered frame and wait for the next
+        deadline.
+
+        :param render_time: Float. Seconds spent drawing the frame
+        :param output_time: Float. Seconds spent writing the frame
+        :param wait: (optional) sleep until the next deadline
+        """
+        self.frames += 1
+        self.render_time += render_time
+        self.output_time += output_time
+        self.timings.append((render_time * 1000, output_time * 1000))
+
+        if wait:
+            delay = self.remaining()
+            if delay > 0:
+                self.sleep(delay)
+
+
+    def remaining(self):
+        """Returns the seconds left until the next frame is due."""
+        if not self.period or self.start is None:
+            return 0
+
+        return max(0, self.start + self.index * self.period - self.clock())
+
+
+    def stats(self):
+        """Returns a dict of the frame statistics: rendered and dropped
+        frames, achieved fps and average render / output ms per frame."""
+        elapsed = self.clock() - self.start if self.start is not None else 0
+        frames = self.frames or 1
+
+        return {'frames': self.frames,
+                'dropped': self.dropped,
+                'fps': self.frames / elapsed if elapsed > 0 else 0.0,
+                'render_ms': self.render_time * 1000 / frames,
+                'output_ms': self.output_time * 1000 / frames}
+
+
+def animate(canvas, fn, delay=1./24, *args, **kwargs):
+    """Animation automation function
+
+    Frames are shown at a fixed rate, late frames are dropped. Returns the
+    :class:`FrameScheduler` holding the frame statistics.
+
+    :param canvas: :class:`Canvas` object, a :class:`DoubleBufferedCanvas`
+                   is swapped instead of cleared after each frame
+    :param fn: Callable. Frame coord generator
+    :param delay: Float. Frame period in seconds, None or 0 for no pacing, or
+                  a :class:`FrameScheduler`
+    :param *args, **kwargs: optional fn parameters
+    """
+
+    # python2 unicode curses fix
+    if not IS_PY3:
+        import locale
+        locale.setlocale(locale.LC_ALL, "")
+
+    scheduler = delay if isinstance(delay, FrameScheduler) else FrameScheduler(delay)
+
+    def animation(stdscr):
+        renderer = DiffRenderer(stdscr)
+        reset = getattr(canvas, 'swap', canvas.clear)
+        clock = scheduler.clock
+
+        for frame in fn(*args, **kwargs):
+            if not scheduler.due():
+                continue
+            start = clock()
+            canvas.set_many(frame)
+            rows = canvas.rows()
+            rendered = clock()
+            renderer.render(rows)
+            reset()
+            scheduler.done(rendered - start, clock() - rendered)
 
-            f = canvas.frame()
-            stdscr.addstr(0, 0, '{0}\n'.format(f))
-            stdscr.refresh()
-            if delay:
-                sleep(delay)
-            canvas.clear()
+        return scheduler
 
-    curses.wrapper(animation)
+    return curses.wrapper(animation)
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+
+# drawille is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# drawille is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with drawille. If not, see < http://www.gnu.org/licenses/ >.
+#
+# (C) 2014- by Adam Tauber, <asciimoo@gmail.com>
+
+"""3D transforms and wireframe rendering
+
+Vertices are transformed in one batch by 4x4 matrices (with NumPy if it is
+installed), projected to canvas coordinates and drawn as a list of unique
+edges.
+"""
+
+from itertools import chain
+from math import cos, radians, sin
+
+from drawille import is_array, numpy
+
+
+def identity():
+    """Returns the 4x4 identity matrix."""
+    return [[1.0, 0.0, 0.0, 0.0],
+            [0.0, 1.0, 0.0, 0.0],
+            [0.0, 0.0, 1.0, 0.0],
+            [0.0, 0.0, 0.0, 1.0]]
+
+
+def translation(x=0, y=0, z=0):
+    """Returns a matrix which moves the vertices by x, y, z."""
+    m = identity()
+    m[0][3], m[1][3], m[2][3] = float(x), float(y), float(z)
+    return m
+
+
+def scaling(x=1, y=None, z=None):
+    """Returns a matrix which scales the vertices, y and z default to x."""
+    m = identity()
+    m[0][0] = float(x)
+    m[1][1] = float(x if y is None else y)
+    m[2][2] = float(x if z is None else z)
+    return m
+
+
+def rotation_x(angle):
+    """Returns a matrix which rotates the vertices around the X axis by the
+    given angle in degrees."""
+    c, s = cos(radians(angle)), sin(radians(angle))
+    m = identity()
+    m[1][1], m[1][2], m[2][1], m[2][2] = c, -s, s, c
+    return m
+
+
+def rotation_y(angle):
+    """Returns a matrix which rotates the vertices around the Y axis by the
+    given angle in degrees."""
+    c, s = cos(radians(angle)), sin(radians(angle))
+    m = identity()
+    m[0][0], m[0][2], m[2][0], m[2][2] = c, s, -s, c
+    return m
+
+
+def rotation_z(angle):
+    """Returns a matrix which rotates the vertices around the Z axis by the
+    given angle in degrees."""
+    c, s = cos(radians(angle)), sin(radians(angle))
+    m = identity()
+    m[0][0], m[0][1], m[1][0], m[1][1] = c, -s, s, c
+    return m
+
+
+def compose(*matrices):
+    """Returns the matrix which applies the given matrices in order, the
+    first one first.
+
+    :param matrices: 4x4 matrices (nested lists or NumPy arrays)
+    """
+    ret = identity()
+
+    for m in matrices:
+        m = [list(row) for row in m]
+        ret = [[sum(m[i][k] * ret[k][j] for k in range(4)) for j in range(4)]
+               for i in range(4)]
+
+    return ret
+
+
+def transform(vertices, matrix):
+    """Apply a 4x4 matrix to all the vertices at once.
+
+    Returns an Nx3 NumPy array if NumPy is installed, a list of (x, y, z)
+    tuples otherwise.
+
+    :param vertices: iterable of (x, y, z) vertices or an Nx3 array
+    :param matrix: 4x4 matrix, see :func:`compose`
+    """
+    affine = list(matrix[3]) == [0, 0, 0, 1]
+
+    if numpy is not None:
+        vertices = numpy.asarray(vertices, dtype=float).reshape(-1, 3)
+        m = numpy.asarray(matrix, dtype=float)
+        ret = vertices.dot(m[:3, :3].T) + m[:3, 3]
+        if not affine:
+            ret /= (vertices.dot(m[3, :3]) + m[3, 3])[:, None]
+        return ret
+
+    rows = [list(row) for row in matrix]
+    (a, b, c, d), (e, f, g, h), (i, j, k, l), (m, n, o, p) = rows
+    ret = []
+
+    for x, y, z in vertices:
+        w = 1.0 if affine else m * x + n * y + o * z + p
+        ret.append(((a * x + b * y + c * z + d) / w,
+                    (e * x + f * y + g * z + h) / w,
+                    (i * x + j * y + k * z + l) / w))
+
+    return ret
+
+
+def project(vertices, width, height, fov=None, distance=0):
+    """Project vertices to canvas coordinates, the origin is placed at the
+    center of the width x height area and the y axis points up.
+
+    Returns an Nx2 NumPy array for an array, a list of (x, y) tuples
+    otherwise.
+
+    :param vertices: iterable of (x, y, z) vertices or an Nx3 array
+    :param width: width of the area in pixels
+    :param height: height of the area in pixels
+    :param fov: (optional) field of view factor of a perspective projection,
+                orthographic projection if None
+    :param distance: (optional) distance of the viewer from the origin, the
+                     viewer looks from -z towards +z
+    """
+    cx = width / 2.
+    cy = height / 2.
+
+    if is_array(vertices):
+        factor = fov / (distance + vertices[:, 2]) if fov else 1.0
+        return numpy.column_stack((vertices[:, 0] * factor + cx,
+                                   cy - vertices[:, 1] * factor))
+
+    ret = []
+
+    for x, y, z in vertices:
+        factor = fov / (distance + z) if fov else 1.0
+        ret.append((x * factor + cx, cy - y * factor))
+
+    return ret
+
+
+def edges(faces):
+    """Returns the sorted list of the unique (a, b) vertex index pairs,
+    a < b, of the sides of the faces.
+
+    :param faces: iterable of vertex index sequences
+    """
+    ret = set()
+
+    for face in faces:
+        for a, b in zip(face, tuple(face[1:]) + (face[0],)):
+            if a != b:
+                ret.add((min(a, b), max(a, b)))
+
+    return sorted(ret)
+
+
+def visible_faces(points, faces):
+    """Returns the indexes of the faces which are front facing, wound
+    clockwise on the canvas. A face is front facing if the normal of its
+    first three vertices, ``(v1 - v0) x (v2 - v0)``, points towards the
+    viewer.
+
+    :param points: projected vertices, see :func:`project`
+    :param faces: list of vertex index sequences, or an Nx3 array of the
+                  first three vertex indexes of each face
+    """
+    if is_array(points):
+        corners = faces if is_array(faces) else numpy.asarray([face[:3] for face in faces])
+        if not len(corners):
+            return []
+        a, b, c = points[corners[:, 0]], points[corners[:, 1]], points[corners[:, 2]]
+        area = (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - \
+            (c[:, 0] - a[:, 0]) * (b[:, 1] - a[:, 1])
+        return numpy.flatnonzero(area > 0).tolist()
+
+    ret = []
+
+    for index, face in enumerate(faces):
+        (x0, y0), (x1, y1), (x2, y2) = points[face[0]], points[face[1]], points[face[2]]
+        if (x1 - x0) * (y2 - y0) - (x2 - x0) * (y1 - y0) > 0:
+            ret.append(index)
+
+    return ret
+
+
+def draw_edges(canvas, points, edges, x=0, y=0):
+    """Draw lines between the projected vertices.
+
+    :param canvas: :class:`drawille.Canvas` object
+    :param points: projected vertices, see :func:`project`
+    :param edges: iterable of (a, b) vertex index pairs
+    :param x: (optional) x offset of the points
+    :param y: (optional) y offset of the points
+    """
+    if is_array(points):
+        points = points.tolist()
+
+    for a, b in edges:
+        x1, y1 = points[a]
+        x2, y2 = points[b]
+        canvas.line(x1 + x, y1 + y, x2 + x, y2 + y)
+
+
+class Mesh(object):
+    """Vertices and faces of a wireframe model.
+
+    Every edge shared by faces is drawn once. With back-face culling the
+    faces must be wound so that ``(v1 - v0) x (v2 - v0)`` points outwards.
+
+    :param vertices: iterable of (x, y, z) vertices or an Nx3 array
+    :param faces: iterable of vertex index sequences
+    """
+
+    def __init__(self, vertices, faces):
+        if numpy is not None:
+            self.vertices = numpy.asarray(vertices, dtype=float).reshape(-1, 3)
+        else:
+            self.vertices = [tuple(float(c) for c in v) for v in vertices]
+        self.faces = [tuple(face) for face in faces]
+        self.edges = edges(self.faces)
+        # first three vertices of each face, for back-face culling
+        self.corners = [face[:3] for face in self.faces]
+        if numpy is not None:
+            self.corners = numpy.asarray(self.corners, dtype=int).reshape(-1, 3)
+        # indexes of the edges of each face
+        index = dict((edge, i) for i, edge in enumerate(self.edges))
+        self.face_edges = [[index[(min(a, b), max(a, b))]
+                            for a, b in zip(face, face[1:] + face[:1]) if a != b]
+                           for face in self.faces]
+
+
+    def project(self, matrix=None, width=0, height=0, fov=None, distance=0):
+        """Returns the transformed and projected vertices, see
+        :func:`transform` and :func:`project`."""
+        vertices = self.vertices if matrix is None else transform(self.vertices, matrix)
+        return project(vertices, width, height, fov, distance)
+
+
+    def draw(self, canvas, matrix=None, width=0, height=0, fov=None, distance=0,
+             cull=False, x=0, y=0):
+        """Transform, project and draw the mesh.
+
+        :param canvas: :class:`drawille.Canvas` object
+        :param matrix: (optional) 4x4 transform matrix
+        :param width: (optional) width of the projection area, see :func:`project`
+        :param height: (optional) height of the projection area
+        :param fov: (optional) field of view factor, orthographic projection if None
+        :param distance: (optional) distance of the viewer from the origin
+        :param cull: (optional) skip the faces which look away from the viewer
+        :param x: (optional) x offset on the canvas
+        :param y: (optional) y offset on the canvas
+        """
+        points = self.project(matrix, width, height, fov, distance)
+        edge_list = self.edges
+
+        if cull:
+            visible = visible_faces(points, self.corners)
+            edge_list = [self.edges[i] for i in
+                         sorted(set(chain.from_iterable(self.face_edges[f] for f in visible)))]
+
+        draw_edges(canvas, points, edge_list, x, y)
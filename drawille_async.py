@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+# drawille is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# drawille is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with drawille. If not, see < http://www.gnu.org/licenses/ >.
+#
+# (C) 2014- by Adam Tauber, <asciimoo@gmail.com>
+
+"""asyncio animation loop, requires python 3.7+"""
+
+from contextlib import contextmanager
+import asyncio
+import curses
+import sys
+
+from drawille import DiffRenderer, FrameScheduler
+
+
+@contextmanager
+def curses_screen():
+    """Initialize curses with a non-blocking keyboard and restore the
+    terminal on exit, like :func:`curses.wrapper`."""
+    stdscr = curses.initscr()
+
+    try:
+        curses.noecho()
+        curses.cbreak()
+        stdscr.keypad(True)
+        stdscr.nodelay(True)
+        yield stdscr
+    finally:
+        stdscr.keypad(False)
+        curses.nocbreak()
+        curses.echo()
+        curses.endwin()
+
+
+def read_keys(stdscr, keys):
+    """Move the pending key presses of a non-blocking curses window to a
+    queue.
+
+    :param stdscr: curses window in nodelay mode
+    :param keys: :class:`asyncio.Queue` of key codes
+    """
+    while True:
+        key = stdscr.getch()
+        if key == -1:
+            return
+        keys.put_nowait(key)
+
+
+async def aiterate(frames):
+    """Iterate over an async or a regular iterable."""
+    if hasattr(frames, '__aiter__'):
+        async for frame in frames:
+            yield frame
+    else:
+        for frame in frames:
+            yield frame
+
+
+async def render_frames(canvas, frames, scheduler, renderer):
+    """Draw, output and pace the frames, see :func:`animate_async`."""
+    reset = getattr(canvas, 'swap', canvas.clear)
+    clock = scheduler.clock
+
+    async for frame in aiterate(frames):
+        if not scheduler.due():
+            continue
+        start = clock()
+        canvas.set_many(frame)
+        rows = canvas.rows()
+        rendered = clock()
+        renderer.render(rows)
+        reset()
+        scheduler.done(rendered - start, clock() - rendered, wait=False)
+        # always yield to the event loop, even if the frame is late
+        await asyncio.sleep(scheduler.remaining())
+
+    return scheduler
+
+
+async def animate_async(canvas, frames, delay=1./24, keys=None, out=None):
+    """Animation coroutine, the asyncio version of :func:`drawille.animate`
+
+    Returns the :class:`drawille.FrameScheduler` holding the frame statistics.
+
+    :param canvas: :class:`drawille.Canvas` object
+    :param frames: async or regular iterable of frame coords
+    :param delay: Float. Frame period in seconds, or a :class:`drawille.FrameScheduler`
+    :param keys: (optional) :class:`asyncio.Queue`, receives the pressed keys
+    :param out: (optional) file object, frames are written to it as ANSI
+                sequences instead of a curses screen and keys are not read
+    """
+    scheduler = delay if isinstance(delay, FrameScheduler) else FrameScheduler(delay)
+
+    if out is not None:
+        return await render_frames(canvas, frames, scheduler, DiffRenderer(out))
+
+    loop = asyncio.get_running_loop()
+    fd = sys.stdin.fileno()
+
+    with curses_screen() as stdscr:
+        if keys is not None:
+            loop.add_reader(fd, read_keys, stdscr, keys)
+
+        try:
+            return await render_frames(canvas, frames, scheduler, DiffRenderer(stdscr))
+        finally:
+            if keys is not None:
+                loop.remove_reader(fd)
@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""drawille benchmark suite
+
+Run the benchmarks and print the results as JSON:
+
+    $ python benchmark.py > baseline.json
+
+Compare another drawille version against the saved results, the exit
+status is 1 if any benchmark got slower than the tolerance:
+
+    $ python benchmark.py --baseline baseline.json --tolerance 0.2
+"""
+
+from __future__ import print_function
+from argparse import ArgumentParser
+from math import sin, radians
+from random import Random
+from timeit import default_timer
+import json
+import platform
+import sys
+
+import drawille
+from drawille import Canvas, Turtle, line, polygon
+
+
+benchmarks = []
+
+
+def benchmark(fn):
+    benchmarks.append(fn)
+    return fn
+
+
+def measure(fn, repeat, min_time=0.05):
+    """Returns the best time of a single fn() call in seconds.
+
+    fn() is called in batches which take at least min_time, the best batch
+    of ``repeat`` batches is used.
+    """
+    number = 1
+
+    while True:
+        start = default_timer()
+        for _ in range(number):
+            fn()
+        elapsed = default_timer() - start
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 2
+
+    best = elapsed
+
+    for _ in range(repeat - 1):
+        start = default_timer()
+        for _ in range(number):
+            fn()
+        best = min(best, default_timer() - start)
+
+    return best / number
+
+
+def random_points(n, width, height, seed=0):
+    rnd = Random(seed)
+    return [(rnd.randrange(width), rnd.randrange(height)) for _ in range(n)]
+
+
+@benchmark
+def pixel_ops():
+    points = random_points(1000, 200, 200)
+    c = Canvas()
+
+    def set_():
+        for x, y in points:
+            c.set(x, y)
+
+    def get():
+        for x, y in points:
+            c.get(x, y)
+
+    def toggle():
+        for x, y in points:
+            c.toggle(x, y)
+
+    def unset():
+        for x, y in points:
+            c.unset(x, y)
+        for x, y in points:
+            c.set(x, y)
+
+    yield 'set', '1000 pixels', set_
+    yield 'get', '1000 pixels', get
+    yield 'toggle', '1000 pixels', toggle
+    yield 'unset', '1000 pixels', unset
+
+    if hasattr(c, 'set_many'):
+        yield 'set_many', '1000 pixels', lambda: c.set_many(points)
+
+
+@benchmark
+def lines():
+    rnd = Random(0)
+    coords = [tuple(rnd.randrange(200) for _ in range(4)) for _ in range(100)]
+
+    def line_generator():
+        c = Canvas()
+        for x1, y1, x2, y2 in coords:
+            for x, y in line(x1, y1, x2, y2):
+                c.set(x, y)
+
+    yield 'line', '100 lines', line_generator
+
+    if hasattr(Canvas, 'line'):
+        def canvas_line():
+            c = Canvas()
+            for x1, y1, x2, y2 in coords:
+                c.line(x1, y1, x2, y2)
+
+        yield 'Canvas.line', '100 lines', canvas_line
+
+
+@benchmark
+def polygons():
+    def draw():
+        c = Canvas()
+        for sides in range(3, 23):
+            for x, y in polygon(50, 50, sides, 40):
+                c.set(x, y)
+
+    yield 'polygon', '20 polygons', draw
+
+    if hasattr(Canvas, 'fill_polygon'):
+        def fill():
+            c = Canvas()
+            c.fill_polygon([(0, 0), (150, 20), (100, 120), (10, 80)])
+
+        yield 'fill_polygon', '150x120', fill
+
+
+@benchmark
+def turtle():
+    def draw():
+        t = Turtle()
+        for _ in range(36):
+            t.right(10)
+            for _ in range(36):
+                t.right(10)
+                t.forward(8)
+
+    yield 'turtle', '1296 moves', draw
+
+
+@benchmark
+def frames():
+    for width, height in ((20, 20), (80, 40), (160, 96), (400, 200)):
+        for density in (0.05, 0.5):
+            c = Canvas()
+            for x, y in random_points(int(width * height * density), width, height):
+                c.set(x, y)
+            c.set(width - 1, height - 1)
+
+            yield 'frame', '{0}x{1} {2:.0%}'.format(width, height, density), c.frame
+
+            def changed(c=c):
+                c.toggle(0, 0)
+                c.frame()
+
+            yield 'frame changed', '{0}x{1} {2:.0%}'.format(width, height, density), changed
+
+
+@benchmark
+def image_ingest():
+    width, height = 320, 240
+    rnd = Random(0)
+    pixels = bytearray(rnd.randrange(256) for _ in range(width * height))
+    rows = [list(pixels[y * width:(y + 1) * width]) for y in range(height)]
+
+    def per_pixel():
+        c = Canvas()
+        for y, row in enumerate(rows):
+            for x, value in enumerate(row):
+                if value > 128:
+                    c.set(x, y)
+
+    yield 'image ingest set', '{0}x{1}'.format(width, height), per_pixel
+
+    if hasattr(Canvas, 'from_bitmap'):
+        data = bytes(pixels)
+        yield 'image ingest from_bitmap', '{0}x{1}'.format(width, height), \
+            lambda: Canvas.from_bitmap(data, width, height, threshold=128)
+
+
+class DummyScreen(object):
+    """curses window replacement which discards the output"""
+
+    def addstr(self, *args):
+        pass
+
+    def erase(self):
+        pass
+
+    def clear(self):
+        pass
+
+    def refresh(self):
+        pass
+
+
+@benchmark
+def animation():
+    frame_count = 100
+
+    def sine(phase):
+        return [(x / 2, 40 + sin(radians(x + phase)) * 40) for x in range(0, 720, 2)]
+
+    frame_data = [sine(i * 10) for i in range(frame_count)]
+
+    def run():
+        wrapper = drawille.curses.wrapper
+        drawille.curses.wrapper = lambda fn: fn(DummyScreen())
+        try:
+            drawille.animate(Canvas(), lambda: iter(frame_data), 0)
+        finally:
+            drawille.curses.wrapper = wrapper
+
+    yield 'animate', '{0} frames'.format(frame_count), run
+
+
+def run(repeat, pattern=None):
+    results = []
+
+    for suite in benchmarks:
+        for name, params, fn in suite():
+            if pattern and pattern not in name:
+                continue
+            seconds = measure(fn, repeat)
+            results.append({'name': name, 'params': params, 'seconds': seconds})
+            print('{0:<28}{1:<18}{2:>12.3f} ms'.format(name, params, seconds * 1000),
+                  file=sys.stderr)
+
+    return {'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'results': results}
+
+
+def compare(results, baseline, tolerance):
+    """Returns the (name, params, old, new) results which got slower than
+    the tolerance."""
+    old = dict(((r['name'], r['params']), r['seconds']) for r in baseline['results'])
+    regressions = []
+
+    for r in results['results']:
+        key = (r['name'], r['params'])
+        if key not in old:
+            continue
+        ratio = r['seconds'] / old[key]
+        r['baseline'] = old[key]
+        r['ratio'] = ratio
+        if ratio > 1 + tolerance:
+            regressions.append((r['name'], r['params'], old[key], r['seconds']))
+
+    return regressions
+
+
+def main():
+    parser = ArgumentParser(description='drawille benchmarks')
+    parser.add_argument('-o', '--output', help='write the JSON results to a file')
+    parser.add_argument('-b', '--baseline', help='JSON results to compare with')
+    parser.add_argument('-t', '--tolerance', type=float, default=0.1,
+                        help='allowed slowdown ratio (default: 0.1)')
+    parser.add_argument('-r', '--repeat', type=int, default=5,
+                        help='number of timed batches (default: 5)')
+    parser.add_argument('-k', '--filter', help='only run benchmarks containing this string')
+    args = parser.parse_args()
+
+    results = run(args.repeat, args.filter)
+    regressions = []
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        results['regressions'] = [dict(zip(('name', 'params', 'baseline', 'seconds'), r))
+                                  for r in regressions]
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    for name, params, old, new in regressions:
+        print('REGRESSION {0} {1}: {2:.3f} ms -> {3:.3f} ms ({4:+.0%})'.format(
+              name, params, old * 1000, new * 1000, new / old - 1), file=sys.stderr)
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
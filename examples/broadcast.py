@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Serve an animation to any number of clients:
+#   $ python broadcast.py 2020
+#   $ telnet localhost 2020
+
+from __future__ import print_function
+from drawille import BroadcastServer, Canvas, FrameScheduler
+import math
+import sys
+
+
+def __main__(port):
+    server = BroadcastServer('0.0.0.0', port)
+    scheduler = FrameScheduler(1./20)
+    c = Canvas()
+    i = 0
+    print('listening on port {0}'.format(server.address[1]))
+
+    try:
+        while True:
+            if scheduler.due():
+                c.set(0, 0)
+                c.set(180, 80)
+                c.set_many((x / 2, 40 + math.sin(math.radians(x + i)) * 40)
+                           for x in range(0, 360, 2))
+                server.broadcast(c.rows())
+                c.clear()
+                scheduler.done(0, 0)
+            i += 4
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    __main__(int(sys.argv[1]) if len(sys.argv) > 1 else 2020)
@@ -1,21 +1,14 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import curses
+import asyncio
 from drawille import Canvas, line
-from time import sleep
-from thread import start_new_thread
-from Queue import Queue
+from drawille_async import animate_async
 import locale
 from random import randint
 
 locale.setlocale(locale.LC_ALL,"")
 
-stdscr = curses.initscr()
-stdscr.refresh()
-
-keys = Queue()
-
 speed = 0.0
 fps = 20
 frame_no = 0
@@ -48,12 +41,6 @@ for y, row in enumerate(bird_map):
         if col:
             bird.append((x, y))
 
-def read_keys(stdscr):
-    while 1:
-        c = stdscr.getch()
-        keys.put(c)
-
-
 class Bar():
 
 
@@ -150,12 +137,10 @@ def check_collision(bird_pos, bar):
                 return True
     return False
 
-def main(stdscr):
+async def frames(c, keys):
     global frame_no, speed, position, score
-    c = Canvas()
     bar_width = 16
     bars = [Bar(bar_width)]
-    stdscr.refresh()
 
     while True:
         frame_no += 1
@@ -163,29 +148,24 @@ def main(stdscr):
             if check_collision(position, bar):
                 return
         while not keys.empty():
-            if keys.get() == 113:
+            if keys.get_nowait() == 113:
                 return
             speed = 32.0
 
-        c.set(0,0)
-        c.set(width, height)
+        frame = [(0, 0), (width, height)]
         if frame_no % 50 == 0:
             bars.append(Bar(bar_width))
         for x,y in bird:
-            c.set(x,y+position)
+            frame.append((x, y+position))
         for bar_index, bar in enumerate(bars):
             if bar.x < 1:
                 bars.pop(bar_index)
                 score += 1
             else:
                 bars[bar_index].x -= 1
-                for x,y in bar.draw():
-                    c.set(x,y)
-        f = c.frame()+'\n'
-        stdscr.addstr(0, 0, f)
-        stdscr.addstr(height/4+1, 0, 'score: {0}'.format(score))
-        stdscr.refresh()
-        c.clear()
+                frame.extend(bar.draw())
+        c.set_text(0, height+4, 'score: {0}'.format(score))
+        yield frame
 
         speed -= 2
 
@@ -199,11 +179,12 @@ def main(stdscr):
             speed = 0.0
 
 
-        sleep(1.0/fps)
+async def main():
+    c = Canvas()
+    keys = asyncio.Queue()
+    await animate_async(c, frames(c, keys), 1.0/fps, keys=keys)
 
 
 if __name__ == '__main__':
-    start_new_thread(read_keys, (stdscr,))
-    curses.wrapper(main)
+    asyncio.run(main())
     print('Final score: {0}'.format(score))
-
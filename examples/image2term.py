@@ -38,7 +38,7 @@ def getTerminalSize():
     return int(cr[1]), int(cr[0])
 
 
-def image2term(image, threshold=128, ratio=None, invert=False):
+def image2term(image, threshold=128, ratio=None, invert=False, dither=None):
     if image.startswith('http://') or image.startswith('https://'):
         i = Image.open(StringIO(urllib2.urlopen(image).read())).convert('L')
     else:
@@ -56,25 +56,13 @@ def image2term(image, threshold=128, ratio=None, invert=False):
             w = tw
             h = int(h * ratio)
             i = i.resize((w, h), Image.ANTIALIAS)
-    can = Canvas()
-    x = y = 0
-
     try:
-         i_converted = i.tobytes()
+        i_converted = i.tobytes()
     except AttributeError:
-         i_converted = i.tostring()
+        i_converted = i.tostring()
 
-    for pix in i_converted:
-        if invert:
-            if ord(pix) > threshold:
-                can.set(x, y)
-        else:
-            if ord(pix) < threshold:
-                can.set(x, y)
-        x += 1
-        if x >= w:
-            y += 1
-            x = 0
+    can = Canvas.from_bitmap(i_converted, w, h, threshold=threshold, invert=not invert,
+                             dither=dither)
     return can.frame(0, 0)
 
 
@@ -96,10 +84,10 @@ def argparser():
                      ,metavar   = 'N'
                      )
     argp.add_argument('-t', '--threshold'
-                     ,help      = 'Color threshold'
+                     ,help      = 'Color threshold, otsu or adaptive'
                      ,default   = 128
                      ,action    = 'store'
-                     ,type      = int
+                     ,type      = lambda t: t if t in ('otsu', 'adaptive') else int(t)
                      ,metavar   = 'N'
                      )
     argp.add_argument('-i', '--invert'
@@ -107,6 +95,13 @@ def argparser():
                      ,default   = False
                      ,action    = 'store_true'
                      )
+    argp.add_argument('-d', '--dither'
+                     ,help      = 'Dither method: bayer, blue-noise or floyd-steinberg'
+                     ,default   = None
+                     ,nargs     = '?'
+                     ,const     = 'floyd-steinberg'
+                     ,choices   = ('bayer', 'blue-noise', 'floyd-steinberg')
+                     )
     argp.add_argument('image'
                      ,metavar   = 'FILE'
                      ,help      = 'Image file path/url'
@@ -116,7 +111,8 @@ def argparser():
 
 def __main__():
     args = argparser()
-    args['output'].write(image2term(args['image'], args['threshold'], args['ratio'], args['invert']))
+    args['output'].write(image2term(args['image'], args['threshold'], args['ratio'], args['invert'],
+                                    args['dither']))
     args['output'].write('\n')
 
 
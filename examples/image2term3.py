@@ -46,7 +46,7 @@ def getTerminalSize():
     return int(cr[1]), int(cr[0])
     
 
-def image2term(image, threshold=128, ratio=None, invert=False):
+def image2term(image, threshold=128, ratio=None, invert=False, dither=None):
     """
     Prints an image converted to drawille
     Args:
@@ -54,6 +54,7 @@ def image2term(image, threshold=128, ratio=None, invert=False):
         threshold: The color (0-255) threshold to convert a pixel to a drawille dot
         ratio: Ratio to scale the printed image (e.g. ratio=0.5 is 50%)
         invert: Inverts the threshold check
+        dither: Dither method, see drawille.dither_bitmap
     """
 
     if image.startswith('http://') or image.startswith('https://'):
@@ -85,25 +86,13 @@ def image2term(image, threshold=128, ratio=None, invert=False):
         image_width = int(image_width * ratio)
         image_height = int(image_height * ratio)
         i = i.resize((image_width, image_height), Image.ANTIALIAS)
-    can = Canvas()
-    x = y = 0
-
     try:
         i_converted = i.tobytes()
     except AttributeError:
         i_converted = i.tostring()
 
-    for pix in i_converted:
-        if invert:
-            if pix > threshold:
-                can.set(x, y)
-        else:
-            if pix < threshold:
-                can.set(x, y)
-        x += 1
-        if x >= image_width:
-            y += 1
-            x = 0
+    can = Canvas.from_bitmap(i_converted, image_width, image_height, threshold=threshold, invert=not invert,
+                             dither=dither)
     return can.frame(0, 0)
 
 
@@ -125,10 +114,10 @@ def argparser():
                      ,metavar   = 'N'
                      )
     argp.add_argument('-t', '--threshold'
-                     ,help      = 'Color threshold'
+                     ,help      = 'Color threshold, otsu or adaptive'
                      ,default   = 128
                      ,action    = 'store'
-                     ,type      = int
+                     ,type      = lambda t: t if t in ('otsu', 'adaptive') else int(t)
                      ,metavar   = 'N'
                      )
     argp.add_argument('-i', '--invert'
@@ -136,6 +125,13 @@ def argparser():
                      ,default   = False
                      ,action    = 'store_true'
                      )
+    argp.add_argument('-d', '--dither'
+                     ,help      = 'Dither method: bayer, blue-noise or floyd-steinberg'
+                     ,default   = None
+                     ,nargs     = '?'
+                     ,const     = 'floyd-steinberg'
+                     ,choices   = ('bayer', 'blue-noise', 'floyd-steinberg')
+                     )
     argp.add_argument('image'
                      ,metavar   = 'FILE'
                      ,help      = 'Image file path/url'
@@ -145,7 +141,8 @@ def argparser():
 
 def __main__():
     args = argparser()
-    args['output'].write(image2term(args['image'], args['threshold'], args['ratio'], args['invert']))
+    args['output'].write(image2term(args['image'], args['threshold'], args['ratio'], args['invert'],
+                                    args['dither']))
     args['output'].write('\n')
 
 
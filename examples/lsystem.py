@@ -0,0 +1,24 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function
+from drawille import Turtle, lsystem
+from sys import argv
+import time
+
+systems = {
+    'koch': ('F', {'F': 'F+F-F-F+F'}, 90),
+    'dragon': ('FX', {'X': 'X+YF+', 'Y': '-FX-Y'}, 90),
+    'plant': ('X', {'X': 'F+[[X]-X]-F[-FX]+X', 'F': 'FF'}, 25),
+}
+
+name = argv[1] if len(argv) > 1 else 'koch'
+iterations = int(argv[2]) if len(argv) > 2 else 4
+axiom, rules, angle = systems[name]
+
+t = Turtle(record=True)
+start = time.time()
+t.run(lsystem(axiom, rules, iterations), step=2, angle=angle)
+frame = t.frame()
+print(frame)
+print('{0} iterations of {1}: {2:.3f}s'.format(iterations, name, time.time() - start))
@@ -2,30 +2,36 @@
 # -*- coding: utf-8 -*-
 
 from __future__ import print_function
-from drawille import Canvas, line, animate
+from drawille import ScrollingCanvas, DiffRenderer, FrameScheduler
+import curses
 import math
 
-def __main__():
+def __main__(stdscr):
     i = 0
     height = 40
+    canvas = ScrollingCanvas(180, height * 2 + 1)
+    renderer = DiffRenderer(stdscr)
+    scheduler = FrameScheduler(1./60)
+    last = height
 
     while True:
-        frame = []
+        y = math.sin(math.radians(i)) * height + height
 
-        frame.extend([coords for coords in
-                      line(0,
-                           height,
-                           180,
-                           math.sin(math.radians(i)) * height + height)])
-
-        frame.extend([(x/2, height + math.sin(math.radians(x+i)) * height)
-                      for x in range(0, 360, 2)])
+        # one new sample per frame, the older ones scroll left
+        canvas.push(spans=[(last, y)])
+        last = y
+        i += 2
 
-        yield frame
+        if not scheduler.due():
+            continue
 
-        i += 2
+        start = scheduler.clock()
+        rows = canvas.rows()
+        rendered = scheduler.clock()
+        renderer.render(rows)
+        scheduler.done(rendered - start, scheduler.clock() - rendered)
 
 
 
 if __name__ == '__main__':
-    animate(Canvas(), __main__, 1./60)
+    curses.wrapper(__main__)
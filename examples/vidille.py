@@ -26,7 +26,7 @@ import sys
 import curses
 
 import av
-from drawille import Canvas
+from drawille import Canvas, TemporalThreshold, otsu_threshold, pipeline
 try:
     from PIL import Image
 except:
@@ -35,13 +35,14 @@ except:
     exit(1)
 
 
-def image2term(i:Image, canvas_width=160, canvas_height=100, threshold=128, dither=False, invert=False):
+def image2term(i:Image, canvas_width=160, canvas_height=100, threshold=128, dither=None, invert=False):
     """
     Prints an image converted to drawille
     Args:
         i: a Pillow image, either "L" (grayscale) or "1" (1-bit) format
         threshold: The luminance (0-255) threshold to convert a pixel to a drawille dot
         ratio: Ratio to scale the printed image (e.g. ratio=0.5 is 50%)
+        dither: dither method: 'bayer', 'blue-noise' or 'floyd-steinberg'
         invert: Inverts the threshold check
     """
  
@@ -62,54 +63,41 @@ def image2term(i:Image, canvas_width=160, canvas_height=100, threshold=128, dith
     image_height = int(image_height * ratio)
     i = i.resize((image_width, image_height), Image.ANTIALIAS)
 
-    if dither:
-        i = i.convert( "1", dither=Image.FLOYDSTEINBERG )
-    
-    can = Canvas()
-    x = y = 0
-
-    # getdata will be more consistent across different formats of image than i.tobytes()
-    i_converted = i.getdata()
-
-    for pix in i_converted:
-        if invert:
-            if pix < threshold:
-                can.set(x, y)
-        else:
-            if pix > threshold:
-                can.set(x, y)
-        x += 1
-        if x >= image_width:
-            y += 1
-            x = 0
+    can = Canvas.from_bitmap(i.tobytes(), image_width, image_height, threshold=threshold, invert=invert, dither=dither)
     return can.frame(0, 0)
 
 
-def play( video_path, terminal_width=80, terminal_height=25, dither=False, threshold=128, invert=False ):
+def play( video_path, terminal_width=80, terminal_height=25, dither=None, threshold=128, invert=False, jobs=None ):
     """
     A generator which yields drawille-rendered frames from a video file.
+
+    Frames are decoded here and converted to drawille in a pool of worker processes.
     
     Args:
         video_path: path to a video file.
         terminal_with: width of the terminal, in columns.
         terminal_height: height of the terminal, in rows.
-        dither: if True, will dither the frames using Pillow's built-in Floyd-Steinberg dither.
+        dither: dither method: 'bayer', 'blue-noise' or 'floyd-steinberg'.
+        threshold: luminance threshold, 'otsu' (smoothed over frames) or 'adaptive'.
+        jobs: number of worker processes, defaults to the number of CPUs.
     """
     container = av.open( video_path )
 
     canvas_width = terminal_width *2
     canvas_height = terminal_height *4
 
-    for frame in container.decode(video=0):
-        i = frame.to_image()
-        f = image2term(
-            i.convert("L"),
-            canvas_width = canvas_width,
-            canvas_height = canvas_height,
-            dither = dither,
-            invert = invert,
-            threshold = threshold
-        )
+    smoothed = TemporalThreshold()
+
+    def frames():
+        for frame in container.decode(video=0):
+            i = frame.to_image().convert("L")
+            t = threshold
+            if threshold == 'otsu':
+                # smoothed here, the workers convert the frames independently
+                t = smoothed.update( otsu_threshold( i.histogram() ) )
+            yield ( i, canvas_width, canvas_height, t, dither, invert )
+
+    for f in pipeline( frames(), image2term, processes=jobs ):
         yield f
 
 
@@ -118,10 +106,10 @@ def parse_args():
     from sys import stdout
     argp = argparse.ArgumentParser(description='terminal video player example script for drawille')
     argp.add_argument('-t', '--threshold'
-                     ,help      = 'Color threshold'
+                     ,help      = 'Color threshold, otsu or adaptive'
                      ,default   = 128
                      ,action    = 'store'
-                     ,type      = int
+                     ,type      = lambda t: t if t in ('otsu', 'adaptive') else int(t)
                      ,metavar   = 'N'
                      )
     argp.add_argument('-i', '--invert'
@@ -130,9 +118,18 @@ def parse_args():
                      ,action    = 'store_true'
                      )
     argp.add_argument('-d', '--dither'
-                     ,help      = 'Dither display'
-                     ,default   = False
-                     ,action    = 'store_true'
+                     ,help      = 'Dither method: bayer, blue-noise or floyd-steinberg'
+                     ,default   = None
+                     ,nargs     = '?'
+                     ,const     = 'floyd-steinberg'
+                     ,choices   = ('bayer', 'blue-noise', 'floyd-steinberg')
+                     )
+    argp.add_argument('-j', '--jobs'
+                     ,help      = 'Number of worker processes'
+                     ,default   = None
+                     ,action    = 'store'
+                     ,type      = int
+                     ,metavar   = 'N'
                      )
     argp.add_argument('file'
                      ,metavar   = 'FILE'
@@ -155,7 +152,8 @@ def curses_main( stdscr, args ):
             terminal_height = terminal_height,
             dither = args[ 'dither' ],
             threshold = args[ 'threshold' ],
-            invert = args[ 'invert' ]
+            invert = args[ 'invert' ],
+            jobs = args[ 'jobs' ]
         ):
         stdscr.clear()
         stdscr.addstr( screen )
@@ -1,4 +1,11 @@
 from setuptools import setup, find_packages
+import sys
+
+py_modules = ['drawille', 'drawille3d']
+
+# drawille_async uses async def and asyncio.get_running_loop
+if sys.version_info >= (3, 7):
+    py_modules.append('drawille_async')
 
 setup(
     name = 'drawille',
@@ -10,7 +17,7 @@ setup(
     keywords = "terminal braille drawing canvas console",
     url = 'https://github.com/asciimoo/drawille',
     scripts = [],
-    py_modules = ['drawille'],
+    py_modules = py_modules,
     packages = find_packages(),
     install_requires = [],
     download_url = 'https://github.com/asciimoo/drawille/tarball/master',
@@ -30,5 +37,6 @@ setup(
         'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3',
         'Programming Language :: Python :: 3.3',
+        'Programming Language :: Python :: 3.7',
     ],
 )
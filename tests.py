@@ -1,8 +1,28 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from drawille import Canvas, line, Turtle
-from unittest import TestCase, main
+from drawille import BroadcastServer, Canvas, Compositor, DenseCanvas, DiffRenderer, \
+    DoubleBufferedCanvas, FrameScheduler, ScrollingCanvas, TemporalThreshold, TiledCanvas, Turtle, \
+    adaptive_threshold, arc, array_error_diffusion, bayer_matrix, bitmap_cells, bitmap_frame, \
+    blue_noise_matrix, circle, diff_rows, dither_bitmap, ellipse, ellipse_spans, error_diffusion, \
+    histogram, line, lsystem, numpy, otsu_threshold, pipeline, polygon, polygon_spans, \
+    polygon_vertices, polyline, sgr_color, shift_cells
+from drawille3d import Mesh, compose, edges, project, rotation_x, rotation_y, scaling, transform, \
+    translation, visible_faces
+import drawille
+import drawille3d
+import math
+from io import BytesIO, StringIO
+from random import Random
+import socket
+import time
+from unittest import TestCase, main, skipIf, skipUnless
+
+try:
+    import asyncio
+    from drawille_async import animate_async
+except (ImportError, SyntaxError):
+    animate_async = None
 
 
 class CanvasTestCase(TestCase):
@@ -57,6 +77,20 @@ class CanvasTestCase(TestCase):
         self.assertEqual(c.frame(), '⠁')
 
 
+    def test_row_cache(self):
+        c = Canvas(line_ending='\n')
+        c.set(0, 0)
+        c.set(0, 4)
+        self.assertEqual(c.frame(), '⠁\n⠁')
+        self.assertEqual(sorted(c._row_cache), [0, 1])
+        cached = c._row_cache[0]
+        c.set(1, 4)
+        self.assertEqual(c.frame(), '⠁\n⠉')
+        self.assertTrue(c._row_cache[0] is cached)
+        c.set(-2, 4)
+        self.assertEqual(c.frame(), ' ⠁\n⠁⠉')
+
+
     def test_max_min_limits(self):
         c = Canvas()
         c.set(0, 0)
@@ -74,6 +108,932 @@ class CanvasTestCase(TestCase):
         self.assertEqual(c.get(1, 1), False)
 
 
+    def test_write_to(self):
+        for factory in (Canvas, lambda: DenseCanvas(60, 40)):
+            c = factory()
+            c.line(3, 1, 50, 38)
+            c.circle(30, 20, 12)
+            c.set_text(4, 8, 'text')
+            for area in ((), (0, 0), (-4, -8, 70, 50), (10, 10, 30, 20)):
+                out = BytesIO()
+                written = c.write_to(out, *area, buffer_size=16)
+                expected = c.frame(*area)
+                if not isinstance(expected, bytes):
+                    expected = expected.encode('utf-8')
+                self.assertEqual(out.getvalue(), expected)
+                self.assertEqual(written, len(expected))
+                self.assertEqual(list(c.iter_rows(*area)), c.rows(*area))
+        self.assertEqual(Canvas().write_to(BytesIO()), 0)
+
+
+class BBoxTestCase(TestCase):
+
+
+    def test_bbox(self):
+        c = Canvas()
+        self.assertEqual(c.bbox(), None)
+        c.set(3, 5)
+        self.assertEqual(c.bbox(), (2, 4, 4, 8))
+        c.set(-1, 0)
+        self.assertEqual(c.bbox(), (-2, 0, 4, 8))
+        c.unset(-1, 0)
+        self.assertEqual(c.bbox(), (2, 4, 4, 8))
+        c.set_text(0, 0, "ab")
+        self.assertEqual(c.bbox(), (0, 0, 4, 8))
+        c.unset(3, 5)
+        c.unset(0, 0)
+        c.unset(2, 0)
+        self.assertEqual(c.bbox(), None)
+
+
+    def test_incremental(self):
+        rnd = Random(4)
+        for factory in (Canvas, lambda: DenseCanvas(80, 80)):
+            c = factory()
+            for _ in range(300):
+                x, y = rnd.randint(0, 79), rnd.randint(0, 79)
+                op = rnd.choice(('set', 'unset', 'toggle', 'set_many',
+                                 'unset_many', 'toggle_many', 'line', 'circle'))
+                if op.endswith('_many'):
+                    getattr(c, op)([(x, y), (y, x), (x + 1, y)])
+                elif op == 'line':
+                    c.line(x, y, y, x)
+                elif op == 'circle':
+                    c.circle(x, y, rnd.randint(0, 10), fill=rnd.random() < 0.5)
+                else:
+                    getattr(c, op)(x, y)
+                self.assertEqual(c._bounds(), c._scan_bounds() and tuple(c._scan_bounds()))
+
+
+class BulkTestCase(TestCase):
+
+
+    def _points(self):
+        rnd = Random(1)
+        return [(rnd.randint(-20, 99), rnd.uniform(-20, 99)) for _ in range(500)]
+
+
+    def test_set_many(self):
+        for factory in (Canvas, lambda: DenseCanvas(100, 100)):
+            a, b = factory(), factory()
+            points = self._points()
+            for x, y in points:
+                a.set(x, y)
+            b.set_many(points)
+            self.assertEqual(a.frame(), b.frame())
+
+
+    def test_parallel_sequences(self):
+        a, b = Canvas(), Canvas()
+        a.set_many([(0, 0), (3, 5)])
+        b.set_many([0, 3], [0, 5])
+        self.assertEqual(a.chars, b.chars)
+
+
+    def test_unset_toggle_many(self):
+        for factory in (Canvas, lambda: DenseCanvas(100, 100)):
+            a, b = factory(), factory()
+            points = self._points()
+            a.set_many(points[:300])
+            b.set_many(points[:300])
+            for x, y in points[200:]:
+                a.toggle(x, y)
+            b.toggle_many(points[200:])
+            self.assertEqual(a.frame(), b.frame())
+            for x, y in points[::2]:
+                a.unset(x, y)
+            b.unset_many(points[::2])
+            self.assertEqual(a.frame(), b.frame())
+
+
+    def test_unset_many_duplicates(self):
+        factories = (Canvas, lambda: DenseCanvas(40, 40), lambda: DoubleBufferedCanvas(40, 40),
+                     TiledCanvas, lambda: ScrollingCanvas(40, 40))
+        for factory in factories:
+            c = factory()
+            c.set_many([(0, 0), (1, 0), (5, 9)])
+            c.unset_many([(0, 0), (0, 0), (5, 9), (5, 9), (5, 9)])
+            self.assertEqual((c.get(0, 0), c.get(1, 0), c.get(5, 9)), (False, True, False))
+            c.toggle_many([(1, 0), (1, 0), (3, 3)])
+            self.assertEqual((c.get(1, 0), c.get(3, 3)), (True, True))
+
+
+    def test_set_many_cached_rows(self):
+        a, b = DenseCanvas(40, 40), DenseCanvas(40, 40)
+        for c in (a, b):
+            c.set_many([(0, 0), (30, 30)])
+        a.frame()
+        for c in (a, b):
+            c.set_many([(10, 13), (11, 13)])
+            c.set_text(20, 36, 'x')
+            c.set_many([(20, 36), (38, 38)])
+        self.assertEqual(a.frame(), b.frame())
+        self.assertEqual(a._bounds(), tuple(a._scan_bounds()))
+        self.assertEqual(a._bounds(), (0, 9, 0, 19))
+
+
+    def test_many_text_cells(self):
+        frames = []
+        for c in (Canvas(), DenseCanvas(40, 40), TiledCanvas(), ScrollingCanvas(40, 40)):
+            c.set_text(0, 0, 'abcd')
+            c.set_many([(20, 20), (21, 22)])
+            # a text cell hit by any point loses the text and gets no dots
+            c.toggle_many([(0, 0), (0, 0), (1, 1), (2, 0), (21, 22)])
+            c.unset_many([(7, 3)])
+            frames.append(c.frame(0, 0, 40, 40))
+        self.assertEqual(frames[0].splitlines()[0].rstrip(), u'  c')
+        self.assertEqual(frames, [frames[0]] * 4)
+
+
+class BitmapTestCase(TestCase):
+
+
+    def _bitmap(self, width=13, height=9):
+        rnd = Random(2)
+        return [[rnd.randint(0, 255) for _ in range(width)] for _ in range(height)]
+
+
+    def _expected(self, bitmap, x=0, y=0, test=lambda v: v > 128):
+        c = Canvas()
+        for py, row in enumerate(bitmap):
+            for px, value in enumerate(row):
+                if test(value):
+                    c.set(x + px, y + py)
+        return c
+
+
+    def test_from_bitmap(self):
+        bitmap = self._bitmap()
+        c = Canvas.from_bitmap(bitmap, threshold=128)
+        self.assertEqual(c.frame(), self._expected(bitmap).frame())
+
+
+    def test_raw_bytes_invert(self):
+        bitmap = self._bitmap()
+        raw = bytes(bytearray(v for row in bitmap for v in row))
+        c = Canvas.from_bitmap(raw, 13, 9, threshold=128, invert=True)
+        expected = self._expected(bitmap, test=lambda v: v < 128)
+        self.assertEqual(c.frame(), expected.frame())
+
+
+    def test_blit_offset(self):
+        bitmap = self._bitmap()
+        for x, y in ((1, 3), (-3, -2), (4, 5)):
+            c = Canvas()
+            c.blit_bitmap(bitmap, x=x, y=y, threshold=128)
+            expected = self._expected(bitmap, x, y)
+            self.assertEqual(c.frame(), expected.frame())
+
+
+    def test_dense(self):
+        bitmap = [[1, 0, 1], [0, 1, 0]]
+        c = DenseCanvas.from_bitmap(bitmap)
+        self.assertEqual((c.width, c.height), (3, 2))
+        self.assertEqual(c.frame(), self._expected(bitmap, test=bool).frame())
+        c = DenseCanvas(6, 8)
+        c.blit_bitmap(bitmap, x=3, y=5)
+        self.assertEqual(c.frame(), self._expected(bitmap, 3, 5, bool).frame())
+
+
+    def test_pipeline(self):
+        rnd = Random(2)
+        frames = [(bytes(bytearray(rnd.randrange(256) for _ in range(30 * 20))), 30, 20, 128)
+                  for _ in range(6)]
+        expected = [bitmap_frame(*args) for args in frames]
+        self.assertEqual(list(pipeline(iter(frames), processes=2, max_pending=3)), expected)
+
+
+class DitherTestCase(TestCase):
+
+
+    def test_matrices(self):
+        self.assertEqual(bayer_matrix(4), [[0, 8, 2, 10], [12, 4, 14, 6], [3, 11, 1, 9], [15, 7, 13, 5]])
+        self.assertEqual(sorted(sum(blue_noise_matrix(), [])), list(range(256)))
+
+
+    def test_density(self):
+        for method in ('bayer', 'blue-noise', 'floyd-steinberg'):
+            for gray in (0, 64, 128, 192, 255):
+                rows = dither_bitmap(bytes(bytearray([gray] * 32 * 32)), 32, 32, method)
+                dots = sum(sum(bytearray(row)) for row in rows)
+                self.assertAlmostEqual(dots / 1024.0, gray / 255.0, delta=0.02)
+            rows = dither_bitmap([[0, 255] * 8] * 4, method=method, invert=True)
+            self.assertEqual([list(row) for row in rows], [[1, 0] * 8] * 4)
+        self.assertRaises(ValueError, dither_bitmap, [[1]], method='none')
+
+
+    def test_canvas(self):
+        bitmap = [[x * 8 for x in range(32)] for y in range(16)]
+        for method in ('bayer', 'blue-noise', 'floyd-steinberg'):
+            dithered = dither_bitmap(bitmap, method=method)
+            c = Canvas.from_bitmap(bitmap, dither=method)
+            self.assertEqual(c.frame(), Canvas.from_bitmap(dithered).frame())
+            self.assertEqual(c.frame(), DenseCanvas.from_bitmap(bitmap, dither=method).frame())
+
+
+    @skipUnless(numpy, 'requires numpy')
+    def test_array_error_diffusion(self):
+        rnd = Random(4)
+        bitmap = [[rnd.randrange(256) for _ in range(300)] for _ in range(220)]
+        expected = [list(row) for row in error_diffusion(bitmap, 100)]
+        self.assertEqual(array_error_diffusion(numpy.array(bitmap), 100).tolist(), expected)
+        # large arrays take the anti-diagonal path
+        dithered = dither_bitmap(numpy.array(bitmap, dtype=numpy.uint8), method='floyd-steinberg')
+        self.assertEqual(dithered.tolist(), [list(row) for row in
+                                             dither_bitmap(bitmap, method='floyd-steinberg')])
+        self.assertEqual(array_error_diffusion(numpy.zeros((0, 5))).shape, (0, 5))
+
+
+class ThresholdTestCase(TestCase):
+
+
+    def test_otsu(self):
+        bitmap = bytes(bytearray([40, 50, 60] * 10 + [200, 210] * 20))
+        counts = histogram(bitmap, 10, 7)
+        self.assertEqual((counts[40], counts[210], sum(counts)), (10, 20, 70))
+        threshold = otsu_threshold(counts)
+        self.assertTrue(60 <= threshold < 200)
+        c = Canvas.from_bitmap(bitmap, 10, 7, threshold='otsu')
+        self.assertEqual(c.frame(), Canvas.from_bitmap(bitmap, 10, 7, threshold=threshold).frame())
+        self.assertEqual(otsu_threshold([0] * 255 + [5]), 0)
+
+
+    def test_adaptive(self):
+        # a dark gradient with brighter spots: a global threshold can't split them
+        bitmap = [[x * 4 + (40 if x % 5 == 2 and y % 5 == 2 else 0) for x in range(40)] for y in range(20)]
+        on = adaptive_threshold(bitmap, size=5)
+        for y in range(20):
+            self.assertEqual([x for x in range(40) if on[y][x]],
+                             [x for x in range(40) if x % 5 == 2 and y % 5 == 2])
+        dark = adaptive_threshold([[v ^ 0xFF for v in row] for row in bitmap], size=5, invert=True)
+        self.assertEqual([list(row) for row in dark], [list(row) for row in on])
+        c = Canvas.from_bitmap(bitmap, threshold='adaptive')
+        self.assertEqual(c.frame(), Canvas.from_bitmap(adaptive_threshold(bitmap)).frame())
+        # the adaptive threshold is already binary, dithering is skipped
+        for dither in ('bayer', 'floyd-steinberg'):
+            d = Canvas.from_bitmap(bitmap, threshold='adaptive', dither=dither)
+            self.assertEqual(d.frame(), c.frame())
+
+
+    def test_temporal(self):
+        smoothed = TemporalThreshold(0.5, cut=50)
+        self.assertEqual([smoothed.update(t) for t in (100, 110, 110, 200)], [100, 105, 107.5, 200])
+
+
+@skipUnless(numpy, 'requires numpy')
+class NumpyTestCase(TestCase):
+    """The NumPy paths give the same results as the pure Python ones."""
+
+
+    def _without_numpy(self, fn, *args, **kwargs):
+        saved = drawille.numpy, drawille3d.numpy
+        drawille.numpy = drawille3d.numpy = None
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            drawille.numpy, drawille3d.numpy = saved
+
+
+    def _bitmap(self, width=23, height=13):
+        rnd = Random(3)
+        return [[rnd.randint(0, 255) for _ in range(width)] for _ in range(height)]
+
+
+    def test_bitmap_cells(self):
+        bitmap = self._bitmap()
+        array = numpy.array(bitmap, dtype=numpy.uint8)
+        for threshold in (None, 100, 'otsu', 'adaptive'):
+            for dither in (None, 'bayer', 'blue-noise', 'floyd-steinberg'):
+                for invert, x, y in ((False, 0, 0), (True, 1, 3)):
+                    kwargs = dict(threshold=threshold, invert=invert, offset_x=x, offset_y=y,
+                                  dither=dither)
+                    expected = [bytes(row) for row in
+                                self._without_numpy(bitmap_cells, bitmap, **kwargs)]
+                    self.assertEqual([bytes(row) for row in bitmap_cells(array, **kwargs)], expected)
+                    self.assertEqual([bytes(row) for row in bitmap_cells(bitmap, **kwargs)], expected)
+
+
+    def test_ragged_bitmap(self):
+        # short rows are padded with blank cells on both paths
+        bitmap = [row[:len(row) - i % 5] for i, row in enumerate(self._bitmap())] + [[]]
+        for threshold in (None, 100, 'otsu', 'adaptive'):
+            for dither in (None, 'bayer', 'floyd-steinberg'):
+                for invert in (False, True):
+                    kwargs = dict(threshold=threshold, invert=invert, offset_x=1, dither=dither)
+                    self.assertEqual([bytes(row) for row in bitmap_cells(bitmap, **kwargs)],
+                                     [bytes(row) for row in
+                                      self._without_numpy(bitmap_cells, bitmap, **kwargs)])
+
+
+    def test_threshold_dither(self):
+        bitmap = self._bitmap()
+        array = numpy.array(bitmap, dtype=numpy.uint8)
+        self.assertEqual(histogram(array), histogram(bitmap))
+        self.assertEqual(adaptive_threshold(array, size=5).tolist(),
+                         [list(row) for row in adaptive_threshold(bitmap, size=5)])
+        for method in ('bayer', 'blue-noise', 'floyd-steinberg'):
+            self.assertEqual(dither_bitmap(array, method=method, invert=True).tolist(),
+                             [list(row) for row in dither_bitmap(bitmap, method=method, invert=True)])
+
+
+    def test_bulk_arrays(self):
+        rnd = Random(4)
+        points = [(rnd.uniform(-10, 50), rnd.randint(-10, 50)) for _ in range(400)]
+        array = numpy.array(points)
+        factories = (Canvas, lambda: DenseCanvas(40, 40), TiledCanvas,
+                     lambda: ScrollingCanvas(40, 40))
+        for factory in factories:
+            a, b = factory(), factory()
+            for c in (a, b):
+                c.set_text(4, 4, 'xyz')
+            a.set_many(points[:250])
+            b.set_many(array[:250])
+            a.toggle_many(points[150:])
+            b.toggle_many(array[150:, 0], array[150:, 1])
+            a.unset_many(points[::3])
+            b.unset_many(array[::3])
+            self.assertEqual(a.frame(0, 0, 40, 40), b.frame(0, 0, 40, 40))
+            self.assertEqual(a.bbox(), b.bbox())
+
+
+    def test_mesh(self):
+        vertices = [(-1, 1, -1), (1, 1, -1), (1, -1, -1), (-1, -1, -1),
+                    (-1, 1, 1), (1, 1, 1), (1, -1, 1), (-1, -1, 1)]
+        faces = [(0, 1, 2, 3), (1, 5, 6, 2), (5, 4, 7, 6), (4, 0, 3, 7), (0, 4, 5, 1), (3, 2, 6, 7)]
+        matrix = compose(scaling(10), rotation_x(21), rotation_y(33), translation(0, 0, 3))
+        frames = []
+        for draw in (lambda fn, *args, **kwargs: fn(*args, **kwargs), self._without_numpy):
+            mesh = draw(Mesh, vertices, faces)
+            points = draw(mesh.project, matrix, 60, 60, fov=40, distance=30)
+            self.assertEqual(len(points), 8)
+            c = Canvas()
+            draw(mesh.draw, c, matrix, 60, 60, fov=40, distance=30, cull=True)
+            frames.append((c.frame(), sorted(draw(visible_faces, points, faces))))
+        self.assertEqual(frames[0], frames[1])
+        self.assertTrue(frames[0][1])
+
+
+class DenseCanvasTestCase(TestCase):
+
+
+    def test_set(self):
+        c = DenseCanvas(4, 8)
+        c.set(0, 0)
+        self.assertEqual(c.buf[0], 1)
+
+
+    def test_out_of_bounds(self):
+        c = DenseCanvas(4, 8)
+        c.set(-1, 0)
+        c.set(4, 0)
+        c.set(0, 8)
+        self.assertEqual(c.buf, bytearray(4))
+        self.assertEqual(c.get(4, 0), False)
+
+
+    def test_unset_toggle(self):
+        c = DenseCanvas(4, 8)
+        c.toggle(0, 0)
+        self.assertEqual(c.get(0, 0), True)
+        c.toggle(0, 0)
+        self.assertEqual(c.get(0, 0), False)
+        c.set(1, 1)
+        c.unset(1, 1)
+        self.assertEqual(c.frame(), '')
+
+
+    def test_set_text(self):
+        c = DenseCanvas(8, 4)
+        c.set_text(0, 0, "asdf")
+        self.assertEqual(c.frame(), "asdf")
+        c.set(2, 0)
+        self.assertEqual(c.frame(), "asdf")
+        c.unset(2, 0)
+        self.assertEqual(c.frame(), "a df")
+        c.set(2, 0)
+        self.assertEqual(c.frame(-2, 0, 10, 4), " a⠁df ")
+
+
+    def test_same_output(self):
+        rnd = Random(0)
+        s = Canvas()
+        d = DenseCanvas(100, 100)
+
+        for _ in range(500):
+            x, y = rnd.randint(0, 99), rnd.randint(0, 99)
+            op = rnd.choice(('set', 'set', 'unset', 'toggle'))
+            getattr(s, op)(x, y)
+            getattr(d, op)(x, y)
+
+        self.assertEqual(s.frame(), d.frame())
+        self.assertEqual(s.frame(0, 0, 100, 100), d.frame(0, 0, 100, 100))
+
+
+class ScrollingCanvasTestCase(TestCase):
+
+
+    def test_push(self):
+        c = ScrollingCanvas(4, 4)
+        c.push(0)
+        self.assertEqual(c.frame(0, 0, 4, 4), u' \u2808')
+        c.push(spans=[(1, 3)])
+        self.assertEqual(c.frame(0, 0, 4, 4), u' \u28b1')
+        c.push([None, 3, 9])
+        self.assertEqual(c.frame(0, 0, 4, 4), u'\u2808\u28c6')
+        c.push()
+        c.push()
+        self.assertEqual(c.frame(0, 0, 4, 4), u'\u28c6 ')
+        c.push()
+        c.push()
+        self.assertEqual(c.frame(), u'')
+
+
+    def test_same_output(self):
+        rnd = Random(0)
+        s = ScrollingCanvas(30, 20)
+        d = DenseCanvas(30, 20)
+
+        for _ in range(7):
+            s.push(rnd.randint(0, 19))
+        s.clear()
+
+        for _ in range(300):
+            x, y = rnd.randint(-2, 31), rnd.randint(-2, 21)
+            op = rnd.choice(('set', 'set', 'unset', 'toggle'))
+            getattr(s, op)(x, y)
+            getattr(d, op)(x, y)
+
+        for c in (s, d):
+            c.line(0, 19, 29, 0)
+            c.translate(3, -1)
+
+        self.assertEqual(s.frame(), d.frame())
+        self.assertEqual(s.frame(-2, -4, 34, 24), d.frame(-2, -4, 34, 24))
+
+
+    def test_text(self):
+        c = ScrollingCanvas(4, 4)
+        c.set_text(0, 0, 'a')
+        c.push(0)
+        c.push(0)
+        self.assertEqual(c.frame(), u'a\u2809')
+        self.assertTrue(c.get(0, 0))
+        # the pixels below the text scroll on and show up without it
+        c.set(1, 1)
+        c.toggle(0, 0)
+        self.assertEqual(c.frame(), u'\u2810\u2809')
+        c.set_text(0, 0, 'ab')
+        c.unset(2, 0)
+        self.assertEqual(c.frame(), u'a\u2808')
+        for _ in range(4):
+            c.push()
+        self.assertEqual(c.frame(), u'a')
+
+
+class TiledCanvasTestCase(TestCase):
+
+
+    def test_tiles(self):
+        c = TiledCanvas()
+        c.set(-1, -1)
+        c.set(1000, 2000)
+        self.assertEqual(sorted((r, col) for r in c.tiles for col in c.tiles[r]),
+                         [(-1, -1), (7, 7)])
+        self.assertEqual(len(c.tiles[-1][-1]), 64 * 64)
+        c.unset(1000, 2000)
+        c.toggle(-1, -1)
+        self.assertEqual(c.tiles, {})
+        self.assertEqual(c.frame(), '')
+
+
+    def test_set_text(self):
+        c = TiledCanvas()
+        c.set_text(-8, 0, "asdf")
+        c.set(-4, 0)
+        self.assertEqual(c.frame(), "asdf")
+        c.unset(-4, 0)
+        self.assertEqual(c.frame(), "as f")
+
+
+    def test_same_output(self):
+        rnd = Random(0)
+        s = Canvas()
+        t = TiledCanvas()
+
+        for _ in range(500):
+            x, y = rnd.randint(-300, 300), rnd.randint(-300, 300)
+            op = rnd.choice(('set', 'set', 'unset', 'toggle'))
+            getattr(s, op)(x, y)
+            getattr(t, op)(x, y)
+
+        t.line(-200, -250, 290, 10)
+        s.line(-200, -250, 290, 10)
+        t.fill_polygon([(-100, -100), (150, -20), (0, 200)])
+        s.fill_polygon([(-100, -100), (150, -20), (0, 200)])
+        self.assertEqual(s.frame(), t.frame())
+        self.assertEqual(s.frame(-310, -310, 310, 310), t.frame(-310, -310, 310, 310))
+        s.set_clip(-130, -70, 130, 70)
+        t.set_clip(-130, -70, 130, 70)
+        self.assertEqual(s.frame(), t.frame())
+
+
+    def test_viewport(self):
+        c = TiledCanvas()
+        c.set(0, 0)
+        c.line(10 ** 6 - 6, 0, 10 ** 6, 0)
+        self.assertEqual(sum(len(row) for row in c.tiles.values()), 2)
+        self.assertEqual(c.frame(10 ** 6 - 4, 0, 10 ** 6 + 4, 4), u'\u2809\u2809\u2801 ')
+
+
+class CanvasOpsTestCase(TestCase):
+
+
+    def pixels(self, c):
+        return set((x, y) for x in range(-8, 24) for y in range(-8, 24) if c.get(x, y))
+
+
+    def test_boolean_ops(self):
+        factories = (Canvas, lambda: DenseCanvas(16, 16), TiledCanvas)
+        a_points = [(x, y) for x in range(16) for y in range(16) if (x + y) % 3 == 0]
+        b_points = [(x, y) for x in range(16) for y in range(16) if x % 2 == 0]
+
+        for factory in factories:
+            for other in factories:
+                b = other()
+                b.set_many(b_points)
+                for op, expected in (('union', set(a_points) | set(b_points)),
+                                     ('intersection', set(a_points) & set(b_points)),
+                                     ('difference', set(a_points) - set(b_points)),
+                                     ('symmetric_difference', set(a_points) ^ set(b_points))):
+                    a = factory()
+                    a.set_many(a_points)
+                    getattr(a, op)(b)
+                    self.assertEqual(self.pixels(a), expected)
+
+
+    def test_operators(self):
+        a, b = Canvas(), Canvas()
+        a.set(0, 0)
+        a.set_text(4, 0, 'x')
+        b.set(0, 0)
+        b.set(1, 0)
+        a ^= b
+        self.assertEqual(a.frame(), u'\u2808 x')
+        a -= b
+        self.assertEqual(a.frame(), u'x')
+
+
+    def test_shift_cells(self):
+        self.assertEqual(shift_cells([bytearray([0x01])], 0, 0), [bytearray([0x01])])
+        self.assertEqual(shift_cells([bytearray([0x01])], 1, 0), [bytearray([0x08, 0])])
+        self.assertEqual(shift_cells([bytearray([0x88])], 1, 3),
+                         [bytearray([0, 0x40]), bytearray([0, 0x04])])
+
+
+    def test_translate(self):
+        points = [(3, 5), (4, 5), (8, 9), (0, 0)]
+
+        for factory in (Canvas, lambda: DenseCanvas(16, 16), TiledCanvas):
+            for dx, dy in ((2, 4), (-4, 0), (1, 0), (-3, 5), (7, -2)):
+                c = factory()
+                c.set_many(points)
+                c.set_text(10, 12, 'a')
+                c.set_color(3, 5, fg=1)
+                c.translate(dx, dy)
+                expected = factory()
+                expected.set_many([(x + dx, y + dy) for x, y in points])
+                expected.set_text(10 + dx // 2 * 2, 12 + dy // 4 * 4, 'a')
+                self.assertEqual(c.frame(), expected.frame())
+                self.assertEqual(c.palette, [None, 1])
+
+
+class CompositorTestCase(TestCase):
+
+
+    def test_modes(self):
+        a, b, c = Canvas(), DenseCanvas(4, 4), TiledCanvas()
+        a.set(0, 0)
+        a.set(1, 0)
+        b.set(1, 0)
+        b.set(0, 1)
+        c.set(0, 1)
+        c.set(3, 0)
+        comp = Compositor(4, 4)
+        comp.add(a)
+        self.assertEqual(comp.frame(), u'\u2809')
+        comp.add(b, 'xor')
+        self.assertEqual(comp.frame(), u'\u2803')
+        comp.add(c, 'mask')
+        self.assertEqual(comp.frame(), u'\u2801')
+        comp.remove(c)
+        self.assertEqual(comp.frame(), u'\u2803')
+        self.assertRaises(ValueError, comp.add, c, 'and')
+
+
+    def test_text(self):
+        a, b = Canvas(), Canvas()
+        a.set_text(0, 0, 'abc')
+        b.set(0, 0)
+        b.set(6, 0)
+        b.set_text(2, 0, 'X')
+        comp = Compositor(8, 4)
+        comp.add(a)
+        comp.add(b)
+        self.assertEqual(comp.frame(), u'aXc\u2801')
+
+
+    def test_static(self):
+        grid, cursor = Canvas(), Canvas()
+        grid.line(0, 0, 7, 0)
+        comp = Compositor(8, 4)
+        comp.add(grid, static=True)
+        comp.add(cursor, 'xor')
+        cursor.set(0, 0)
+        self.assertEqual(comp.frame(), u'\u2808\u2809\u2809\u2809')
+        grid.clear()
+        cursor.set(2, 0)
+        self.assertEqual(comp.frame(), u'\u2808\u2808\u2809\u2809')
+        comp.invalidate(grid)
+        self.assertEqual(comp.frame(), u'\u2801\u2801')
+
+
+class ColorTestCase(TestCase):
+
+
+    def test_sgr_color(self):
+        self.assertEqual(sgr_color(1), '31')
+        self.assertEqual(sgr_color(9, background=True), '101')
+        self.assertEqual(sgr_color(208), '38;5;208')
+        self.assertEqual(sgr_color(208, 16), '33')
+        self.assertEqual(sgr_color((255, 135, 0)), '38;5;208')
+        self.assertEqual(sgr_color((128, 128, 128), background=True), '48;5;244')
+        self.assertEqual(sgr_color((1, 2, 3), 'truecolor'), '38;2;1;2;3')
+
+
+    def test_color_rows(self):
+        for factory in (Canvas, lambda: DenseCanvas(20, 8)):
+            c = factory()
+            c.fill_spans([(y, 0, 19) for y in range(8)])
+            plain = c.rows()
+            self.assertEqual(c.color_rows(), plain)
+            c.fill_color(4, 0, 12, 4, fg=1)
+            c.set_color(19, 7, fg='#ffffff', bg=4)
+            rows = c.color_rows()
+            full = u'\u28ff'
+            self.assertEqual(rows[0], full * 2 + u'\x1b[0;31m' + full * 4 + u'\x1b[0m' + full * 4)
+            self.assertEqual(rows[1], full * 9 + u'\x1b[0;38;5;231;44m' + full + u'\x1b[0m')
+            self.assertEqual(c.rows(), plain)
+            self.assertEqual(c.frame(color=256), c.line_ending.join(rows))
+            c.fill_color(0, 0, 20, 8)
+            self.assertEqual(c.color_rows(), plain)
+            c.clear()
+            self.assertEqual(c.palette, [None])
+
+
+class DoubleBufferedCanvasTestCase(TestCase):
+
+
+    def test_swap(self):
+        c = DoubleBufferedCanvas(20, 20)
+        c.line(0, 0, 19, 19)
+        c.set_text(0, 16, 'ab')
+        first = c.frame()
+        c.swap()
+        self.assertEqual(c.frame(), '')
+        self.assertEqual(c.bbox(), None)
+        c.line(0, 0, 19, 19)
+        c.set_text(0, 16, 'ab')
+        self.assertEqual(c.frame(), first)
+        c.swap()
+        c.line(0, 0, 19, 19)
+        c.set_text(0, 16, 'ab')
+        self.assertEqual(c.changed_rows(), [])
+        c.set(19, 0)
+        c.set_text(0, 12, 'x')
+        self.assertEqual(c.changed_rows(), [0, 3])
+        c.clear()
+        self.assertEqual(c.frame(), '')
+
+
+    def test_reuse_rows(self):
+        c = DoubleBufferedCanvas(40, 12)
+        c.line(0, 0, 39, 11)
+        prev = c.rows()
+        c.swap()
+        c.line(0, 0, 39, 11)
+        c.set(39, 0)
+        rows = c.rows()
+        self.assertFalse(rows[0] is prev[0])
+        self.assertTrue(rows[1] is prev[1] and rows[2] is prev[2])
+        self.assertEqual([y for y, _, _ in diff_rows(prev, rows)], [0])
+
+
+class DiffRendererTestCase(TestCase):
+
+
+    def test_diff_rows(self):
+        self.assertEqual(diff_rows(['ab'], ['ab']), [])
+        self.assertEqual(diff_rows(['abcdefghij'], ['Xbcdefghij']), [(0, 0, 'X')])
+        self.assertEqual(diff_rows(['abcdefghij'], ['XbcdefghiY']),
+                         [(0, 0, 'X'), (0, 9, 'Y')])
+        self.assertEqual(diff_rows(['abcdef'], ['XbcdeY']), [(0, 0, 'XbcdeY')])
+        self.assertEqual(diff_rows(['abc', 'd'], ['a']), [(0, 1, '  '), (1, 0, ' ')])
+
+
+    def test_render(self):
+        out = StringIO()
+        r = DiffRenderer(out, full_refresh=3)
+        r.render(['ab'])
+        self.assertEqual(out.getvalue(), '\x1b[H\x1b[2J\x1b[1;1Hab')
+        out.truncate(0)
+        out.seek(0)
+        r.render(['ac'])
+        self.assertEqual(out.getvalue(), '\x1b[1;2Hc')
+        out.truncate(0)
+        out.seek(0)
+        r.render(['ac'])
+        self.assertEqual(out.getvalue(), '')
+        r.render(['ac'])
+        self.assertEqual(out.getvalue(), '\x1b[H\x1b[2J\x1b[1;1Hac')
+
+
+    def test_curses(self):
+        class Window(object):
+            def __init__(self):
+                self.calls = []
+            def addstr(self, y, x, text):
+                self.calls.append((y, x, text))
+            def erase(self):
+                self.calls.append('erase')
+            def refresh(self):
+                pass
+
+        w = Window()
+        r = DiffRenderer(w)
+        r.render(['ab'])
+        r.render(['xb'])
+        self.assertEqual(w.calls, ['erase', (0, 0, 'ab'), (0, 0, 'x')])
+
+
+class BroadcastServerTestCase(TestCase):
+
+
+    def _read(self, sock):
+        data = b''
+        sock.settimeout(0.05)
+        try:
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                data += chunk
+        except socket.timeout:
+            pass
+        return data.decode('utf-8')
+
+
+    def _wait_clients(self, server, n):
+        for _ in range(100):
+            server.poll()
+            if len(server.clients) == n:
+                return
+            time.sleep(0.01)
+
+
+    def test_broadcast(self):
+        server = BroadcastServer()
+        try:
+            fast = socket.create_connection(server.address)
+            slow = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            slow.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+            slow.connect(server.address)
+            self._wait_clients(server, 2)
+            server.clients[1].sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+
+            c = Canvas()
+            c.set(0, 0)
+            server.broadcast(c.rows())
+            self.assertEqual(self._read(fast), u'\x1b[H\x1b[2J\x1b[1;1H\u2801')
+            c.set(2, 0)
+            server.broadcast(c.rows())
+            self.assertEqual(self._read(fast), u'\x1b[1;2H\u2801')
+
+            rnd = Random(0)
+            for _ in range(10):
+                c.set_many((rnd.randrange(400), rnd.randrange(400)) for _ in range(5000))
+                server.broadcast(c.rows())
+                self._read(fast)
+            fast_client, slow_client = server.clients
+            self.assertEqual(fast_client.skipped, 0)
+            self.assertTrue(slow_client.skipped > 0)
+            self.assertEqual(slow_client.frames + slow_client.skipped, 12)
+
+            fast.close()
+            self._wait_clients(server, 1)
+            self.assertEqual(server.clients, [slow_client])
+            slow.close()
+        finally:
+            server.close()
+
+
+class FrameSchedulerTestCase(TestCase):
+
+
+    def test_schedule(self):
+        now = [0.0]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(round(seconds, 6))
+            now[0] += seconds
+
+        scheduler = FrameScheduler(0.1, clock=lambda: now[0], sleep=sleep)
+        for render_time in (0.02, 0.05, 0.25, 0.01, 0.01):
+            if scheduler.due():
+                now[0] += render_time
+                scheduler.done(render_time, 0)
+        # the 0.25s frame makes the next one late by more than a period
+        self.assertEqual(sleeps, [0.08, 0.05, 0.14])
+        stats = scheduler.stats()
+        self.assertEqual(stats['frames'], 4)
+        self.assertEqual(stats['dropped'], 1)
+        # the schedule resyncs to the 0.5s slot after the dropped frame
+        self.assertAlmostEqual(stats['fps'], 4 / 0.6)
+        self.assertAlmostEqual(stats['render_ms'], 82.5)
+        self.assertEqual(len(scheduler.timings), 4)
+
+
+    def test_sustained_overload(self):
+        now = [0.0]
+
+        def sleep(seconds):
+            now[0] += seconds
+
+        scheduler = FrameScheduler(0.01, clock=lambda: now[0], sleep=sleep)
+        for _ in range(50):
+            # every frame takes 2.5 periods to produce
+            now[0] += 0.025
+            if scheduler.due():
+                scheduler.done(0, 0)
+        stats = scheduler.stats()
+        self.assertEqual(stats['frames'], 25)
+        self.assertEqual(stats['dropped'], 25)
+
+
+    def test_no_pacing(self):
+        for delay in (None, 0):
+            now = [0.0]
+            scheduler = FrameScheduler(delay, clock=lambda: now[0],
+                                       sleep=lambda seconds: self.fail('slept'))
+            for _ in range(5):
+                now[0] += 1
+                self.assertTrue(scheduler.due())
+                scheduler.done(0, 0)
+            self.assertEqual(scheduler.remaining(), 0)
+            self.assertEqual(scheduler.stats()['dropped'], 0)
+
+
+@skipIf(animate_async is None, 'requires python 3.7+')
+class AnimateAsyncTestCase(TestCase):
+
+
+    def test_async_frames(self):
+        async def frames():
+            for x in range(3):
+                yield [(x, 0)]
+                await asyncio.sleep(0)
+
+        out = StringIO()
+        loop = asyncio.new_event_loop()
+        try:
+            scheduler = loop.run_until_complete(
+                animate_async(Canvas(), frames(), 0, out=out))
+            loop.run_until_complete(animate_async(Canvas(), [[(0, 0)]], 0, out=out))
+        finally:
+            loop.close()
+        self.assertEqual(scheduler.stats()['frames'], 3)
+        self.assertEqual(out.getvalue().count(u'\u2801'), 3)
+
+
+    def test_async_overload(self):
+        now = [0.0]
+
+        async def frames():
+            for x in range(50):
+                # every frame takes 2.5 periods to produce
+                now[0] += 0.025
+                yield [(x, 0)]
+
+        scheduler = FrameScheduler(0.01, clock=lambda: now[0])
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(animate_async(Canvas(), frames(), scheduler, out=StringIO()))
+        finally:
+            loop.close()
+        self.assertEqual(scheduler.stats()['frames'], 25)
+        self.assertEqual(scheduler.stats()['dropped'], 25)
+
+
 class LineTestCase(TestCase):
 
 
@@ -93,6 +1053,234 @@ class LineTestCase(TestCase):
         self.assertEqual(list(line(0, 0, 1, 1)), [(0, 0), (1, 1)])
 
 
+    def test_integer_coords(self):
+        self.assertEqual(list(line(0, 0, 4, 2)), [(0, 0), (1, 0), (2, 1), (3, 2), (4, 2)])
+        self.assertEqual(list(line(0, 0, -4, 1.6)),
+                         [(0, 0), (-1, 0), (-2, 1), (-3, 2), (-4, 2)])
+
+
+    def test_polyline(self):
+        points = list(polyline([(0, 0), (2, 0), (2, 2)]))
+        self.assertEqual(points, [(0, 0), (1, 0), (2, 0), (2, 1), (2, 2)])
+        points = list(polyline([(0, 0), (2, 0), (2, 2)], closed=True))
+        self.assertEqual(len(points), len(set(points)))
+        points = list(polygon(0, 0, 6, 30))
+        self.assertEqual(len(points), len(set(points)))
+        self.assertEqual(list(polyline([], closed=True)), [])
+        self.assertEqual(list(polyline([(1, 1), (1.2, 1)], closed=True)), [(1, 1)])
+        for c in (Canvas(), DenseCanvas(10, 10)):
+            c.polyline([(1, 1), (1.2, 1)], closed=True)
+            self.assertTrue(c.get(1, 1))
+
+
+    def test_polygon_closing_vertex(self):
+        # the last side ends at the computed 360 degree vertex, which can
+        # round to another pixel than the first vertex
+        self.assertEqual(set(polygon(-3, -3, 1, 2)), set([(-3, -5), (-3, -4)]))
+        self.assertEqual(list(polygon(-4, -5, 2, 0)), [(-2, -2)])
+        self.assertEqual(list(polygon(0, 0, 4, 4)), list(polyline(polygon_vertices(0, 0, 4, 4), closed=True)))
+
+
+    def test_canvas_line(self):
+        rnd = Random(3)
+        for factory in (Canvas, lambda: DenseCanvas(100, 100)):
+            a, b = factory(), factory()
+            for _ in range(50):
+                coords = [rnd.uniform(-10, 110) for _ in range(4)]
+                a.set_many(line(*coords))
+                b.line(*coords)
+            self.assertEqual(a.frame(), b.frame())
+            a.set_many(polygon(1, 1, 5, 80))
+            b.polyline(polygon_vertices(1, 1, 5, 80), closed=True)
+            self.assertEqual(a.frame(), b.frame())
+
+
+class ShapeTestCase(TestCase):
+
+
+    def test_circle(self):
+        points = set(circle(10, 10, 5))
+        self.assertEqual(len(points), 28)
+        for x, y in points:
+            self.assertTrue(4.5 <= ((x - 10) ** 2 + (y - 10) ** 2) ** 0.5 <= 5.5)
+
+
+    def test_arc(self):
+        points = set(arc(0, 0, 10, 0, 90))
+        self.assertTrue(points < set(circle(0, 0, 10)))
+        self.assertTrue((10, 0) in points and (0, 10) in points)
+        self.assertTrue(all(x >= 0 and y >= 0 for x, y in points))
+        self.assertEqual(points, set(p for p in circle(0, 0, 10) if p[0] >= 0 and p[1] >= 0))
+
+
+    def test_polygon_spans(self):
+        spans = list(polygon_spans([(0, 0), (5, 0), (5, 3), (0, 3)]))
+        self.assertEqual(spans, [(0, 0, 5), (1, 0, 5), (2, 0, 5)])
+
+
+    def test_fill_spans(self):
+        c = Canvas()
+        c.fill_spans([(y, 1, 6) for y in range(4)])
+        self.assertEqual(c.chars[0], {0: 0xB8, 1: 0xFF, 2: 0xFF, 3: 0x47})
+        c.fill_spans([(5, 3, 3)])
+        self.assertEqual(c.chars[1], {1: 0x10})
+
+
+    def test_filled_shapes(self):
+        for factory in (Canvas, lambda: DenseCanvas(60, 60)):
+            c = factory()
+            c.circle(30, 30, 20, fill=True)
+            for x, y in circle(30, 30, 20):
+                self.assertTrue(c.get(x, y))
+            for y in range(60):
+                for x in range(60):
+                    distance = ((x - 30) ** 2 + (y - 30) ** 2) ** 0.5
+                    if distance < 19.5:
+                        self.assertTrue(c.get(x, y))
+                    elif distance > 20.5:
+                        self.assertFalse(c.get(x, y))
+            c = factory()
+            c.fill_polygon([(0, 0), (40, 0), (40, 20), (0, 20)])
+            self.assertTrue(all(c.get(x, y) for x in range(41) for y in range(21)))
+            self.assertEqual(c.frame().count(u'\u28ff'), 20 * 5)
+
+
+class ClipTestCase(TestCase):
+
+
+    def test_set(self):
+        for factory in (Canvas, lambda **kw: DenseCanvas(20, 20, **kw)):
+            c = factory(clip=(1, 1, 5, 6))
+            c.set(0, 1)
+            c.set(1, 6)
+            c.toggle(5, 2)
+            self.assertEqual(c.frame(), '')
+            c.set(1, 1)
+            c.set(4, 5)
+            self.assertTrue(c.get(1, 1) and c.get(4, 5))
+
+
+    def test_same_pixels(self):
+        rnd = Random(5)
+        clip = (3, 5, 37, 30)
+        for factory in (Canvas, lambda **kw: DenseCanvas(40, 40, **kw)):
+            a, b = factory(), factory(clip=clip)
+            for _ in range(20):
+                coords = [rnd.randint(-20, 60) for _ in range(4)]
+                a.line(*coords)
+                b.line(*coords)
+            a.circle(20, 20, 25, fill=True)
+            b.circle(20, 20, 25, fill=True)
+            a.toggle_many((x, x) for x in range(40))
+            b.toggle_many((x, x) for x in range(40))
+            a.blit_bitmap([[1] * 7] * 9, x=33, y=27)
+            b.blit_bitmap([[1] * 7] * 9, x=33, y=27)
+            for y in range(-5, 45):
+                for x in range(-5, 45):
+                    inside = 3 <= x < 37 and 5 <= y < 30
+                    self.assertEqual(b.get(x, y), a.get(x, y) and inside)
+
+
+    def test_clipped_shapes(self):
+        rnd = Random(9)
+        for _ in range(200):
+            cx, cy = rnd.randint(-60, 60), rnd.randint(-60, 60)
+            rx, ry = rnd.randint(0, 70), rnd.randint(0, 70)
+            x, y = rnd.randint(-80, 80), rnd.randint(-80, 80)
+            clip = (x, y, x + rnd.randint(0, 90), y + rnd.randint(0, 90))
+            inside = lambda p: clip[0] <= p[0] < clip[2] and clip[1] <= p[1] < clip[3]
+            self.assertEqual(set(circle(cx, cy, rx, clip)),
+                             set(filter(inside, circle(cx, cy, rx))))
+            self.assertEqual(set(ellipse(cx, cy, rx, ry, clip)),
+                             set(filter(inside, ellipse(cx, cy, rx, ry))))
+            self.assertEqual(set(ellipse_spans(cx, cy, rx, ry, clip)),
+                             set(s for s in ellipse_spans(cx, cy, rx, ry) if clip[1] <= s[0] < clip[3]))
+            start, sweep = rnd.uniform(-400, 400), rnd.uniform(-400, 400)
+            self.assertEqual(set(arc(cx, cy, rx, start, start + sweep, clip)),
+                             set(filter(inside, arc(cx, cy, rx, start, start + sweep))))
+
+
+    def test_huge_circle(self):
+        # only the visible part of the circle is walked
+        c = DenseCanvas(40, 40)
+        start = time.time()
+        c.circle(20, 100020, 100000)
+        c.circle(20, 20, 10 ** 7, fill=True)
+        c.arc(20, 100020, 100000, 180, 360)
+        self.assertLess(time.time() - start, 1)
+        self.assertTrue(c.get(20, 20) and c.get(0, 39))
+
+
+    def test_set_clip(self):
+        for factory in (Canvas, lambda: DenseCanvas(20, 20)):
+            c = factory()
+            c.fill_spans([(y, 0, 19) for y in range(20)])
+            c.set_text(0, 16, 'abcdefghij')
+            c.set_clip(2, 3, 8, 17)
+            self.assertEqual(c.bbox(), (2, 0, 8, 20))
+            self.assertTrue(c.get(2, 3) and c.get(7, 16))
+            self.assertFalse(c.get(1, 3) or c.get(2, 2) or c.get(8, 16))
+            self.assertEqual(c.rows()[-1], 'bcd')
+            c.set_clip()
+            c.set(0, 0)
+            self.assertTrue(c.get(0, 0))
+
+
+class Mesh3DTestCase(TestCase):
+
+
+    cube = ([(-1, 1, -1), (1, 1, -1), (1, -1, -1), (-1, -1, -1),
+             (-1, 1, 1), (1, 1, 1), (1, -1, 1), (-1, -1, 1)],
+            [(0, 1, 2, 3), (1, 5, 6, 2), (5, 4, 7, 6), (4, 0, 3, 7), (0, 4, 5, 1), (3, 2, 6, 7)])
+
+
+    def assertPoints(self, points, expected):
+        points = [tuple(p) for p in points]
+        self.assertEqual(len(points), len(expected))
+        for p, e in zip(points, expected):
+            for a, b in zip(p, e):
+                self.assertAlmostEqual(a, b)
+
+
+    def test_transform(self):
+        m = compose(scaling(2), rotation_x(90), translation(1, 0, 0))
+        self.assertPoints(transform([(0, 1, 0), (1, 0, 0)], m), [(1, 0, 2), (3, 0, 0)])
+        self.assertPoints(project([(2, 4, 0), (2, 4, 10)], 10, 20, fov=10, distance=10),
+                          [(7, 6), (6, 8)])
+
+
+    def test_edges(self):
+        vertices, faces = self.cube
+        self.assertEqual(len(edges(faces)), 12)
+        self.assertEqual(edges([(0, 1, 2), (2, 1, 3)]), [(0, 1), (0, 2), (1, 2), (1, 3), (2, 3)])
+
+
+    def test_cull(self):
+        vertices, faces = self.cube
+        mesh = Mesh(vertices, faces)
+        self.assertEqual(visible_faces(mesh.project(None, 10, 10, 10, 5), faces), [0])
+        points = mesh.project(rotation_y(45), 10, 10, 10, 5)
+        self.assertEqual(visible_faces(points, faces), [0, 1])
+        self.assertEqual(visible_faces(points, mesh.corners), [0, 1])
+
+
+    def test_draw(self):
+        vertices, faces = self.cube
+        mesh = Mesh(vertices, faces)
+        c = Canvas()
+        mesh.draw(c, scaling(10), x=20, y=20)
+        expected = Canvas()
+        expected.polyline([(10, 10), (30, 10), (30, 30), (10, 30)], closed=True)
+        self.assertEqual(c.frame(), expected.frame())
+        lines = []
+        c.line = lambda *args: lines.append(args)
+        mesh.draw(c, compose(scaling(10), rotation_y(30)), 40, 40, 40, 40)
+        self.assertEqual(len(lines), 12)
+        del lines[:]
+        mesh.draw(c, compose(scaling(10), rotation_y(30)), 40, 40, 40, 40, cull=True)
+        self.assertEqual(len(lines), 7)
+
+
 class TurtleTestCase(TestCase):
 
 
@@ -112,6 +1300,10 @@ class TurtleTestCase(TestCase):
         self.assertEqual(t.rotation, 30)
         t.left(30)
         self.assertEqual(t.rotation, 0)
+        # the heading is computed from the rotation, not its value modulo 360
+        t.left(30)
+        t.forward(9)
+        self.assertEqual(t.pos_y, math.sin(math.radians(-30)) * 9)
 
 
     def test_brush(self):
@@ -128,5 +1320,42 @@ class TurtleTestCase(TestCase):
         self.assertTrue(t.get(t.pos_x, t.pos_y))
 
 
+    def test_record(self):
+        t = Turtle()
+        r = Turtle(record=True)
+        for turtle in (t, r):
+            for _ in range(4):
+                for _ in range(5):
+                    turtle.forward(4)
+                turtle.right(90)
+            turtle.up()
+            turtle.move(30, 0)
+            turtle.down()
+            turtle.back(6)
+        self.assertEqual(len(r._segments), 5)
+        self.assertEqual(t.frame(), r.frame())
+        self.assertEqual(r._segments, [])
+        self.assertTrue(r.get(30, 0))
+
+
+    def test_lsystem(self):
+        self.assertEqual(''.join(lsystem('A', {'A': 'AB', 'B': 'A'}, 4)), 'ABAABABA')
+        self.assertEqual(''.join(lsystem('F', {'F': 'F+F-F-F+F'}, 1)), 'F+F-F-F+F')
+        self.assertEqual(''.join(lsystem('F+', {'F': 'FF'}, 0)), 'F+')
+
+
+    def test_run(self):
+        t = Turtle(record=True)
+        t.run('F[+F]f-F', step=2)
+        self.assertAlmostEqual(t.pos_x, 4)
+        self.assertAlmostEqual(t.pos_y, -2)
+        self.assertEqual(t.rotation, -90)
+        expected = Canvas()
+        expected.line(0, 0, 2, 0)
+        expected.line(2, 0, 2, 2)
+        expected.line(4, 0, 4, -2)
+        self.assertEqual(t.frame(), expected.frame())
+
+
 if __name__ == '__main__':
     main()